@@ -0,0 +1,127 @@
+"""
+
+Micro-benchmark of convert_warning_data on a recorded warning layer.
+
+Usage: python benchmarks/convert_warning_data.py [repetitions]
+
+The layer recorded by record_fixtures.py is used if available, otherwise a
+synthetic layer with typical warnings is generated.
+
+"""
+
+import sys
+import timeit
+from datetime import datetime
+
+from fixtures import load_layer
+
+from dwdwfsapi.weatherwarnings import convert_warning_data
+
+LAYER = "dwd:Warnungen_Gemeinden"
+
+
+def baseline_convert_warning_data(data_in):
+    """The converter before the fast path was introduced."""
+    # pylint: disable=too-many-branches,too-many-statements,bare-except
+    weather_severity_mapping = {"minor": 1, "moderate": 2, "severe": 3, "extreme": 4}
+    data_in = {k.lower(): v for k, v in data_in.items()}
+    data_out = {
+        "start_time": None,
+        "end_time": None,
+        "event": None,
+        "event_code": 0,
+        "headline": None,
+        "description": None,
+        "instruction": None,
+        "urgency": "immediate",
+        "level": 0,
+        "parameters": None,
+        "color": "#000000",
+    }
+    if "onset" in data_in:
+        try:
+            data_out["start_time"] = datetime.fromisoformat(data_in["onset"])
+        except:
+            data_out["start_time"] = None
+    if "expires" in data_in:
+        try:
+            data_out["end_time"] = datetime.fromisoformat(data_in["expires"])
+        except:
+            data_out["end_time"] = None
+    if "event" in data_in:
+        data_out["event"] = data_in["event"]
+    if "ec_ii" in data_in:
+        try:
+            data_out["event_code"] = int(data_in["ec_ii"])
+        except:
+            data_out["event_code"] = 0
+    if "headline" in data_in:
+        data_out["headline"] = data_in["headline"]
+    if "description" in data_in:
+        data_out["description"] = data_in["description"]
+    if "instruction" in data_in:
+        data_out["instruction"] = data_in["instruction"]
+    if "urgency" in data_in:
+        if data_in["urgency"].lower() == "future":
+            data_out["urgency"] = "future"
+        else:
+            data_out["urgency"] = "immediate"
+    if "severity" in data_in:
+        try:
+            if data_in["severity"].lower() in weather_severity_mapping:
+                data_out["level"] = weather_severity_mapping[
+                    data_in["severity"].lower()
+                ]
+        except:
+            data_out["level"] = 0
+    if "parametername" in data_in and "parametervalue" in data_in:
+        try:
+            if "," in data_in["parametername"]:
+                keys = data_in["parametername"].split(",")
+                values = data_in["parametervalue"].split(",")
+            else:
+                keys = data_in["parametername"].split(";")
+                values = data_in["parametervalue"].split(";")
+            data_out["parameters"] = dict(zip(keys, values))
+        except:
+            data_out["parameters"] = None
+    if "ec_area_color" in data_in:
+        try:
+            colors = data_in["ec_area_color"].split(" ")
+            data_out["color"] = f"#{int(colors[0]):02x}{int(colors[1]):02x}"
+            data_out["color"] += f"{int(colors[2]):02x}"
+        except:
+            data_out["color"] = "#000000"
+    return data_out
+
+
+def main():
+    """Run the benchmark and print the results."""
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    json_data, kind = load_layer(LAYER)
+    properties = [feature["properties"] for feature in json_data["features"]]
+
+    for props in properties:
+        if convert_warning_data(props) != baseline_convert_warning_data(props):
+            sys.exit(f"Different output for {props}")
+
+    results = {}
+    for name, func in (
+        ("baseline", baseline_convert_warning_data),
+        ("optimized", convert_warning_data),
+    ):
+        results[name] = min(
+            timeit.repeat(
+                lambda f=func: [f(p) for p in properties],
+                number=1,
+                repeat=repetitions,
+            )
+        )
+        per_feature = 1e6 * results[name] / len(properties)
+        print(f"{name:10} {per_feature:6.2f} µs per feature")
+    print(f"{len(properties)} {kind} features")
+    print(f"speedup    {results['baseline'] / results['optimized']:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
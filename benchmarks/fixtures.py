@@ -0,0 +1,140 @@
+"""
+
+GetFeature fixtures for the benchmarks.
+
+Fixtures recorded by record_fixtures.py are used if available, otherwise
+synthetic layers resembling the real ones are generated.
+
+"""
+
+import gzip
+import json
+import os
+import random
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+TIMESTAMP = "2024-03-16T10:00:00.000Z"
+
+# The cell used for the single cell benchmarks
+WARNCELL_ID = 808436003
+POLLEN_REGION = 11
+BIO_REGION = 101
+
+EVENTS = [
+    ("22", "FROST", "Minor", "255 255 0"),
+    ("51", "WINDBÖEN", "Minor", "255 255 0"),
+    ("52", "STURMBÖEN", "Moderate", "255 153 0"),
+    ("61", "STARKREGEN", "Moderate", "255 153 0"),
+    ("31", "GEWITTER", "Moderate", "255 153 0"),
+    ("41", "UNWETTER", "Severe", "255 0 0"),
+]
+
+POLLEN_TYPES = ["Hasel", "Erle", "Esche", "Birke", "Graeser", "Roggen", "Beifuss"]
+BIO_TYPES = ["Asthma", "Kreislauf", "Rheuma", "Kopfschmerz"]
+
+
+def fixture_path(layer):
+    """Return the file a layer is recorded to."""
+    return os.path.join(FIXTURES, f"{layer.replace(':', '_')}.json.gz")
+
+
+def feature_collection(properties):
+    """Wrap a list of property dicts into a WFS FeatureCollection."""
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": None, "properties": p} for p in properties
+        ],
+        "numberMatched": len(properties),
+        "numberReturned": len(properties),
+        "timeStamp": TIMESTAMP,
+    }
+
+
+def synthetic_warnings(count=10000, seed=1):
+    """Generate a layer resembling the nationwide municipality warnings."""
+    rng = random.Random(seed)
+    properties = []
+    for index in range(count):
+        code, event, severity, color = rng.choice(EVENTS)
+        hour = rng.randrange(0, 24, 3)
+        properties.append(
+            {
+                # Make sure the single cell has warnings as well
+                "WARNCELLID": WARNCELL_ID if index % 1000 == 0 else 800000000 + index,
+                "ONSET": f"2024-03-16T{hour:02d}:00:00Z",
+                "EXPIRES": f"2024-03-17T{hour:02d}:00:00Z",
+                "EVENT": event,
+                "EC_II": code,
+                "HEADLINE": f"Amtliche WARNUNG vor {event}",
+                "DESCRIPTION": f"Es tritt {event} auf.",
+                "INSTRUCTION": None,
+                "URGENCY": rng.choice(("Immediate", "Future")),
+                "SEVERITY": severity,
+                "PARAMETERNAME": "Böen;Windrichtung",
+                "PARAMETERVALUE": "~55 [km/h];West",
+                "EC_AREA_COLOR": color,
+            }
+        )
+    return feature_collection(properties)
+
+
+def synthetic_forecasts(regions, types, level_property):
+    """Generate a forecast layer, DWD returns every dataset twice."""
+    properties = []
+    for region in regions:
+        for ec_ii, name in enumerate(types, start=1):
+            for day in ("16", "17", "18"):
+                entry = {
+                    "GF": region,
+                    "EC_II": ec_ii,
+                    "PARAMETER_NAME": name,
+                    "PARAMETER_VALUE": "gering",
+                    "FORECAST_DATE": f"2024-03-{day}T00:00:00Z",
+                    level_property: 1,
+                    "EC_AREA_COLOR": "254 227 145",
+                }
+                properties.extend([entry, dict(entry)])
+    return feature_collection(properties)
+
+
+# fmt: off
+POLLEN_REGIONS = [
+    11, 12, 20, 31, 32, 41, 42, 43, 50, 61, 62, 71, 72, 81, 82, 91, 92, 101,
+    102, 103, 111, 112, 113, 121, 122, 123, 124,
+]
+# fmt: on
+BIO_REGIONS = [101, 102, 103, 104, 105, 106, 107, 108, 109, 110, 111]
+
+SYNTHETIC = {
+    "dwd:Warnungen_Gemeinden": synthetic_warnings,
+    "dwd:Warngebiete_Gemeinden": lambda: feature_collection(
+        [{"WARNCELLID": WARNCELL_ID, "NAME": "Gemeinde Aichstetten"}]
+    ),
+    "dwd:Pollenflug": lambda: synthetic_forecasts(
+        POLLEN_REGIONS, POLLEN_TYPES, "POLLENINT"
+    ),
+    "dwd:Pollenfluggebiete": lambda: feature_collection(
+        [{"GF": gf, "GEN": f"Region {gf}"} for gf in POLLEN_REGIONS]
+    ),
+    "dwd:Biowettervorhersage": lambda: synthetic_forecasts(
+        BIO_REGIONS, BIO_TYPES, "BIOWETTERINT"
+    ),
+    "dwd:Biowettergebiete": lambda: feature_collection(
+        [{"GF": gf, "GEN": f"Region {gf}"} for gf in BIO_REGIONS]
+    ),
+}
+
+
+def load_layer(layer):
+    """
+    Return the recorded layer or a synthetic one.
+
+    Returns a tuple of the feature collection and its kind, either
+    "recorded" or "synthetic".
+    """
+    try:
+        with gzip.open(fixture_path(layer), "rt", encoding="utf-8") as f:
+            return json.load(f), "recorded"
+    except OSError:
+        return SYNTHETIC[layer](), "synthetic"
@@ -0,0 +1,49 @@
+"""
+
+Record the layers used by the benchmarks from the DWD geoserver.
+
+Usage: python benchmarks/record_fixtures.py [layer ...]
+
+The layers are stored gzip compressed in benchmarks/fixtures. Only the
+properties evaluated by dwdwfsapi are recorded.
+
+"""
+
+import gzip
+import json
+import os
+import sys
+
+from fixtures import FIXTURES, SYNTHETIC, fixture_path
+
+from dwdwfsapi import bioweather, pollenflight, weatherwarnings
+from dwdwfsapi.core import query_dwd
+
+PROPERTIES = {
+    "dwd:Warnungen_Gemeinden": (
+        weatherwarnings.WARNCELL_ID_PROPERTIES["dwd:Warnungen_Gemeinden"],
+        *weatherwarnings.WARNING_PROPERTIES,
+    ),
+    "dwd:Warngebiete_Gemeinden": weatherwarnings.REGION_PROPERTIES,
+    "dwd:Pollenflug": pollenflight.FORECAST_PROPERTIES,
+    "dwd:Pollenfluggebiete": pollenflight.REGION_PROPERTIES,
+    "dwd:Biowettervorhersage": bioweather.FORECAST_PROPERTIES,
+    "dwd:Biowettergebiete": bioweather.REGION_PROPERTIES,
+}
+
+
+def main():
+    """Download the layers and store them."""
+    layers = sys.argv[1:] or list(SYNTHETIC)
+    os.makedirs(FIXTURES, exist_ok=True)
+    for layer in layers:
+        result = query_dwd(typeName=layer, propertyName=PROPERTIES[layer])
+        if result is None:
+            sys.exit(f"Download of {layer} failed")
+        with gzip.open(fixture_path(layer), "wt", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        print(f"Recorded {result['numberReturned']} features of {layer}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+
+Compare the memory needed for warnings stored as dictionaries and records.
+
+Usage: python benchmarks/records_memory.py [number of warnings]
+
+"""
+
+import sys
+import tracemalloc
+
+from dwdwfsapi.weatherwarnings import convert_warning_data
+
+PROPERTIES = {
+    "EC_II": "51",
+    "EVENT": "WINDBÖEN",
+    "URGENCY": "Immediate",
+    "SEVERITY": "Moderate",
+    "ONSET": "2024-03-16T10:00:00Z",
+    "EXPIRES": "2024-03-16T18:00:00Z",
+    "HEADLINE": "Amtliche WARNUNG vor WINDBÖEN",
+    "DESCRIPTION": "Es treten Windböen mit Geschwindigkeiten um 55 km/h auf.",
+    "PARAMETERNAME": "Böen;Windrichtung",
+    "PARAMETERVALUE": "~55 [km/h];West",
+    "EC_AREA_COLOR": "255 153 0",
+}
+
+
+def measure(count, records):
+    """Return the bytes allocated for count converted warnings."""
+    tracemalloc.start()
+    warnings = [convert_warning_data(PROPERTIES, records) for _ in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del warnings
+    return size
+
+
+def main():
+    """Run the benchmark and print the results."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    dicts = measure(count, False)
+    records = measure(count, True)
+    print(f"{count} warnings")
+    print(f"dicts:   {dicts / count:8.1f} bytes per warning")
+    print(f"records: {records / count:8.1f} bytes per warning")
+    print(f"saving:  {100 * (1 - records / dicts):8.1f} %")
+
+
+if __name__ == "__main__":
+    main()
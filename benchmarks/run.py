@@ -0,0 +1,258 @@
+"""
+
+Benchmark suite of dwdwfsapi.
+
+All queries are answered by a local stub geoserver serving the fixtures, so
+the results only depend on the client. The results are written as JSON and
+can be compared with the results of a previous run.
+
+Usage: python benchmarks/run.py [--repeat N] [--output FILE] [--compare FILE]
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import UTC, datetime
+
+from fixtures import (
+    BIO_REGION,
+    POLLEN_REGION,
+    SYNTHETIC,
+    WARNCELL_ID,
+    feature_collection,
+    load_layer,
+)
+
+from dwdwfsapi import (
+    BioWeatherSnapshot,
+    DwdBioWeatherAPI,
+    DwdPollenFlightAPI,
+    DwdWeatherWarningsAPI,
+    PollenFlightSnapshot,
+    WarningsSnapshot,
+    cache,
+    core,
+)
+from dwdwfsapi.weatherwarnings import convert_warning_data
+
+# The queries are answered by the stub geoserver of the tests
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests")
+)
+# isort: split
+from stub_geoserver import (  # pylint: disable=import-error,wrong-import-position
+    StubGeoserver,
+)
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# pylint: disable=protected-access
+
+
+def timings(func, repeat):
+    """Return the durations of repeated calls in seconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def latency(func, repeat):
+    """Measure the latency of a call."""
+    durations = timings(func, repeat)
+    return {
+        "latency_min_s": min(durations),
+        "latency_median_s": statistics.median(durations),
+    }
+
+
+def throughput(func, count, repeat):
+    """Measure the number of features processed per second."""
+    return {"features_per_s": count / min(timings(func, repeat))}
+
+
+def peak_memory(func):
+    """Measure the peak memory allocated by a call."""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_memory_bytes": peak}
+
+
+def construct(cls, identifier):
+    """Create an instance without reusing earlier resolutions."""
+    cache.set_resolution_cache(None)
+    return cls(identifier)
+
+
+def update(instance):
+    """Update an instance, bypassing the unchanged data check."""
+    instance._validators.clear()
+    instance.update()
+
+
+def parse(instance, json_data):
+    """Parse a response, bypassing the unchanged data check."""
+    instance._validators.clear()
+    instance._process_result(json_data)
+
+
+def filter_layer(json_data, prop, value):
+    """Return the features of a single cell, as filtered by the server."""
+    return feature_collection(
+        [
+            feature["properties"]
+            for feature in json_data["features"]
+            if str(feature["properties"].get(prop)) == str(value)
+        ]
+    )
+
+
+def benchmark_warnings(layers, repeat):
+    """Benchmark the core functions and the weather warnings module."""
+    layer = "dwd:Warnungen_Gemeinden"
+    json_data = layers[layer]
+    count = len(json_data["features"])
+    properties = [feature["properties"] for feature in json_data["features"]]
+
+    def query():
+        return core.query_dwd(typeName=layer)
+
+    def convert():
+        return [convert_warning_data(p) for p in properties]
+
+    dwd = DwdWeatherWarningsAPI(WARNCELL_ID)
+    cell_data = filter_layer(json_data, "WARNCELLID", WARNCELL_ID)
+    snapshot = WarningsSnapshot(layers=(layer,))
+    return {
+        "query_dwd": {**latency(query, repeat), **peak_memory(query)},
+        "convert_warning_data": {
+            **throughput(convert, count, repeat),
+            **peak_memory(convert),
+        },
+        "warnings_construction": latency(
+            lambda: construct(DwdWeatherWarningsAPI, WARNCELL_ID), repeat
+        ),
+        "warnings_update": latency(lambda: update(dwd), repeat),
+        "warnings_parse_result": {
+            **latency(lambda: parse(dwd, cell_data), repeat),
+            **peak_memory(lambda: parse(dwd, cell_data)),
+        },
+        "warnings_snapshot_update": {
+            **latency(snapshot.update, repeat),
+            **throughput(snapshot.update, count, repeat),
+            **peak_memory(snapshot.update),
+        },
+    }
+
+
+def benchmark_forecasts(name, layers, repeat):
+    """Benchmark the pollen flight or bio weather module."""
+    if name == "pollenflight":
+        cls, snapshot_cls = DwdPollenFlightAPI, PollenFlightSnapshot
+        layer, region = "dwd:Pollenflug", POLLEN_REGION
+    else:
+        cls, snapshot_cls = DwdBioWeatherAPI, BioWeatherSnapshot
+        layer, region = "dwd:Biowettervorhersage", BIO_REGION
+    json_data = layers[layer]
+    count = len(json_data["features"])
+
+    dwd = cls(region)
+    region_data = filter_layer(json_data, "GF", region)
+    snapshot = snapshot_cls()
+    return {
+        f"{name}_construction": latency(lambda: construct(cls, region), repeat),
+        f"{name}_update": latency(lambda: update(dwd), repeat),
+        f"{name}_parse_result": {
+            **latency(lambda: parse(dwd, region_data), repeat),
+            **peak_memory(lambda: parse(dwd, region_data)),
+        },
+        f"{name}_snapshot_update": {
+            **latency(snapshot.update, repeat),
+            **throughput(snapshot.update, count, repeat),
+            **peak_memory(snapshot.update),
+        },
+    }
+
+
+def compare(results, baseline):
+    """Print the ratio of all metrics to the baseline."""
+    print(f"\nCompared to {baseline['created']}:")
+    for case, metrics in results["results"].items():
+        for metric, value in metrics.items():
+            old = baseline["results"].get(case, {}).get(metric)
+            if old:
+                print(f"{case:32} {metric:20} {value / old:7.2f}x")
+
+
+def write_results(results, kinds, args):
+    """Print the results and store them as JSON."""
+    output = {
+        "created": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "fixtures": kinds,
+        "results": results,
+    }
+    for case, metrics in results.items():
+        print(case)
+        for metric, value in metrics.items():
+            print(f"    {metric:20} {value:14.6g}")
+
+    path = args.output
+    if path is None:
+        os.makedirs(RESULTS, exist_ok=True)
+        stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(RESULTS, f"{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults written to {path}")
+    return output
+
+
+def main():
+    """Run all benchmarks and store the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="the JSON file to store the results")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    layers = {}
+    kinds = {}
+    for layer in SYNTHETIC:
+        layers[layer], kinds[layer] = load_layer(layer)
+
+    with StubGeoserver(cache_bodies=True) as stub:
+        stub.layers = {
+            layer: [feature["properties"] for feature in json_data["features"]]
+            for layer, json_data in layers.items()
+        }
+        core.set_base_url(stub.url)
+        results = {}
+        results.update(benchmark_warnings(layers, args.repeat))
+        for name in ("pollenflight", "bioweather"):
+            results.update(benchmark_forecasts(name, layers, args.repeat))
+        core.set_base_url(None)
+
+    output = write_results(results, kinds, args)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(output, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
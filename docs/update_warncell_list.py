@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import gzip
 import json
 import urllib.parse
 
@@ -61,3 +62,12 @@ print("Updating warncells.json")
 with open("warncells.json", "w", encoding="utf-8") as f:
     json.dump(all_stations_dict, f, indent=4, ensure_ascii=False)
     f.close()
+
+print("Updating package data warncells.json.gz")
+package_data = {area: {} for area in AREAS.values()}
+for warncell in all_stations:
+    package_data[AREAS[warncell[1]]][warncell[0]] = warncell[2]
+package_json = json.dumps(package_data, separators=(",", ":"), ensure_ascii=False)
+with open("../src/dwdwfsapi/data/warncells.json.gz", "wb") as f:
+    f.write(gzip.compress(package_json.encode("utf-8"), mtime=0))
+    f.close()
@@ -1,5 +1,9 @@
 """Python client to retrieve data provided by DWD via their WFS API."""
 
-from .bioweather import DwdBioWeatherAPI
-from .pollenflight import DwdPollenFlightAPI
-from .weatherwarnings import DwdWeatherWarningsAPI
+from .bioweather import BioWeatherSnapshot, DwdBioWeatherAPI
+from .locator import WarncellLocator
+from .pollenflight import DwdPollenFlightAPI, PollenFlightSnapshot
+from .records import ForecastEntry, WeatherWarning
+from .refresher import Refresher, update_all
+from .store import SnapshotStore
+from .weatherwarnings import DwdWeatherWarningsAPI, WarningsSnapshot
@@ -0,0 +1,6 @@
+"""Asynchronous python client to retrieve data provided by DWD via WFS."""
+
+from .bioweather import AsyncDwdBioWeatherAPI
+from .core import close_session, configure, query_dwd
+from .pollenflight import AsyncDwdPollenFlightAPI
+from .weatherwarnings import AsyncDwdWeatherWarningsAPI
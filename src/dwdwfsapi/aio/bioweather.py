@@ -0,0 +1,13 @@
+"""Asynchronous python client to retrieve bio weather forecast from DWD."""
+
+from ..bioweather import DwdBioWeatherAPI
+from .core import AsyncAPIMixin
+
+
+class AsyncDwdBioWeatherAPI(AsyncAPIMixin, DwdBioWeatherAPI):
+    """
+    Asynchronous variant of DwdBioWeatherAPI.
+
+    Instances have to be created by the create() coroutine. All attributes
+    are identical to DwdBioWeatherAPI.
+    """
@@ -0,0 +1,309 @@
+"""
+
+Asynchronous variant of the core functions to communicate with the geoserver.
+
+All queries share one aiohttp session per event loop. The number of
+concurrent queries is bounded, so many instances can be refreshed at once
+without flooding the DWD server.
+
+"""
+
+import asyncio
+import time
+import weakref
+
+import aiohttp
+
+from ..core import (
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+    NOT_MODIFIED,
+    RETRY_STATUS_CODES,
+    build_query,
+    cache_ttl,
+    coalescing_enabled,
+    conditional_headers,
+    get_cache,
+    get_limiter,
+    store_validators,
+)
+from ..metrics import QueryProbe, error_kind, record_cache_lookup, record_coalesced
+
+DEFAULT_CONCURRENCY = 20
+
+_SESSIONS = weakref.WeakKeyDictionary()
+_IN_FLIGHT = weakref.WeakKeyDictionary()
+_SETTINGS = {
+    "pool_size": DEFAULT_POOL_SIZE,
+    "concurrency": DEFAULT_CONCURRENCY,
+    "retries": DEFAULT_RETRIES,
+    "backoff_factor": DEFAULT_BACKOFF_FACTOR,
+}
+
+
+def configure(**kwargs):
+    """
+    Configure the shared sessions created from now on.
+
+    Parameters
+    ----------
+    pool_size : int
+        maximum number of keep-alive connections
+    concurrency : int
+        maximum number of queries running at the same time
+    retries : int
+        number of retries on connection errors and retryable status codes
+    backoff_factor : float
+        factor for the exponential backoff between retries
+    """
+    for key, value in kwargs.items():
+        if key not in _SETTINGS:
+            raise TypeError(f"Unknown setting '{key}'")
+        _SETTINGS[key] = value
+
+
+async def _on_connection_create_start(session, context, params):
+    """Start timing a new connection."""
+    # pylint: disable=unused-argument
+    context.connect_start = time.perf_counter()
+    context.dns = 0.0
+
+
+async def _on_dns_resolvehost_start(session, context, params):
+    """Start timing the name resolution."""
+    # pylint: disable=unused-argument
+    context.dns_start = time.perf_counter()
+
+
+async def _on_dns_resolvehost_end(session, context, params):
+    """Report the duration of the name resolution."""
+    # pylint: disable=unused-argument
+    context.dns = time.perf_counter() - context.dns_start
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx.subphase("dns", context.dns)
+
+
+async def _on_connection_create_end(session, context, params):
+    """Report the duration of connecting without the name resolution."""
+    # pylint: disable=unused-argument
+    probe = context.trace_request_ctx
+    if probe is not None:
+        connect = time.perf_counter() - context.connect_start - context.dns
+        probe.subphase("connect", max(connect, 0.0))
+        probe.reused = False
+
+
+async def _on_connection_reuseconn(session, context, params):
+    """Report reusing a kept-alive connection."""
+    # pylint: disable=unused-argument
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx.reused = True
+
+
+def trace_config():
+    """Return a trace config reporting dns and connect phases to the probes."""
+    config = aiohttp.TraceConfig()
+    config.on_connection_create_start.append(_on_connection_create_start)
+    config.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+    config.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    config.on_connection_create_end.append(_on_connection_create_end)
+    config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    return config
+
+
+async def get_session():
+    """Return the session and concurrency limit of the running event loop."""
+    loop = asyncio.get_running_loop()
+    session, semaphore = _SESSIONS.get(loop, (None, None))
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=_SETTINGS["pool_size"])
+        session = aiohttp.ClientSession(
+            connector=connector, trace_configs=[trace_config()]
+        )
+        semaphore = asyncio.Semaphore(_SETTINGS["concurrency"])
+        _SESSIONS[loop] = (session, semaphore)
+    return session, semaphore
+
+
+async def close_session():
+    """Close the session of the running event loop."""
+    session, _ = _SESSIONS.pop(asyncio.get_running_loop(), (None, None))
+    if session is not None:
+        await session.close()
+
+
+async def coalesce(key, factory):
+    """
+    Await the coroutine created by factory once for all concurrent calls.
+
+    The request runs as a task of its own, so cancelling one of the waiting
+    callers doesn't cancel it for the others. Returns a tuple of the result
+    and whether the result was shared.
+    """
+    loop = asyncio.get_running_loop()
+    in_flight = _IN_FLIGHT.setdefault(loop, {})
+    task = in_flight.get(key)
+    shared = task is not None
+    if not shared:
+        task = in_flight[key] = loop.create_task(factory())
+        task.add_done_callback(lambda _: in_flight.pop(key, None))
+    return await asyncio.shield(task), shared
+
+
+async def query_dwd(**kwargs):
+    """Retrive data from DWD server, see dwdwfsapi.core.query_dwd."""
+    # Options which are not part of the query itself
+    kwargs = {k.lower(): v for k, v in kwargs.items()}
+    timeout = aiohttp.ClientTimeout(total=kwargs.pop("timeout", DEFAULT_TIMEOUT))
+    validators = kwargs.pop("validators", None)
+    headers = conditional_headers(validators)
+
+    query = build_query(**kwargs)
+    if query is None:
+        return None
+
+    cache = get_cache()
+    if cache is not None:
+        json_data = cache.get(query)
+        record_cache_lookup(kwargs["typename"], json_data is not None)
+        if json_data is not None:
+            return json_data
+
+    typename = kwargs["typename"]
+    if coalescing_enabled():
+        key = (query, tuple(sorted(headers.items())))
+        (json_data, resp_headers), shared = await coalesce(
+            key, lambda: fetch(query, typename, timeout, headers)
+        )
+        if shared:
+            record_coalesced(typename)
+    else:
+        json_data, resp_headers = await fetch(query, typename, timeout, headers)
+
+    if json_data is not None and json_data is not NOT_MODIFIED:
+        store_validators(validators, resp_headers)
+    return json_data
+
+
+class AsyncAPIMixin:
+    """
+    Asynchronous creation and update of an API class.
+
+    Mixed into the synchronous API classes in front of them. Instances have to
+    be created by the create() coroutine and are updated by awaiting update().
+    """
+
+    # Identifier which still needs to be resolved by create()
+    _identifier = None
+
+    def _setup(self, identifier):
+        """Store the identifier, it is resolved by create()."""
+        self._identifier = identifier
+
+    @classmethod
+    async def create(cls, identifier, records=False):
+        """
+        Create a new instance and retrieve the initial data.
+
+        Parameters
+        ----------
+        identifier : str, int or tuple
+            a valid identifier of the synchronous API class, e.g. a cell id
+            or name
+        records : bool
+            store the data as compact records instead of dictionaries
+        """
+        # pylint: disable=protected-access,no-member
+        instance = cls(identifier, records)
+        if instance._identifier is None:
+            return instance
+
+        for region_query in instance._region_queries(instance._identifier):
+            result = await query_dwd(**region_query)
+            if instance._process_region(region_query["typeName"], result):
+                break
+        instance._resolved(instance._identifier)
+        await instance.update()
+        return instance
+
+    async def update(self):
+        """Update data by querying DWD server and parsing result."""
+        # pylint: disable=no-member
+        if self._query is None:
+            return
+
+        self._process_result(
+            await query_dwd(**self._query, validators=self._validators)
+        )
+
+
+async def fetch(query, typename, timeout, headers):
+    """Send a single request to the DWD server, see dwdwfsapi.core.fetch."""
+    probe = QueryProbe(typename)
+    session, semaphore = await get_session()
+    async with semaphore:
+        probe.phase("queue")
+        return await send(session, query, timeout, headers, probe)
+
+
+async def send(session, query, timeout, headers, probe):
+    """
+    Send a request with retries and report it to the probe.
+
+    Every attempt passes the limiter, if set, and reports its outcome, so
+    retried overload responses count against the limiter.
+    """
+    # pylint: disable=too-many-return-statements,too-many-branches,too-many-locals
+    limiter = get_limiter()
+    status = None
+    error = None
+    for attempt in range(_SETTINGS["retries"] + 1):
+        if attempt:
+            delay = _SETTINGS["backoff_factor"] * 2 ** (attempt - 1)
+            await asyncio.sleep(delay)
+            probe.phase("backoff")
+        started = None
+        if limiter is not None:
+            started = await limiter.acquire_async()
+            probe.phase("throttle")
+        status = None
+        error = None
+        try:
+            async with session.get(
+                query, timeout=timeout, headers=headers, trace_request_ctx=probe
+            ) as resp:
+                status = resp.status
+                probe.phase("response")
+                if resp.status in RETRY_STATUS_CODES:
+                    continue
+                if resp.status == 304 and headers:
+                    probe.finish(status)
+                    return NOT_MODIFIED, resp.headers
+                if resp.status != 200:
+                    probe.finish(status)
+                    return None, resp.headers
+                # The body is read separately to time the download
+                content = await resp.read()
+                probe.phase("download", len(content))
+                json_data = await resp.json(content_type=None)
+                probe.phase("decode")
+                cache = get_cache()
+                if cache is not None:
+                    cache.set(query, json_data, cache_ttl(probe.typename))
+                probe.finish(status)
+                return json_data, resp.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            status = None
+            error = err
+            continue
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            error = err
+            probe.finish(status, err)
+            return None, None
+        finally:
+            if limiter is not None:
+                limiter.release(started, status, error_kind(error) if error else None)
+    probe.finish(status, error)
+    return None, None
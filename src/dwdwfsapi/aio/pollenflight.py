@@ -0,0 +1,13 @@
+"""Asynchronous python client to retrieve pollen flight forecast from DWD."""
+
+from ..pollenflight import DwdPollenFlightAPI
+from .core import AsyncAPIMixin
+
+
+class AsyncDwdPollenFlightAPI(AsyncAPIMixin, DwdPollenFlightAPI):
+    """
+    Asynchronous variant of DwdPollenFlightAPI.
+
+    Instances have to be created by the create() coroutine. All attributes
+    are identical to DwdPollenFlightAPI.
+    """
@@ -0,0 +1,13 @@
+"""Asynchronous python client to retrieve weather warnings from DWD."""
+
+from ..weatherwarnings import DwdWeatherWarningsAPI
+from .core import AsyncAPIMixin
+
+
+class AsyncDwdWeatherWarningsAPI(AsyncAPIMixin, DwdWeatherWarningsAPI):
+    """
+    Asynchronous variant of DwdWeatherWarningsAPI.
+
+    Instances have to be created by the create() coroutine. All attributes
+    are identical to DwdWeatherWarningsAPI.
+    """
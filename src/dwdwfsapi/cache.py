@@ -0,0 +1,436 @@
+"""
+
+Response caches which can be used by the core functions.
+
+A cache is activated by dwdwfsapi.core.set_cache(). All backends count their
+hits and misses and evict expired and least recently used entries.
+
+"""
+
+import abc
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Bump whenever the stored resolutions change, files of other versions are
+# ignored
+RESOLUTION_FORMAT_VERSION = 1
+RESOLUTION_CACHE_SIZE = 4096
+RESOLUTION_FLUSH_SIZE = 64
+RESOLUTION_FLUSH_INTERVAL = 10.0  # seconds
+
+
+class ResponseCache(abc.ABC):
+    """
+    Base class of all response caches.
+
+    Backends have to implement clear(), _load() and _store().
+
+    Attributes:
+    -----------
+    hits : int
+        number of lookups answered by the cache
+    misses : int
+        number of lookups not answered by the cache
+    """
+
+    def __init__(self):
+        """Init response cache."""
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key or None."""
+        value = self._load(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        """
+        Store a value.
+
+        Parameters
+        ----------
+        key : str
+            the normalized query
+        value : dict
+            the retrieved data
+        ttl : float
+            time to live in seconds
+        """
+        if ttl > 0:
+            self._store(key, value, time.time() + ttl)
+
+    @abc.abstractmethod
+    def clear(self):
+        """Remove all entries."""
+
+    @abc.abstractmethod
+    def _load(self, key):
+        """Return the value for key if it exists and isn't expired."""
+
+    @abc.abstractmethod
+    def _store(self, key, value, expires):
+        """Store the value for key until the expires timestamp."""
+
+
+class MemoryCache(ResponseCache):
+    """In-memory response cache with LRU eviction."""
+
+    def __init__(self, maxsize=128):
+        """
+        Init memory cache.
+
+        Parameters
+        ----------
+        maxsize : int
+            maximum number of entries
+        """
+        super().__init__()
+        self.maxsize = maxsize
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self.__entries)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self.__entries.clear()
+
+    def _load(self, key):
+        """Return the value for key if it exists and isn't expired."""
+        with self._lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key, value, expires):
+        """Store the value for key until the expires timestamp."""
+        with self._lock:
+            self.__entries[key] = (expires, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+
+class DiskCache(ResponseCache):
+    """
+    On-disk response cache which can be shared by several processes.
+
+    Every entry is stored in its own file. Files are replaced atomically, so
+    concurrent readers never see partially written entries.
+    """
+
+    def __init__(self, directory, maxsize=1024):
+        """
+        Init disk cache.
+
+        Parameters
+        ----------
+        directory : str
+            directory the entries are stored in, created if necessary
+        maxsize : int
+            maximum number of entries
+        """
+        super().__init__()
+        self.directory = directory
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self.__files())
+
+    def clear(self):
+        """Remove all entries."""
+        for path in self.__files():
+            self.__remove(path)
+
+    def _load(self, key):
+        """Return the value for key if it exists and isn't expired."""
+        path = self.__path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["key"] != key:
+            return None
+        if entry["expires"] < time.time():
+            self.__remove(path)
+            return None
+        # Mark entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["value"]
+
+    def _store(self, key, value, expires):
+        """Store the value for key until the expires timestamp."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "expires": expires, "value": value}, f)
+            os.replace(tmp_path, self.__path(key))
+        except OSError:
+            self.__remove(tmp_path)
+            return
+
+        files = self.__files()
+        if len(files) > self.maxsize:
+            files.sort(key=self.__mtime)
+            for path in files[: len(files) - self.maxsize]:
+                self.__remove(path)
+
+    def __path(self, key):
+        """Return the file name for key."""
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def __files(self):
+        """Return all entry files."""
+        try:
+            return [
+                entry.path
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".json")
+            ]
+        except OSError:
+            return []
+
+    @staticmethod
+    def __mtime(path):
+        """Return the modification time of a file or 0 if it vanished."""
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def __remove(path):
+        """Remove a file, ignoring files removed by another process."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResolutionCache:
+    """
+    Cache of resolved identifiers shared by all API classes.
+
+    Maps an identifier to the resolved cell id, cell name and data layer, so
+    that creating another instance for the same identifier doesn't need to
+    query the DWD server again. The least recently used entries are evicted
+    once maxsize is reached. Entries can optionally be persisted to a file,
+    new entries are written in batches.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        path=None,
+        maxsize=RESOLUTION_CACHE_SIZE,
+        flush_size=RESOLUTION_FLUSH_SIZE,
+        flush_interval=RESOLUTION_FLUSH_INTERVAL,
+    ):
+        """
+        Init resolution cache.
+
+        Parameters
+        ----------
+        path : str
+            if given, entries are loaded from and stored to this file
+        maxsize : int
+            maximum number of entries, 0 disables the cache
+        flush_size : int
+            write the file once this number of new entries is pending
+        flush_interval : float
+            write the file if pending entries are older than this number of
+            seconds
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.__entries = OrderedDict()
+        self.__pending = 0
+        self.__flushed = time.monotonic()
+        self.__lock = threading.Lock()
+        if path is not None:
+            self.__merge(self.__read())
+
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self.__entries)
+
+    @staticmethod
+    def key(kind, identifier):
+        """Return the normalized key for an identifier."""
+        if isinstance(identifier, tuple):
+            identifier = list(identifier)
+        return json.dumps([kind, identifier], ensure_ascii=False)
+
+    def get(self, kind, identifier):
+        """
+        Return the resolution of an identifier or None.
+
+        Parameters
+        ----------
+        kind : str
+            the kind of cell, e.g. "weatherwarnings"
+        identifier : str, int or tuple
+            the identifier passed to the API class
+        """
+        key = self.key(kind, identifier)
+        with self.__lock:
+            resolution = self.__entries.get(key)
+            if resolution is not None:
+                self.__entries.move_to_end(key)
+            return resolution
+
+    def set(self, kind, identifier, cell_id, cell_name, layer):
+        """
+        Store the resolution of an identifier.
+
+        Parameters
+        ----------
+        kind : str
+            the kind of cell, e.g. "weatherwarnings"
+        identifier : str, int or tuple
+            the identifier passed to the API class
+        cell_id : int
+            the id of the resolved cell
+        cell_name : str
+            the name of the resolved cell
+        layer : str
+            the typeName of the data layer of the cell
+        """
+        if self.maxsize <= 0:
+            return
+        resolution = {"cell_id": cell_id, "cell_name": cell_name, "layer": layer}
+        key = self.key(kind, identifier)
+        with self.__lock:
+            unchanged = self.__entries.get(key) == resolution
+            self.__merge({key: resolution})
+            if self.path is None or unchanged:
+                return
+            self.__pending += 1
+            if (
+                self.__pending >= self.flush_size
+                or time.monotonic() - self.__flushed >= self.flush_interval
+            ):
+                self.__flush()
+
+    def flush(self):
+        """Write pending entries to the file."""
+        with self.__lock:
+            if self.path is not None and self.__pending:
+                self.__flush()
+
+    def clear(self):
+        """Remove all entries."""
+        with self.__lock:
+            self.__entries.clear()
+            self.__pending = 0
+            if self.path is not None:
+                self.__write()
+
+    def __merge(self, entries):
+        """Add entries, evicting the least recently used ones."""
+        for key, resolution in entries.items():
+            self.__entries[key] = resolution
+            self.__entries.move_to_end(key)
+        while len(self.__entries) > max(self.maxsize, 0):
+            self.__entries.popitem(last=False)
+
+    def __flush(self):
+        """Write all entries to the file, the lock must be held."""
+        # Merge entries stored by other processes in the meantime, own
+        # entries take precedence
+        entries = self.__entries
+        self.__entries = OrderedDict()
+        self.__merge(self.__read())
+        self.__merge(entries)
+        self.__write()
+        self.__pending = 0
+        self.__flushed = time.monotonic()
+
+    def __read(self):
+        """Read the entries from the file, ignoring other format versions."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != RESOLUTION_FORMAT_VERSION:
+                return {}
+            return dict(data["entries"])
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            return {}
+
+    def __write(self):
+        """Write all entries to the file."""
+        data = {"version": RESOLUTION_FORMAT_VERSION, "entries": self.__entries}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_RESOLUTION_CACHE = ResolutionCache()
+
+
+def get_resolution_cache():
+    """Return the resolution cache shared by all API classes."""
+    return _RESOLUTION_CACHE
+
+
+def set_resolution_cache(cache=None):
+    """
+    Replace the resolution cache shared by all API classes.
+
+    Pending entries of the replaced cache are written to its file.
+
+    Parameters
+    ----------
+    cache : ResolutionCache
+        the cache to be used, e.g. ResolutionCache(path) for a persistent one
+        or ResolutionCache(maxsize=0) to disable it. If None a new in-memory
+        cache is used.
+    """
+    global _RESOLUTION_CACHE  # pylint: disable=global-statement
+    previous = _RESOLUTION_CACHE
+    _RESOLUTION_CACHE = cache if cache is not None else ResolutionCache()
+    if previous is not _RESOLUTION_CACHE:
+        previous.flush()
+
+
+@atexit.register
+def _flush_resolution_cache():
+    """Write pending entries of the shared resolution cache on exit."""
+    _RESOLUTION_CACHE.flush()
@@ -0,0 +1,285 @@
+"""
+
+Columnar weather warnings for vectorized analyses.
+
+All warnings of the requested layers are parsed directly from the streamed
+response into NumPy arrays, one array per column. Requires the optional numpy
+dependency, install with: pip install dwdwfsapi[numpy]
+
+"""
+
+import threading
+from datetime import UTC, datetime
+
+import numpy as np
+
+from .core import iter_features
+from .helpers import parse_rgb, parse_timestamp, severity_level
+from .weatherwarnings import WARNCELL_ID_PROPERTIES
+
+# Codes used in the urgency column
+URGENCY_CATEGORIES = ("immediate", "future")
+
+# Only the properties needed for the columns are retrieved
+TABLE_PROPERTIES = ("ONSET", "EXPIRES", "EC_II", "URGENCY", "SEVERITY", "EC_AREA_COLOR")
+
+COLUMN_TYPES = {
+    "warncell_id": np.uint32,
+    "start_time": "datetime64[s]",
+    "end_time": "datetime64[s]",
+    "event_code": np.uint16,
+    "level": np.uint8,
+    "urgency": np.uint8,
+    "color": np.uint32,
+}
+
+INITIAL_CAPACITY = 1024
+
+# Timestamps are collected as seconds since the epoch, NaT if missing
+NAT = np.iinfo(np.int64).min
+
+
+def epoch_seconds(value):
+    """Return a timestamp as seconds since the epoch or NAT."""
+    timestamp = parse_timestamp(value)
+    if timestamp is None:
+        return NAT
+    return int(timestamp.timestamp())
+
+
+def rgb_value(value):
+    """Return a color given as "r g b" as 0xRRGGBB or 0 if invalid."""
+    rgb = parse_rgb(value)
+    if rgb is None:
+        return 0
+    return (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
+
+
+class ColumnBuilder:
+    """Collect rows into preallocated arrays which grow as needed."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        """
+        Init column builder.
+
+        Parameters
+        ----------
+        capacity : int
+            number of rows allocated initially
+        """
+        self.size = 0
+        self.capacity = capacity
+        self.__arrays = {
+            # Timestamps are stored as integers until the arrays are finished
+            name: np.empty(capacity, np.int64 if dtype == "datetime64[s]" else dtype)
+            for name, dtype in COLUMN_TYPES.items()
+        }
+
+    def append(self, warncell_id, properties):
+        """Append the row of one warning."""
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for name, array in self.__arrays.items():
+                self.__arrays[name] = np.resize(array, self.capacity)
+
+        row = self.size
+        arrays = self.__arrays
+        arrays["warncell_id"][row] = warncell_id
+        arrays["start_time"][row] = epoch_seconds(properties.get("ONSET"))
+        arrays["end_time"][row] = epoch_seconds(properties.get("EXPIRES"))
+        try:
+            arrays["event_code"][row] = int(properties["EC_II"])
+        except:  # pylint: disable=bare-except
+            arrays["event_code"][row] = 0
+        arrays["level"][row] = severity_level(properties.get("SEVERITY"))
+        try:
+            future = properties["URGENCY"].lower() == "future"
+        except:  # pylint: disable=bare-except
+            future = False
+        arrays["urgency"][row] = 1 if future else 0
+        arrays["color"][row] = rgb_value(properties.get("EC_AREA_COLOR"))
+        self.size += 1
+
+    def finish(self):
+        """Return the columns trimmed to the number of rows."""
+        return {
+            name: self.__arrays[name][: self.size].astype(dtype)
+            for name, dtype in COLUMN_TYPES.items()
+        }
+
+
+class WarningsTable:
+    """
+    Class holding all weather warnings issued by DWD as columns.
+
+    Every warning is a row, every attribute listed below a NumPy array with
+    one entry per row. All columns are None if no valid data is available.
+
+    Attributes:
+    -----------
+    data_valid : bool
+        a flag wether or not the other attributes contain valid values
+    layers : tuple of str
+        the downloaded warning layers
+    last_update : datetime
+        the UTC timestamp of the last update
+    warncell_id : numpy.ndarray of uint32
+        the warncell id of the warning
+    start_time : numpy.ndarray of datetime64[s]
+        UTC timestamp when the warning starts, NaT if unknown
+    end_time : numpy.ndarray of datetime64[s]
+        UTC timestamp when the warning ends, NaT if unknown
+    event_code : numpy.ndarray of uint16
+        integer representation of the warning event
+    level : numpy.ndarray of uint8
+        warning level (0 - 4)
+    urgency : numpy.ndarray of uint8
+        index into URGENCY_CATEGORIES, i.e. 0 = immediate and 1 = future
+    color : numpy.ndarray of uint32
+        warning color as 0xRRGGBB
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # The columns are None until valid data is available
+    # pylint: disable=unsubscriptable-object
+
+    def __init__(self, layers=("dwd:Warnungen_Gemeinden", "dwd:Warnungen_Landkreise")):
+        """
+        Init DWD weather warnings table.
+
+        Parameters
+        ----------
+        layers : tuple of str
+            the warning layers to be downloaded
+        """
+        self.data_valid = False
+        self.layers = tuple(layers)
+        self.last_update = None
+        self.warncell_id = None
+        self.start_time = None
+        self.end_time = None
+        self.event_code = None
+        self.level = None
+        self.urgency = None
+        self.color = None
+        self._lock = threading.Lock()
+
+        self.update()
+
+    def __bool__(self):
+        """Return the data_valid attribute."""
+        return self.data_valid
+
+    def __len__(self):
+        """Return the number of warnings."""
+        with self._lock:
+            if self.data_valid:
+                return len(self.warncell_id)
+            return 0
+
+    def __str__(self):
+        """Return a short overview about the actual status."""
+        with self._lock:
+            warncell_ids = self.warncell_id if self.data_valid else None
+        if warncell_ids is not None:
+            cells = len(np.unique(warncell_ids))
+            retval = f"{len(warncell_ids)} warnings issued by DWD for {cells} warncells"
+        else:
+            retval = "No valid data available"
+        return retval
+
+    def update(self):
+        """Update data by querying DWD server and parsing result."""
+        builder = ColumnBuilder()
+        last_update = None
+        for layer in self.layers:
+            prop = WARNCELL_ID_PROPERTIES.get(layer, "WARNCELLID")
+            stream = iter_features(
+                typeName=layer,
+                propertyName=(prop, *TABLE_PROPERTIES),
+            )
+            if stream is not None:
+                last_update = self.__parse_result(prop, stream, builder)
+            if stream is None or not stream.valid:
+                with self._lock:
+                    self.data_valid = False
+                    self.last_update = None
+                    self.__set_columns(None)
+                return
+
+        columns = builder.finish()
+        # Readers must not see columns of different updates
+        with self._lock:
+            self.last_update = last_update
+            self.__set_columns(columns)
+            self.data_valid = True
+
+    def urgency_labels(self):
+        """Return the urgency column as array of strings."""
+        with self._lock:
+            if not self.data_valid:
+                return None
+            urgency = self.urgency
+        return np.array(URGENCY_CATEGORIES)[urgency]
+
+    def rows_for_cell(self, warncell_id):
+        """
+        Return the row indexes of all warnings for a warncell.
+
+        Parameters
+        ----------
+        warncell_id : int or str
+            a valid warncell id
+        """
+        with self._lock:
+            if not self.data_valid:
+                return np.empty(0, np.intp)
+            warncell_ids = self.warncell_id
+        return np.flatnonzero(warncell_ids == int(warncell_id))
+
+    def max_level_per_cell(self, urgency=None):
+        """
+        Return the highest warning level of every warncell with warnings.
+
+        Parameters
+        ----------
+        urgency : str
+            only consider "immediate" or "future" warnings, all if None
+
+        Returns a tuple of two arrays, the sorted warncell ids and their
+        highest warning levels.
+        """
+        with self._lock:
+            if not self.data_valid:
+                return np.empty(0, np.uint32), np.empty(0, np.uint8)
+            warncell_ids = self.warncell_id
+            levels = self.level
+            urgencies = self.urgency
+        if urgency is not None:
+            mask = urgencies == URGENCY_CATEGORIES.index(urgency)
+            warncell_ids = warncell_ids[mask]
+            levels = levels[mask]
+        cells, inverse = np.unique(warncell_ids, return_inverse=True)
+        max_levels = np.zeros(len(cells), np.uint8)
+        np.maximum.at(max_levels, inverse, levels)
+        return cells, max_levels
+
+    def __set_columns(self, columns):
+        """Set all column attributes, None resets them."""
+        for name in COLUMN_TYPES:
+            setattr(self, name, None if columns is None else columns[name])
+
+    @staticmethod
+    def __parse_result(prop, stream, builder):
+        """Parse the streamed features into the column builder."""
+        for properties in stream:
+            try:
+                warncell_id = int(properties[prop])
+            except (KeyError, TypeError, ValueError):
+                continue
+            builder.append(warncell_id, properties)
+
+        try:
+            return datetime.fromisoformat(stream.members["timeStamp"])
+        except:  # pylint: disable=bare-except
+            return datetime.now(UTC)
@@ -7,24 +7,269 @@ https://maps.dwd.de
 
 """
 
+import threading
+import time
 import urllib.parse
+import weakref
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from .limiter import OVERLOAD_STATUS_CODES
+from .metrics import QueryProbe, error_kind, record_cache_lookup, record_coalesced
+from .stream import FeatureStream
+
+DEFAULT_BASE_URL = "https://maps.dwd.de/geoserver/dwd/ows"
 DEFAULT_WFS_VERSION = "2.0.0"
 DEFAULT_WFS_REQUEST = "GetFeature"
 DEFAULT_WFS_OUTPUTFORMAT = "application/json"
 DEFAULT_TIMEOUT = 10.0
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+STREAM_CHUNK_SIZE = 65536
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+DEFAULT_CACHE_TTL = 60.0
 
+# Time to live of cached responses in seconds
+# Forecasts are updated once a day, regions hardly ever change
+LAYER_CACHE_TTL = {
+    "dwd:Pollenflug": 3600.0,
+    "dwd:Biowettervorhersage": 3600.0,
+    "dwd:Pollenfluggebiete": 86400.0,
+    "dwd:Biowettergebiete": 86400.0,
+    "dwd:Warngebiete_Gemeinden": 86400.0,
+    "dwd:Warngebiete_Kreise": 86400.0,
+    "dwd:Warngebiete_Binnenseen": 86400.0,
+    "dwd:Warngebiete_Kueste": 86400.0,
+}
 
-def query_dwd(**kwargs):
-    """Retrive data from DWD server."""
-    # pylint: disable=too-many-branches
+# Returned by query_dwd if the data didn't change since the last query
+NOT_MODIFIED = object()
+
+_BASE_URL = DEFAULT_BASE_URL
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+_CACHE = None
+_CACHE_TTL = {}
+_COALESCING = True
+_LIMITER = None
+_IN_FLIGHT = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+_SOCKETS = weakref.WeakSet()
+_SOCKETS_LOCK = threading.Lock()
+
+
+class LimitedRetry(Retry):
+    """
+    Retry which leaves overload responses to fetch while a limiter is set.
+
+    Retries within the session would bypass the limiter, so 429 and 503 are
+    retried by fetch instead, taking a new token and slot for every attempt.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        """Return whether the session retries the response."""
+        if _LIMITER is not None and status_code in OVERLOAD_STATUS_CODES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def create_session(
+    pool_size=DEFAULT_POOL_SIZE,
+    retries=DEFAULT_RETRIES,
+    backoff_factor=DEFAULT_BACKOFF_FACTOR,
+):
+    """
+    Create a pooled session suitable for querying the DWD geoserver.
+
+    Parameters
+    ----------
+    pool_size : int
+        maximum number of keep-alive connections kept per host
+    retries : int
+        number of retries on connection errors and retryable status codes
+    backoff_factor : float
+        factor for the exponential backoff between retries
+    """
+    retry = LimitedRetry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def get_session():
+    """Return the shared session, creating it on first use."""
+    global _SESSION  # pylint: disable=global-statement
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = create_session()
+        return _SESSION
+
+
+def set_session(session=None):
+    """
+    Replace the shared session used by all API classes.
+
+    Parameters
+    ----------
+    session : requests.Session
+        session to be used for all further queries. If None the current
+        session is closed and a new default one is created on next use.
+    """
+    global _SESSION  # pylint: disable=global-statement
+    with _SESSION_LOCK:
+        if _SESSION is not None and _SESSION is not session:
+            _SESSION.close()
+        _SESSION = session
+
+
+def set_base_url(url=None):
+    """
+    Change the WFS endpoint all queries are sent to.
+
+    Parameters
+    ----------
+    url : str
+        WFS endpoint, e.g. a local stub server. If None the DWD geoserver is
+        used.
+    """
+    global _BASE_URL  # pylint: disable=global-statement
+    _BASE_URL = url if url is not None else DEFAULT_BASE_URL
+
+
+def get_cache():
+    """Return the response cache in use, if any."""
+    return _CACHE
+
+
+def set_cache(cache=None, ttl=DEFAULT_CACHE_TTL, layer_ttl=None):
+    """
+    Activate a response cache for all queries.
+
+    Parameters
+    ----------
+    cache : dwdwfsapi.cache.ResponseCache
+        cache to be used, e.g. MemoryCache or DiskCache. If None caching is
+        disabled.
+    ttl : float
+        time to live in seconds for layers without a specific setting
+    layer_ttl : dict
+        time to live in seconds per typeName, overrides LAYER_CACHE_TTL
+    """
+    global _CACHE, _CACHE_TTL  # pylint: disable=global-statement
+    _CACHE = cache
+    _CACHE_TTL = {None: ttl, **LAYER_CACHE_TTL, **(layer_ttl or {})}
+
+
+def cache_ttl(typename):
+    """Return the time to live of cached responses for a typeName."""
+    return _CACHE_TTL.get(typename, _CACHE_TTL.get(None, DEFAULT_CACHE_TTL))
+
+
+def set_coalescing(enabled=True):
+    """
+    Share one request between concurrent identical queries.
+
+    Parameters
+    ----------
+    enabled : bool
+        if set, concurrent queries with the same normalized parameters, cache
+        validators and session wait for a single request to the DWD server
+        and share its result instead of sending their own requests
+    """
+    global _COALESCING  # pylint: disable=global-statement
+    _COALESCING = enabled
+
+
+def get_limiter():
+    """Return the limiter in use, if any."""
+    return _LIMITER
+
+
+def set_limiter(limiter=None):
+    """
+    Limit the rate and concurrency of all queries.
+
+    Parameters
+    ----------
+    limiter : dwdwfsapi.limiter.Limiter
+        limiter shared by all queries of all API classes, threads and event
+        loops. If None queries aren't limited.
+    """
+    global _LIMITER  # pylint: disable=global-statement
+    _LIMITER = limiter
+
+
+def coalescing_enabled():
+    """Return whether concurrent identical queries are coalesced."""
+    return _COALESCING
+
+
+class InFlightCall:  # pylint: disable=too-few-public-methods
+    """A request shared by concurrent identical queries."""
+
+    def __init__(self):
+        """Init in-flight call."""
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def coalesce(key, func):
+    """
+    Run func once for all concurrent calls with the same key.
+
+    The first caller runs func, all callers arriving until it returns wait
+    for and share its result. If func raises, the exception is raised in all
+    callers. Returns a tuple of the result and whether the result was shared.
+    """
+    with _IN_FLIGHT_LOCK:
+        call = _IN_FLIGHT.get(key)
+        leader = call is None
+        if leader:
+            call = _IN_FLIGHT[key] = InFlightCall()
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    try:
+        call.result = func()
+    except BaseException as err:
+        call.error = err
+        raise
+    finally:
+        with _IN_FLIGHT_LOCK:
+            del _IN_FLIGHT[key]
+        call.done.set()
+    return call.result, False
+
+
+def build_query(**kwargs):
+    """Build the query url, return None if the query is incomplete."""
+    # Lists of values are comma separated
+    kwargs = {
+        k: ",".join(v) if isinstance(v, (list, tuple)) else v for k, v in kwargs.items()
+    }
     # Make all keys lowercase and escape all values
     kwargs = {k.lower(): urllib.parse.quote(v) for k, v in kwargs.items()}
 
     # Build the query
-    query = "https://maps.dwd.de/geoserver/dwd/ows?service=WFS"
+    query = f"{_BASE_URL}?service=WFS"
     if "version" in kwargs:
         query += f"&version={kwargs['version']}"
     else:
@@ -40,20 +285,268 @@ def query_dwd(**kwargs):
         return None
     if "cql_filter" in kwargs:
         query += f"&CQL_FILTER={kwargs['cql_filter']}"
+    if "propertyname" in kwargs:
+        query += f"&propertyName={kwargs['propertyname']}"
+    if "srsname" in kwargs:
+        query += f"&srsName={kwargs['srsname']}"
     if "outputformat" in kwargs:
         query += f"&OutputFormat={kwargs['outputformat']}"
     else:
         query += f"&OutputFormat={DEFAULT_WFS_OUTPUTFORMAT}"
-    if "timeout" in kwargs:
-        timeout = kwargs["timeout"]
-    else:
-        timeout = DEFAULT_TIMEOUT
+    return query
+
+
+def conditional_headers(validators):
+    """Return the headers for a conditional request."""
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def store_validators(validators, headers):
+    """Remember the cache validators of a response."""
+    if validators is None:
+        return
+    validators["etag"] = headers.get("ETag")
+    validators["last_modified"] = headers.get("Last-Modified")
+
+
+def connection_reused(resp):
+    """
+    Return whether a streamed response was received on a reused connection.
+
+    The sockets of all responses are remembered, so a socket seen before
+    belongs to a kept-alive connection. Returns None if unknown.
+    """
+    sock = getattr(getattr(resp.raw, "connection", None), "sock", None)
+    if sock is None:
+        return None
+    with _SOCKETS_LOCK:
+        reused = sock in _SOCKETS
+        _SOCKETS.add(sock)
+    return reused
+
+
+def query_dwd(**kwargs):
+    """
+    Retrive data from DWD server.
+
+    Besides the WFS parameters the following options are accepted:
+    timeout : float
+        timeout of the request in seconds
+    session : requests.Session
+        session to be used instead of the shared one
+    validators : dict
+        cache validators of the last response, they are sent as conditional
+        request and updated afterwards. NOT_MODIFIED is returned if the data
+        didn't change.
+
+    Concurrent identical queries share a single request and its result, see
+    set_coalescing(). The returned data must therefore not be modified.
+    """
+    # Options which are not part of the query itself
+    kwargs = {k.lower(): v for k, v in kwargs.items()}
+    timeout = kwargs.pop("timeout", DEFAULT_TIMEOUT)
+    session = kwargs.pop("session", None)
+    if session is None:
+        session = get_session()
+    validators = kwargs.pop("validators", None)
+
+    query = build_query(**kwargs)
+    if query is None:
+        return None
+
+    # The normalized query is used as cache key
+    cache = _CACHE
+    if cache is not None:
+        json_data = cache.get(query)
+        record_cache_lookup(kwargs["typename"], json_data is not None)
+        if json_data is not None:
+            return json_data
 
     # Finally query the dwd geoserver
+    typename = kwargs["typename"]
+    headers = conditional_headers(validators)
+    if _COALESCING:
+        key = (query, tuple(sorted(headers.items())), session)
+        (json_data, resp_headers), shared = coalesce(
+            key, lambda: fetch(session, query, typename, timeout, headers)
+        )
+        if shared:
+            record_coalesced(typename)
+    else:
+        json_data, resp_headers = fetch(session, query, typename, timeout, headers)
+
+    if json_data is not None and json_data is not NOT_MODIFIED:
+        store_validators(validators, resp_headers)
+    return json_data
+
+
+def fetch(session, query, typename, timeout, headers):
+    """
+    Send a single request to the DWD server.
+
+    Returns a tuple of the retrieved data, NOT_MODIFIED or None and the
+    response headers.
+    """
+    probe = QueryProbe(typename)
+    limiter = _LIMITER
+    started = None
+    status = None
     try:
-        resp = requests.get(query, timeout=timeout)
+        # The body is read separately to time the download
+        resp, started = send(
+            session, query, limiter, probe, timeout=timeout, headers=headers
+        )
+        status = resp.status_code
+        probe.reused = connection_reused(resp)
+        probe.phase("response")
+        content = resp.content
+        probe.phase("download", len(content))
+        if resp.status_code == 304 and headers:
+            probe.finish(status)
+            return NOT_MODIFIED, resp.headers
         if resp.status_code != 200:
+            probe.finish(status)
+            return None, resp.headers
+        json_data = resp.json()
+        probe.phase("decode")
+        if _CACHE is not None:
+            _CACHE.set(query, json_data, cache_ttl(typename))
+        probe.finish(status)
+        return json_data, resp.headers
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        probe.finish(status, err)
+        return None, None
+    finally:
+        if started is not None:
+            limiter.release(started, probe.status, probe.error_kind)
+
+
+def overload_retries(session, url):
+    """
+    Return the number of retries and the backoff factor for overloads.
+
+    Only sessions created by create_session leave these retries to send.
+    """
+    try:
+        retry = session.get_adapter(url).max_retries
+    except Exception:  # pylint: disable=broad-exception-caught
+        return 0, 0.0
+    if not isinstance(retry, LimitedRetry) or not isinstance(retry.total, int):
+        return 0, 0.0
+    return retry.total, retry.backoff_factor
+
+
+def send(session, url, limiter, probe, **kwargs):
+    """
+    Send a streamed request, passing the limiter before every attempt.
+
+    While a limiter is set, responses signalling an overload are retried
+    here instead of within the session and each of them is reported to the
+    limiter. Returns the response and the time returned by
+    limiter.acquire(), which has to be passed to limiter.release() when the
+    response is finished. The time is None without limiter.
+    """
+    retries, backoff_factor = 0, 0.0
+    if limiter is not None:
+        retries, backoff_factor = overload_retries(session, url)
+    attempt = 0
+    while True:
+        started = None
+        if limiter is not None:
+            started = limiter.acquire()
+            probe.phase("throttle")
+        try:
+            resp = session.get(url, stream=True, **kwargs)
+        except Exception as err:
+            if limiter is not None:
+                limiter.release(started, None, error_kind(err))
+            raise
+        if attempt == retries or resp.status_code not in OVERLOAD_STATUS_CODES:
+            return resp, started
+        probe.phase("response")
+        resp.close()
+        limiter.release(started, resp.status_code)
+        time.sleep(backoff_factor * 2**attempt)
+        probe.phase("backoff")
+        attempt += 1
+
+
+def counted_chunks(chunks, probe):
+    """Pass the chunks of a streamed response and report it when finished."""
+    error = None
+    try:
+        for chunk in chunks:
+            probe.size += len(chunk)
+            yield chunk
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        error = err
+        raise
+    finally:
+        # Downloading and parsing are interleaved
+        probe.phase("stream")
+        probe.finish(200, error)
+
+
+def iter_features(**kwargs):
+    """
+    Retrive data from DWD server as stream of features.
+
+    Accepts the same parameters as query_dwd. Instead of the complete
+    feature collection a FeatureStream is returned, which yields the
+    properties of one feature after the other while the data is still being
+    downloaded. Returns None if the query failed.
+    """
+    # Options which are not part of the query itself
+    kwargs = {k.lower(): v for k, v in kwargs.items()}
+    timeout = kwargs.pop("timeout", DEFAULT_TIMEOUT)
+    session = kwargs.pop("session", None)
+    if session is None:
+        session = get_session()
+
+    query = build_query(**kwargs)
+    if query is None:
+        return None
+
+    probe = QueryProbe(kwargs["typename"])
+    limiter = _LIMITER
+    try:
+        resp, started = send(session, query, limiter, probe, timeout=timeout)
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        probe.finish(None, err)
+        return None
+    responded = time.monotonic()
+    released = threading.Event()
+
+    def release():
+        # The limiter slot is held until the stream is finished or closed,
+        # but only the time until the response arrived counts as latency
+        if started is not None and not released.is_set():
+            released.set()
+            limiter.release(started, resp.status_code, probe.error_kind, responded)
+
+    try:
+        probe.reused = connection_reused(resp)
+        probe.phase("response")
+        if resp.status_code != 200:
+            resp.close()
+            probe.finish(resp.status_code)
+            release()
             return None
-        return resp.json()
-    except:  # pylint: disable=bare-except
+        chunks = counted_chunks(resp.iter_content(STREAM_CHUNK_SIZE), probe)
+
+        def close():
+            chunks.close()
+            resp.close()
+            release()
+
+        return FeatureStream(chunks, close=close)
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        probe.finish(None, err)
+        release()
         return None
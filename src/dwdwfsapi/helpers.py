@@ -0,0 +1,180 @@
+"""
+
+Helpers shared by all modules.
+
+Only a few distinct colors, timestamps and severities occur within a layer,
+so the conversions are memoized in bounded tables. The forecast layers of
+pollen flight and bio weather share their structure, so they are indexed by
+the same functions.
+
+"""
+
+import functools
+import inspect
+from datetime import datetime
+
+WEATHER_SEVERITY_MAPPING = {
+    "minor": 1,
+    "moderate": 2,
+    "severe": 3,
+    "extreme": 4,
+}
+
+
+@functools.lru_cache(maxsize=64)
+def lowercase_keys(keys):
+    """Map the lowercase version of all keys to the original keys."""
+    return {k.lower(): k for k in keys}
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_timestamp(value):
+    """Parse an ISO timestamp, return None if invalid."""
+    try:
+        return datetime.fromisoformat(value)
+    except:  # pylint: disable=bare-except
+        return None
+
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp, return None if invalid."""
+    try:
+        return _cached_timestamp(value)
+    except TypeError:
+        # Unhashable values can't be cached and are invalid anyway
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_rgb(value):
+    """Split a color given as "r g b" into a tuple, None if invalid."""
+    try:
+        colors = value.split(" ")
+        return int(colors[0]), int(colors[1]), int(colors[2])
+    except:  # pylint: disable=bare-except
+        return None
+
+
+def parse_rgb(value):
+    """Split a color given as "r g b" into a tuple, None if invalid."""
+    try:
+        return _cached_rgb(value)
+    except TypeError:
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_color(value):
+    """Convert a color given as "r g b" into #rrggbb."""
+    rgb = _cached_rgb(value)
+    if rgb is None:
+        return "#000000"
+    return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
+
+
+def parse_color(value):
+    """Convert a color given as "r g b" into #rrggbb, #000000 if invalid."""
+    try:
+        return _cached_color(value)
+    except TypeError:
+        return "#000000"
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_severity(value):
+    """Map a severity to a warning level."""
+    try:
+        return WEATHER_SEVERITY_MAPPING.get(value.lower(), 0)
+    except:  # pylint: disable=bare-except
+        return 0
+
+
+def severity_level(value):
+    """Map a severity to a warning level (0 - 4), 0 if unknown."""
+    try:
+        return _cached_severity(value)
+    except TypeError:
+        return 0
+
+
+def add_forecast(forecast_data, seen, forecast, convert, records=False):
+    """
+    Add the forecast of a single feature to the forecast data.
+
+    Parameters
+    ----------
+    forecast_data : dict
+        the forecast data of a region, e.g. DwdPollenFlightAPI.forecast_data
+    seen : dict
+        the keys of the forecasts already added, per data type
+    forecast : dict
+        the properties of the feature
+    convert : callable
+        the convert_forecast_data function of the product
+    records : bool
+        add a ForecastEntry record instead of a dictionary
+    """
+    if not forecast["EC_II"] in forecast_data:
+        forecast_data[forecast["EC_II"]] = {}
+        forecast_data[forecast["EC_II"]]["name"] = forecast["PARAMETER_NAME"]
+        forecast_data[forecast["EC_II"]]["forecast"] = []
+        seen[forecast["EC_II"]] = set()
+
+    single_forecast = convert(forecast, records)
+    # DWD is returning some datasets twice
+    if single_forecast is not None:
+        key = tuple(single_forecast.values())
+        if key not in seen[forecast["EC_II"]]:
+            seen[forecast["EC_II"]].add(key)
+            forecast_data[forecast["EC_II"]]["forecast"].append(single_forecast)
+
+
+def sort_forecasts(forecast_data):
+    """Sort the forecast entries of all data types by start_time."""
+    for data in forecast_data.values():
+        data["forecast"].sort(key=lambda k: k["start_time"])
+
+
+def index_forecast_layer(features, convert, records=False):
+    """
+    Parse the features of a whole forecast layer in a single pass.
+
+    Parameters
+    ----------
+    features : iterable of dict
+        the features of all regions, e.g. the "features" of a query without
+        CQL filter
+    convert : callable
+        the convert_forecast_data function of the product
+    records : bool
+        store ForecastEntry records instead of dictionaries
+
+    Returns a dictionary mapping the region id (GF) to its forecast data.
+    Features without valid region id are skipped.
+    """
+    regions = {}
+    seen = {}
+    for feature in features:
+        forecast = feature["properties"]
+        try:
+            region = int(forecast["GF"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        add_forecast(
+            regions.setdefault(region, {}),
+            seen.setdefault(region, {}),
+            forecast,
+            convert,
+            records,
+        )
+    for forecast_data in regions.values():
+        sort_forecasts(forecast_data)
+    return regions
+
+
+def check_sync(instance):
+    """Raise TypeError if the instance can only be updated asynchronously."""
+    if inspect.iscoroutinefunction(getattr(instance, "update", None)):
+        raise TypeError(
+            f"{type(instance).__name__} has to be updated by awaiting its update()"
+        )
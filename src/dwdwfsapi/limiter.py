@@ -0,0 +1,291 @@
+"""
+
+Rate limiting and adaptive concurrency of the queries sent to the geoserver.
+
+A token bucket bounds the sustained rate of requests while still allowing
+short bursts. In addition the number of concurrent requests adapts to the
+server: it grows by about one per round of successful requests and is halved
+whenever a request is throttled (429 or 503), times out or exceeds the latency
+target (additive increase, multiplicative decrease). A limiter is activated by
+dwdwfsapi.core.set_limiter() and is shared by all API classes, threads and
+event loops.
+
+"""
+
+import asyncio
+import threading
+import time
+
+from .metrics import record_limiter_decrease, record_limiter_state, record_throttled
+
+DEFAULT_RATE = 10.0  # requests per second
+DEFAULT_BURST = 20
+DEFAULT_INITIAL_CONCURRENCY = 4
+# Matches the pool size of the shared session
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_LATENCY_TARGET = 5.0  # seconds
+DECREASE_FACTOR = 0.5
+
+# Status codes and failures indicating an overloaded server
+OVERLOAD_STATUS_CODES = (429, 503)
+OVERLOAD_ERRORS = ("timeout",)
+
+
+class TokenBucket:
+    """
+    Limit the sustained rate of requests.
+
+    Attributes:
+    -----------
+    rate : float
+        number of tokens added per second
+    burst : int
+        maximum number of tokens
+    tokens : float
+        number of available tokens, negative if tokens have been reserved in
+        advance
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        """Init token bucket."""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, return the seconds to wait until it is available."""
+        with self.__lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.__updated) * self.rate
+            )
+            self.__updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class AdaptiveConcurrency:
+    """
+    Limit the number of concurrent requests adapting to the server (AIMD).
+
+    Attributes:
+    -----------
+    limit : float
+        the current limit, only its integer part is used
+    in_flight : int
+        number of running requests
+    minimum : int
+        the lowest limit
+    maximum : int
+        the highest limit
+    latency_target : float
+        requests taking longer than this number of seconds decrease the limit
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        initial=DEFAULT_INITIAL_CONCURRENCY,
+        minimum=1,
+        maximum=DEFAULT_MAX_CONCURRENCY,
+        latency_target=DEFAULT_LATENCY_TARGET,
+    ):
+        """Init adaptive concurrency."""
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.__last_decrease = float("-inf")
+        self.__condition = threading.Condition()
+        self.__async_waiters = []
+
+    def try_acquire(self):
+        """Take a slot if one is free, return whether it was taken."""
+        with self.__condition:
+            return self.__try_acquire()
+
+    def acquire(self):
+        """Wait for a free slot, return the current monotonic time."""
+        with self.__condition:
+            while not self.__try_acquire():
+                self.__condition.wait()
+        return time.monotonic()
+
+    async def acquire_async(self):
+        """Wait for a free slot, return the current monotonic time."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.__condition:
+                if self.__try_acquire():
+                    return time.monotonic()
+                future = loop.create_future()
+                self.__async_waiters.append((loop, future))
+            await future
+
+    def release(self, started, overloaded, responded=None):
+        """
+        Free a slot and adapt the limit.
+
+        Parameters
+        ----------
+        started : float
+            the time returned by acquire()
+        overloaded : bool or None
+            whether the server signalled an overload, None if the outcome
+            says nothing about the load (e.g. an invalid query)
+        responded : float
+            the monotonic time the response arrived, defaults to now
+
+        Returns whether the limit has been decreased.
+        """
+        now = time.monotonic()
+        latency = (now if responded is None else responded) - started
+        decreased = False
+        with self.__condition:
+            self.in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                # Requests started before the last decrease were affected by
+                # the same overload, so decrease only once per round trip
+                if started > self.__last_decrease:
+                    self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                    self.__last_decrease = now
+                    decreased = True
+            elif overloaded is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.__condition.notify_all()
+            waiters, self.__async_waiters = self.__async_waiters, []
+
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The event loop has been closed in the meantime
+                pass
+        return decreased
+
+    def __try_acquire(self):
+        """Take a slot if one is free, the condition must be held."""
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+
+def _wake(future):
+    """Wake an asynchronous waiter."""
+    if not future.done():
+        future.set_result(None)
+
+
+class Limiter:
+    """
+    Rate limit and adaptive concurrency shared by all queries.
+
+    Usage:
+        dwdwfsapi.core.set_limiter(Limiter(rate=5.0, max_concurrency=8))
+
+    Attributes:
+    -----------
+    bucket : TokenBucket
+        the rate limit, None if the rate isn't limited
+    concurrency : AdaptiveConcurrency
+        the limit of concurrent requests
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        initial_concurrency=DEFAULT_INITIAL_CONCURRENCY,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        latency_target=DEFAULT_LATENCY_TARGET,
+    ):
+        """
+        Init limiter.
+
+        Parameters
+        ----------
+        rate : float
+            maximum sustained number of requests per second, None disables the
+            rate limit
+        burst : int
+            maximum number of requests sent at once after a quiet period
+        initial_concurrency : int
+            number of concurrent requests allowed initially
+        max_concurrency : int
+            maximum number of concurrent requests, shouldn't exceed the pool
+            size of the session
+        latency_target : float
+            requests taking longer than this number of seconds are considered
+            as sign of an overloaded server
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.concurrency = AdaptiveConcurrency(
+            initial_concurrency,
+            maximum=max_concurrency,
+            latency_target=latency_target,
+        )
+
+    def acquire(self):
+        """Wait until a request may be sent, return the time it was allowed."""
+        delay = self.bucket.reserve() if self.bucket is not None else 0.0
+        if delay > 0:
+            record_throttled()
+            time.sleep(delay)
+        started = self.concurrency.acquire()
+        self.report()
+        return started
+
+    async def acquire_async(self):
+        """Wait until a request may be sent, see acquire."""
+        delay = self.bucket.reserve() if self.bucket is not None else 0.0
+        if delay > 0:
+            record_throttled()
+            await asyncio.sleep(delay)
+        started = await self.concurrency.acquire_async()
+        self.report()
+        return started
+
+    def release(self, started, status=None, error=None, responded=None):
+        """
+        Report the outcome of a request.
+
+        Parameters
+        ----------
+        started : float
+            the time returned by acquire()
+        status : int
+            the HTTP status code, None if no response was received
+        error : str
+            the kind of failure, see dwdwfsapi.metrics.error_kind
+        responded : float
+            the monotonic time the response headers arrived, defaults to
+            now. Streamed responses pass it, so the time the consumer spends
+            on the stream doesn't count as latency of the server.
+        """
+        if status in OVERLOAD_STATUS_CODES or error in OVERLOAD_ERRORS:
+            overloaded = True
+        elif status in (200, 304):
+            overloaded = False
+        else:
+            overloaded = None
+        if self.concurrency.release(started, overloaded, responded):
+            record_limiter_decrease()
+        self.report()
+
+    def report(self):
+        """Report the state of the limiter to the metrics."""
+        record_limiter_state(
+            self.concurrency.limit,
+            self.concurrency.in_flight,
+            self.bucket.tokens if self.bucket is not None else None,
+        )
@@ -0,0 +1,264 @@
+"""
+
+Offline lookup of warncells by gps location.
+
+The geometries of the warncells are downloaded once from the DWD geoserver
+and stored in a compact bundle. Locations are afterwards resolved locally by
+a point in polygon test, using a regular grid as spatial index.
+
+"""
+
+import gzip
+import json
+import math
+import os
+from datetime import UTC, datetime, timedelta
+
+from .core import query_dwd
+from .warncells import WEATHER_WARNINGS_QUERY_MAPPING
+
+BUNDLE_VERSION = 1
+GRID_SIZE = 0.1  # degrees
+COORDINATE_PRECISION = 5  # decimal places, about 1m
+DEFAULT_MAX_AGE = timedelta(days=30)
+
+_DEFAULT_LOCATOR = None
+
+
+def get_default_locator():
+    """Return the locator used by DwdWeatherWarningsAPI, if any."""
+    return _DEFAULT_LOCATOR
+
+
+def set_default_locator(locator=None):
+    """
+    Set the locator used by DwdWeatherWarningsAPI for gps locations.
+
+    Parameters
+    ----------
+    locator : WarncellLocator
+        locator to be used. If None gps locations are resolved by querying
+        the DWD server again.
+    """
+    global _DEFAULT_LOCATOR  # pylint: disable=global-statement
+    _DEFAULT_LOCATOR = locator
+
+
+def point_in_rings(longitude, latitude, rings):
+    """
+    Test whether a point lies within the given polygon rings.
+
+    The even-odd rule is used, so holes and multipolygons given as a flat
+    list of rings are handled correctly.
+    """
+    inside = False
+    for ring in rings:
+        x_1, y_1 = ring[-1]
+        for x_2, y_2 in ring:
+            if (y_2 > latitude) != (y_1 > latitude) and longitude < (x_1 - x_2) * (
+                latitude - y_2
+            ) / (y_1 - y_2) + x_2:
+                inside = not inside
+            x_1, y_1 = x_2, y_2
+    return inside
+
+
+def convert_geometry(geometry):
+    """Convert a GeoJSON (multi)polygon into a flat list of rings."""
+    if geometry is None:
+        return []
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return []
+    return [
+        [
+            [round(x, COORDINATE_PRECISION), round(y, COORDINATE_PRECISION)]
+            for x, y, *_ in ring
+        ]
+        for polygon in polygons
+        for ring in polygon
+    ]
+
+
+class WarncellLocator:
+    """
+    Class for resolving gps locations to warncells without querying DWD.
+
+    Attributes:
+    -----------
+    created : datetime
+        the UTC timestamp when the geometries were downloaded
+    regions : tuple of str
+        the region layers in the order they are searched
+    """
+
+    def __init__(self, bundle):
+        """
+        Init warncell locator.
+
+        Parameters
+        ----------
+        bundle : dict
+            geometry bundle as created by download()
+        """
+        self.__bundle = bundle
+        self.created = datetime.fromisoformat(bundle["created"])
+        self.regions = tuple(bundle["regions"])
+        self.__cells = []
+        self.__grid = {}
+
+        for region in self.regions:
+            for warncell_id, name, rings in bundle["regions"][region]:
+                if not rings:
+                    continue
+                index = len(self.__cells)
+                self.__cells.append((region, warncell_id, name, rings))
+                min_x = min(x for ring in rings for x, _ in ring)
+                max_x = max(x for ring in rings for x, _ in ring)
+                min_y = min(y for ring in rings for _, y in ring)
+                max_y = max(y for ring in rings for _, y in ring)
+                for grid_x in range(
+                    math.floor(min_x / GRID_SIZE), math.floor(max_x / GRID_SIZE) + 1
+                ):
+                    for grid_y in range(
+                        math.floor(min_y / GRID_SIZE),
+                        math.floor(max_y / GRID_SIZE) + 1,
+                    ):
+                        self.__grid.setdefault((grid_x, grid_y), []).append(index)
+
+    def __len__(self):
+        """Return the number of known warncells."""
+        return len(self.__cells)
+
+    @classmethod
+    def download(cls, path=None, regions=tuple(WEATHER_WARNINGS_QUERY_MAPPING)):
+        """
+        Download the warncell geometries from the DWD server.
+
+        Parameters
+        ----------
+        path : str
+            if given, the bundle is stored there for later use with load()
+        regions : iterable of str
+            the region layers to be downloaded in the order they are searched
+
+        Returns the new locator or None if the download failed.
+        """
+        bundle = {
+            "version": BUNDLE_VERSION,
+            "created": datetime.now(UTC).isoformat(),
+            "regions": {},
+        }
+        for region in regions:
+            # EPSG:4326 forces longitude/latitude axis order in GeoJSON
+            result = query_dwd(typeName=region, srsName="EPSG:4326")
+            if result is None:
+                return None
+            bundle["regions"][region] = [
+                [
+                    int(feature["properties"]["WARNCELLID"]),
+                    feature["properties"]["NAME"],
+                    convert_geometry(feature["geometry"]),
+                ]
+                for feature in result["features"]
+            ]
+
+        locator = cls(bundle)
+        if path is not None:
+            locator.save(path)
+        return locator
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a bundle stored by save().
+
+        Parameters
+        ----------
+        path : str
+            the file the bundle was stored to
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            bundle = json.load(f)
+        if bundle.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version in {path}")
+        return cls(bundle)
+
+    @classmethod
+    def from_cache(cls, path, max_age=DEFAULT_MAX_AGE):
+        """
+        Load a cached bundle and download a new one if it is missing or old.
+
+        Parameters
+        ----------
+        path : str
+            the file the bundle is cached in
+        max_age : timedelta
+            maximum age of the cached bundle
+
+        Returns None if neither a cached bundle nor the download is available.
+        """
+        try:
+            locator = cls.load(path)
+        except (OSError, ValueError, KeyError):
+            locator = None
+        if locator is not None and datetime.now(UTC) - locator.created <= max_age:
+            return locator
+        # Keep using the outdated bundle if the download fails
+        return cls.download(path) or locator
+
+    def save(self, path):
+        """
+        Store the bundle to a file.
+
+        Parameters
+        ----------
+        path : str
+            the file the bundle is stored to
+        """
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(self.__bundle, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def locate(self, latitude, longitude):
+        """
+        Find the warncell containing a gps location.
+
+        Parameters
+        ----------
+        latitude : float
+            latitude of the location
+        longitude : float
+            longitude of the location
+
+        Returns a tuple of (region, warncell id, warncell name) or None if the
+        location is not part of any warncell.
+        """
+        key = (math.floor(longitude / GRID_SIZE), math.floor(latitude / GRID_SIZE))
+        for index in self.__grid.get(key, ()):
+            region, warncell_id, name, rings = self.__cells[index]
+            if point_in_rings(longitude, latitude, rings):
+                return region, warncell_id, name
+        return None
+
+    def locate_many(self, points):
+        """
+        Find the warncell ids for many gps locations.
+
+        Parameters
+        ----------
+        points : iterable of (latitude, longitude)
+            the locations, e.g. a list of tuples or a (n, 2) numpy array
+
+        Returns a list of warncell ids, None for locations outside of all
+        warncells.
+        """
+        warncell_ids = []
+        for latitude, longitude in points:
+            result = self.locate(float(latitude), float(longitude))
+            warncell_ids.append(result[1] if result is not None else None)
+        return warncell_ids
@@ -0,0 +1,580 @@
+"""
+
+Instrumentation of the queries sent to the geoserver.
+
+Every query is split into timed phases: waiting for a free connection slot
+(asyncio only), resolving the host name and connecting (asyncio only),
+sending the request until the response headers arrived, downloading the body
+and decoding the JSON data. The synchronous queries can't tell name
+resolution and connecting apart from the response phase, instead they
+record whether a kept-alive connection was reused. Together with the status
+codes, failure causes, transferred bytes, connection reuse, cache lookups
+and parse durations they are
+
+- counted in the built-in metrics, which can be exported as Prometheus text
+- passed to all listeners registered with add_listener()
+- reported as spans to a tracer set with set_tracer(), which can be any
+  tracer providing the OpenTelemetry API, e.g.
+  opentelemetry.trace.get_tracer("dwdwfsapi")
+
+"""
+
+import contextlib
+import socket
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Type and help text of all built-in metrics
+METRIC_INFO = {
+    "dwdwfsapi_queries_total": (
+        "counter",
+        "Queries sent to the geoserver by HTTP status.",
+    ),
+    "dwdwfsapi_query_errors_total": (
+        "counter",
+        "Failed queries by cause.",
+    ),
+    "dwdwfsapi_received_bytes_total": (
+        "counter",
+        "Bytes received from the geoserver.",
+    ),
+    "dwdwfsapi_connections_total": (
+        "counter",
+        "Queries by whether a kept-alive connection was reused.",
+    ),
+    "dwdwfsapi_cache_lookups_total": (
+        "counter",
+        "Response cache lookups by result.",
+    ),
+    "dwdwfsapi_coalesced_queries_total": (
+        "counter",
+        "Queries answered by a concurrent identical query.",
+    ),
+    "dwdwfsapi_limiter_throttled_total": (
+        "counter",
+        "Queries delayed by the rate limit.",
+    ),
+    "dwdwfsapi_limiter_decreases_total": (
+        "counter",
+        "Decreases of the concurrency limit.",
+    ),
+    "dwdwfsapi_limiter_concurrency_limit": (
+        "gauge",
+        "Current limit of concurrent queries.",
+    ),
+    "dwdwfsapi_limiter_in_flight": (
+        "gauge",
+        "Queries currently sent to the geoserver.",
+    ),
+    "dwdwfsapi_limiter_tokens": (
+        "gauge",
+        "Tokens available in the rate limit bucket.",
+    ),
+    "dwdwfsapi_query_duration_seconds": (
+        "histogram",
+        "Duration of the query phases in seconds.",
+    ),
+    "dwdwfsapi_parse_duration_seconds": (
+        "histogram",
+        "Duration of parsing the retrieved data in seconds.",
+    ),
+}
+
+
+class Histogram:
+    """
+    Distribution of observed values in fixed buckets.
+
+    Attributes:
+    -----------
+    buckets : tuple of float
+        the upper bounds of the buckets
+    counts : list of int
+        the number of values per bucket, the last one counts all values
+        exceeding the largest bound
+    count : int
+        the number of observed values
+    sum : float
+        the sum of all observed values
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Init histogram."""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add a value."""
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """Return the number of values less or equal to every bound."""
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class Metrics:
+    """
+    Counters, gauges and latency histograms labeled by typeName.
+
+    Usage:
+        metrics = dwdwfsapi.metrics.get_metrics()
+        metrics.counter("dwdwfsapi_queries_total", typename="dwd:Pollenflug")
+        print(metrics.to_prometheus())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Init metrics.
+
+        Parameters
+        ----------
+        buckets : tuple of float
+            upper bounds of the histogram buckets in seconds
+        """
+        self.buckets = tuple(buckets)
+        self.__counters = {}
+        self.__gauges = {}
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+
+    def increment(self, name, labels, value=1):
+        """
+        Increment a counter.
+
+        Parameters
+        ----------
+        name : str
+            the name of the counter
+        labels : tuple
+            tuples of label name and value
+        value : int or float
+            the increment
+        """
+        key = (name, labels)
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def set_gauge(self, name, labels, value):
+        """Set a gauge, see increment for the parameters."""
+        with self.__lock:
+            self.__gauges[(name, labels)] = value
+
+    def observe(self, name, labels, value):
+        """Add a value to a histogram, see increment for the parameters."""
+        key = (name, labels)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def counter(self, name, **labels):
+        """Return the sum of all counters matching the given labels."""
+        with self.__lock:
+            return sum(
+                value
+                for (counter, counter_labels), value in self.__counters.items()
+                if counter == name and _matches(counter_labels, labels)
+            )
+
+    def gauge(self, name, **labels):
+        """Return the first gauge matching the given labels or None."""
+        with self.__lock:
+            for (gauge, gauge_labels), value in self.__gauges.items():
+                if gauge == name and _matches(gauge_labels, labels):
+                    return value
+        return None
+
+    def histogram(self, name, **labels):
+        """Return the first histogram matching the given labels or None."""
+        with self.__lock:
+            for (histogram, histogram_labels), value in self.__histograms.items():
+                if histogram == name and _matches(histogram_labels, labels):
+                    return value
+        return None
+
+    def reset(self):
+        """Remove all counters and histograms."""
+        with self.__lock:
+            self.__counters.clear()
+            self.__gauges.clear()
+            self.__histograms.clear()
+
+    def to_prometheus(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self.__lock:
+            series = {}
+            for (name, labels), value in [
+                *self.__counters.items(),
+                *self.__gauges.items(),
+            ]:
+                series.setdefault(name, []).append((labels, value))
+            for (name, labels), histogram in self.__histograms.items():
+                series.setdefault(name, []).append((labels, histogram))
+
+            lines = []
+            for name in sorted(series):
+                kind, description = METRIC_INFO.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series[name], key=lambda s: s[0]):
+                    if isinstance(value, Histogram):
+                        lines.extend(_histogram_lines(name, labels, value))
+                    else:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _matches(labels, selection):
+    """Check if the labels contain all selected values."""
+    labels = dict(labels)
+    return all(labels.get(k) == v for k, v in selection.items())
+
+
+def _format_labels(labels):
+    """Format labels as {name="value",...}."""
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _histogram_lines(name, labels, histogram):
+    """Return the exposition lines of a histogram."""
+    lines = []
+    bounds = [str(b) for b in histogram.buckets] + ["+Inf"]
+    for bound, count in zip(bounds, histogram.cumulative_counts()):
+        bucket_labels = _format_labels((*labels, ("le", bound)))
+        lines.append(f"{name}_bucket{bucket_labels} {count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return lines
+
+
+_METRICS = Metrics()
+_TRACER = None
+_LISTENERS = []
+
+
+def get_metrics():
+    """Return the metrics in use, if any."""
+    return _METRICS
+
+
+def set_metrics(metrics=None):
+    """
+    Replace the metrics all queries are counted in.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        metrics to be used, if None no metrics are collected
+    """
+    global _METRICS  # pylint: disable=global-statement
+    _METRICS = metrics
+
+
+def set_tracer(tracer=None):
+    """
+    Report all queries and parse runs as spans.
+
+    Parameters
+    ----------
+    tracer : object
+        a tracer providing start_span(name, attributes=...) which returns a
+        span providing set_attribute(), record_exception() and end(), like
+        the OpenTelemetry API. If None no spans are reported.
+    """
+    global _TRACER  # pylint: disable=global-statement
+    _TRACER = tracer
+
+
+def add_listener(callback):
+    """
+    Register a callback for all instrumentation events.
+
+    The callback is called with the name of the event ("query", "cache",
+    "coalesced" or "parse") and a dictionary of its attributes. Exceptions raised by the
+    callback are ignored.
+    """
+    _LISTENERS.append(callback)
+
+
+def remove_listener(callback):
+    """Unregister a callback registered with add_listener()."""
+    with contextlib.suppress(ValueError):
+        _LISTENERS.remove(callback)
+
+
+def _notify(event, attributes):
+    """Pass an event to all listeners."""
+    for callback in list(_LISTENERS):
+        try:
+            callback(event, attributes)
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+
+
+def _start_span(name, typename):
+    """Start a span if a tracer is set."""
+    if _TRACER is None:
+        return None
+    try:
+        return _TRACER.start_span(name, attributes={"dwd.typename": typename})
+    except Exception:  # pylint: disable=broad-exception-caught
+        return None
+
+
+def error_kind(err):
+    """
+    Classify an exception raised while querying.
+
+    Returns "dns", "timeout", "decode", "connect" or "other". The complete
+    chain of causes is examined, so the exceptions of requests and aiohttp
+    are classified alike.
+    """
+    chain = []
+    while err is not None and len(chain) < 16:
+        chain.append(err)
+        err = err.__cause__ or err.__context__
+    for kind, types in (
+        ("dns", socket.gaierror),
+        ("timeout", TimeoutError),
+        ("decode", ValueError),
+        ("connect", OSError),
+    ):
+        if any(isinstance(e, types) for e in chain):
+            return kind
+    for e in chain:
+        # Timeouts and connection errors of requests and urllib3 which don't
+        # derive from the builtin exceptions
+        if "Timeout" in type(e).__name__:
+            return "timeout"
+    return "other"
+
+
+class QueryProbe:
+    """
+    Measure the phases of a single query.
+
+    Attributes:
+    -----------
+    typename : str
+        the queried layer
+    durations : dict
+        seconds spent per phase
+    size : int
+        number of received bytes
+    status : int
+        the HTTP status code, None if no response was received
+    error_kind : str
+        the kind of failure, None if successful
+    reused : bool
+        whether the request was sent on a kept-alive connection, None if
+        unknown
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, typename):
+        """Start measuring a query."""
+        self.typename = typename
+        self.durations = {}
+        self.size = 0
+        self.status = None
+        self.error_kind = None
+        self.reused = None
+        self.__split = 0.0
+        self.__start = self.__last = time.perf_counter()
+        self.__span = _start_span("dwdwfsapi.query", typename)
+
+    def phase(self, name, size=0):
+        """Finish a phase which started with the previous phase."""
+        now = time.perf_counter()
+        duration = max(now - self.__last - self.__split, 0.0)
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+        self.__last = now
+        self.__split = 0.0
+        self.size += size
+
+    def subphase(self, name, duration):
+        """Split a measured part off the running phase, e.g. dns."""
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+        self.__split += duration
+
+    def finish(self, status=None, error=None):
+        """
+        Report the query.
+
+        Parameters
+        ----------
+        status : int
+            the HTTP status code, None if no response was received
+        error : Exception
+            the exception raised while querying, if any
+        """
+        self.durations["total"] = time.perf_counter() - self.__start
+        kind = None
+        if error is not None:
+            kind = error_kind(error)
+        elif status not in (200, 304):
+            kind = "http"
+        self.status = status
+        self.error_kind = kind
+
+        metrics = _METRICS
+        if metrics is not None:
+            self.__record_counters(metrics, status, kind)
+            self.__record_phases(metrics)
+        if self.__span is not None:
+            self.__end_span(status, error, kind)
+        if _LISTENERS:
+            _notify(
+                "query",
+                {
+                    "typename": self.typename,
+                    "status": status,
+                    "bytes": self.size,
+                    "durations": dict(self.durations),
+                    "reused": self.reused,
+                    "error": kind,
+                    "exception": error,
+                },
+            )
+
+    def __record_counters(self, metrics, status, kind):
+        """Count the query, its errors and the received bytes."""
+        typename = ("typename", self.typename)
+        status_label = ("status", str(status) if status else "none")
+        metrics.increment("dwdwfsapi_queries_total", (typename, status_label))
+        if kind is not None:
+            metrics.increment(
+                "dwdwfsapi_query_errors_total", (typename, ("error", kind))
+            )
+        if self.size:
+            metrics.increment("dwdwfsapi_received_bytes_total", (typename,), self.size)
+
+    def __record_phases(self, metrics):
+        """Observe the durations of all phases and the connection reuse."""
+        typename = ("typename", self.typename)
+        if self.reused is not None:
+            reused = ("reused", "true" if self.reused else "false")
+            metrics.increment("dwdwfsapi_connections_total", (typename, reused))
+        for phase, duration in self.durations.items():
+            metrics.observe(
+                "dwdwfsapi_query_duration_seconds",
+                (typename, ("phase", phase)),
+                duration,
+            )
+
+    def __end_span(self, status, error, kind):
+        """Add the outcome to the span of the query and end it."""
+        span = self.__span
+        try:
+            if status is not None:
+                span.set_attribute("http.response.status_code", status)
+            span.set_attribute("dwd.received_bytes", self.size)
+            if self.reused is not None:
+                span.set_attribute("dwd.connection.reused", self.reused)
+            for phase, duration in self.durations.items():
+                span.set_attribute(f"dwd.duration.{phase}", duration)
+            if error is not None:
+                span.set_attribute("error.type", kind)
+                span.record_exception(error)
+            span.end()
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+
+
+def record_cache_lookup(typename, hit):
+    """Count a lookup in the response cache."""
+    metrics = _METRICS
+    if metrics is not None:
+        result = ("result", "hit" if hit else "miss")
+        metrics.increment(
+            "dwdwfsapi_cache_lookups_total", (("typename", typename), result)
+        )
+    if _LISTENERS:
+        _notify("cache", {"typename": typename, "hit": hit})
+
+
+def record_coalesced(typename):
+    """Count a query answered by a concurrent identical query."""
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.increment(
+            "dwdwfsapi_coalesced_queries_total", (("typename", typename),)
+        )
+    if _LISTENERS:
+        _notify("coalesced", {"typename": typename})
+
+
+def record_throttled():
+    """Count a query delayed by the rate limit."""
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.increment("dwdwfsapi_limiter_throttled_total", ())
+
+
+def record_limiter_decrease():
+    """Count a decrease of the concurrency limit."""
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.increment("dwdwfsapi_limiter_decreases_total", ())
+
+
+def record_limiter_state(limit, in_flight, tokens):
+    """Update the gauges of the limiter state."""
+    metrics = _METRICS
+    if metrics is None:
+        return
+    metrics.set_gauge("dwdwfsapi_limiter_concurrency_limit", (), int(limit))
+    metrics.set_gauge("dwdwfsapi_limiter_in_flight", (), in_flight)
+    if tokens is not None:
+        metrics.set_gauge("dwdwfsapi_limiter_tokens", (), tokens)
+
+
+@contextlib.contextmanager
+def measure_parse(typename):
+    """Measure the duration of parsing the data of a layer."""
+    span = _start_span("dwdwfsapi.parse", typename)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        metrics = _METRICS
+        if metrics is not None:
+            metrics.observe(
+                "dwdwfsapi_parse_duration_seconds",
+                (("typename", typename),),
+                duration,
+            )
+        if span is not None:
+            try:
+                span.end()
+            except Exception:  # pylint: disable=broad-exception-caught
+                pass
+        if _LISTENERS:
+            _notify("parse", {"typename": typename, "duration": duration})
@@ -1,28 +1,62 @@
 """Python client to retrieve pollen flight forecast from DWD."""
 
+import threading
 from datetime import UTC, datetime
 
-from .core import query_dwd
+from .cache import get_resolution_cache
+from .core import NOT_MODIFIED, query_dwd
+from .helpers import add_forecast
+from .helpers import index_forecast_layer as index_layer
+from .helpers import parse_color, parse_timestamp, sort_forecasts
+from .metrics import measure_parse
+from .records import ForecastEntry
 
+# Only the properties which are actually evaluated are retrieved, this also
+# drops the geometry from the responses
+REGION_PROPERTIES = ("GF", "GEN")
+FORECAST_PROPERTIES = (
+    "GF",
+    "EC_II",
+    "PARAMETER_NAME",
+    "PARAMETER_VALUE",
+    "FORECAST_DATE",
+    "POLLENINT",
+    "EC_AREA_COLOR",
+)
 
-def convert_forecast_data(data_in):
-    """Convert the data received from DWD."""
+
+def convert_forecast_data(data_in, records=False):
+    """
+    Convert the data received from DWD.
+
+    Returns a dictionary, a ForecastEntry record if records is set or None if
+    the data is invalid.
+    """
     try:
         data_out = {}
-        data_out["start_time"] = datetime.fromisoformat(data_in["FORECAST_DATE"])
+        data_out["start_time"] = parse_timestamp(data_in["FORECAST_DATE"])
+        if data_out["start_time"] is None:
+            return None
         data_out["level"] = data_in["POLLENINT"]
         data_out["impact"] = data_in["PARAMETER_VALUE"]
-        try:
-            colors = data_in["EC_AREA_COLOR"].split(" ")
-            data_out["color"] = f"#{int(colors[0]):02x}{int(colors[1]):02x}"
-            data_out["color"] += f"{int(colors[2]):02x}"
-        except:  # pylint: disable=bare-except
-            data_out["color"] = "#000000"
+        data_out["color"] = parse_color(data_in.get("EC_AREA_COLOR"))
+        if records:
+            return ForecastEntry(**data_out)
         return data_out
     except:  # pylint: disable=bare-except
         return None
 
 
+def index_forecast_layer(features, records=False):
+    """
+    Parse the features of the whole layer in a single pass.
+
+    Returns a dictionary mapping the region id (GF) to its forecast data, see
+    DwdPollenFlightAPI.forecast_data and dwdwfsapi.helpers.index_forecast_layer.
+    """
+    return index_layer(features, convert_forecast_data, records)
+
+
 class DwdPollenFlightAPI:
     """
     Class for retrieving the pollen flight forecast from DWD.
@@ -44,7 +78,8 @@ class DwdPollenFlightAPI:
         name : str
             string representation of the data type
         forecast : list of dicts
-            list containing the forecast data
+            list containing the forecast data, ForecastEntry records with
+            identical keys if records is set
             start_time : datetime
                 timestamp when the forecast starts
             level : int
@@ -55,7 +90,12 @@ class DwdPollenFlightAPI:
                 forecast color formatted #rrggbb
     """
 
-    def __init__(self, identifier):
+    # pylint: disable=too-many-instance-attributes
+
+    # Version of the state returned by to_snapshot()
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, identifier, records=False):
         """
         Init DWD pollen flight forecast.
 
@@ -65,11 +105,17 @@ class DwdPollenFlightAPI:
             a valid cell id or name
             https://github.com/stephan192/dwdwfsapi/blob/master/docs/
             pollencells.md
+        records : bool
+            store the forecasts as compact ForecastEntry records instead of
+            dictionaries
         """
         self.data_valid = False
+        self.records = records
         self.cell_id = None
         self.cell_name = None
-        self.__query = None
+        self._query = None
+        self._validators = {}
+        self._lock = threading.Lock()
         self.last_update = None
         self.forecast_data = None
 
@@ -77,8 +123,7 @@ class DwdPollenFlightAPI:
         if not isinstance(identifier, (int, str)):
             return
 
-        self.__generate_query(identifier)
-        self.update()
+        self._setup(identifier)
 
     def __bool__(self):
         """Return the data_valid attribute."""
@@ -105,22 +150,100 @@ class DwdPollenFlightAPI:
             retval = "No valid data available"
         return retval
 
+    def to_snapshot(self):
+        """
+        Return the state needed to restore the instance, see from_snapshot().
+
+        Returns None if the identifier couldn't be resolved.
+        """
+        with self._lock:
+            if self._query is None:
+                return None
+            return {
+                "version": self.SNAPSHOT_VERSION,
+                "records": self.records,
+                "cell_id": self.cell_id,
+                "cell_name": self.cell_name,
+                "validators": dict(self._validators),
+                "data_valid": self.data_valid,
+                "last_update": self.last_update,
+                "forecast_data": self.forecast_data,
+            }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        """
+        Restore an instance from the state returned by to_snapshot().
+
+        No query is sent. Raises ValueError if the state was created by
+        another version.
+        """
+        if state.get("version") != cls.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {state.get('version')}")
+        instance = cls(None, state["records"])
+        instance.cell_id = state["cell_id"]
+        instance.cell_name = state["cell_name"]
+        instance.__set_query()
+        instance._validators = dict(state["validators"])
+        if state["data_valid"]:
+            instance.forecast_data = dict(state["forecast_data"])
+            instance.last_update = state["last_update"]
+            instance.data_valid = True
+        return instance
+
+    def _setup(self, identifier):
+        """Resolve the identifier and retrieve the initial data."""
+        for region_query in self._region_queries(identifier):
+            result = query_dwd(**region_query)
+            if self._process_region(region_query["typeName"], result):
+                break
+        self._resolved(identifier)
+        self.update()
+
     def update(self):
         """Update data by querying DWD server and parsing result."""
-        if self.__query is None:
+        if self._query is None:
             return
 
-        json_data = query_dwd(**self.__query)
+        self._process_result(query_dwd(**self._query, validators=self._validators))
 
-        if json_data is not None:
-            self.__parse_result(json_data)
-        else:
-            self.data_valid = False
-            self.last_update = None
-            self.forecast_data = None
+    def _process_result(self, json_data):
+        """Parse the retrieved data or invalidate all data on failure."""
+        # Concurrent updates of the same instance must not mix their data
+        with self._lock:
+            # Keep the current data if nothing changed since the last update
+            if json_data is NOT_MODIFIED:
+                return
+            if (
+                self.data_valid
+                and json_data is not None
+                and json_data.get("timeStamp")
+                and json_data.get("timeStamp") == self._validators.get("timestamp")
+            ):
+                return
+
+            if json_data is not None:
+                self.__parse_result(json_data)
+            else:
+                self.data_valid = False
+                self.last_update = None
+                self.forecast_data = None
+
+            if self.data_valid:
+                self._validators["timestamp"] = json_data.get("timeStamp")
+            else:
+                self._validators.clear()
+
+    def _region_queries(self, identifier):
+        """Return the region queries to determine the id of the identifier."""
+        # Identifiers resolved before don't need to be resolved again
+        resolution = get_resolution_cache().get("pollenflight", identifier)
+        if resolution is not None:
+            self.cell_id = resolution["cell_id"]
+            self.cell_name = resolution["cell_name"]
+            self.__set_query()
+            return []
 
-    def __generate_query(self, identifier):
-        """Determine the id to which the identifier belongs."""
         region_query = {}
         # Numbers represent cell ids
         if isinstance(identifier, int) or identifier.isnumeric():
@@ -129,64 +252,224 @@ class DwdPollenFlightAPI:
             region_query["CQL_FILTER"] = f"GEN LIKE '%{identifier}%'"
 
         region_query["typeName"] = "dwd:Pollenfluggebiete"
-        result = query_dwd(**region_query)
-        if result is not None:
-            if result["numberReturned"] > 0:
-                self.cell_id = result["features"][0]["properties"]["GF"]
-                self.cell_name = result["features"][0]["properties"]["GEN"]
-                # More than one match found.
-                # Workaround because DWD is returning some datasets twice
-                not_unique = ""
-                if result["numberReturned"] > 1:
-                    for entry in result["features"]:
-                        if entry["properties"]["GF"] != self.cell_id:
-                            not_unique = " (not unique use ID!)"
-                self.cell_name += not_unique
-
-                self.__query = {"typeName": "dwd:Pollenflug"}
-                self.__query["CQL_FILTER"] = f"GF='{self.cell_id}'"
+        region_query["propertyName"] = REGION_PROPERTIES
+        return [region_query]
+
+    def _resolved(self, identifier):
+        """Remember the resolution of the identifier for further instances."""
+        if self._query is not None:
+            get_resolution_cache().set(
+                "pollenflight",
+                identifier,
+                self.cell_id,
+                self.cell_name,
+                self._query["typeName"],
+            )
+
+    def _process_region(self, region, result):
+        """Evaluate the result of a region query, return True on a match."""
+        # pylint: disable=unused-argument
+        if result is None or result["numberReturned"] == 0:
+            return False
+
+        self.cell_id = result["features"][0]["properties"]["GF"]
+        self.cell_name = result["features"][0]["properties"]["GEN"]
+        # More than one match found.
+        # Workaround because DWD is returning some datasets twice
+        not_unique = ""
+        if result["numberReturned"] > 1:
+            for entry in result["features"]:
+                if entry["properties"]["GF"] != self.cell_id:
+                    not_unique = " (not unique use ID!)"
+        self.cell_name += not_unique
+        self.__set_query()
+        return True
+
+    def __set_query(self):
+        """Set the forecast query of the selected cell."""
+        self._query = {"typeName": "dwd:Pollenflug"}
+        self._query["CQL_FILTER"] = f"GF='{self.cell_id}'"
+        self._query["propertyName"] = FORECAST_PROPERTIES
 
     def __parse_result(self, json_obj):
         """Parse the retrieved data."""
-        try:
-            forecast_data = {}
-            if json_obj["timeStamp"]:
-                try:
-                    self.last_update = datetime.fromisoformat(json_obj["timeStamp"])
-                except:  # pylint: disable=bare-except
+        with measure_parse(self._query["typeName"]):
+            try:
+                forecast_data = {}
+                if json_obj["timeStamp"]:
+                    try:
+                        self.last_update = datetime.fromisoformat(json_obj["timeStamp"])
+                    except:  # pylint: disable=bare-except
+                        self.last_update = datetime.now(UTC)
+                else:
                     self.last_update = datetime.now(UTC)
-            else:
-                self.last_update = datetime.now(UTC)
-
-            if json_obj["numberReturned"]:
-                for feature in json_obj["features"]:
-                    forecast = feature["properties"]
-
-                    if not forecast["EC_II"] in forecast_data:
-                        forecast_data[forecast["EC_II"]] = {}
-                        forecast_data[forecast["EC_II"]]["name"] = forecast[
-                            "PARAMETER_NAME"
-                        ]
-                        forecast_data[forecast["EC_II"]]["forecast"] = []
-
-                    single_forecast = convert_forecast_data(forecast)
-                    if (
-                        single_forecast is not None
-                        and single_forecast
-                        not in forecast_data[forecast["EC_II"]]["forecast"]
-                    ):
-                        forecast_data[forecast["EC_II"]]["forecast"].append(
-                            single_forecast
+
+                if json_obj["numberReturned"]:
+                    seen = {}
+                    for feature in json_obj["features"]:
+                        add_forecast(
+                            forecast_data,
+                            seen,
+                            feature["properties"],
+                            convert_forecast_data,
+                            self.records,
                         )
+                sort_forecasts(forecast_data)
 
-            # Sort list of forecast entries by start_time
-            for data in forecast_data.values():
-                data["forecast"].sort(key=lambda k: k["start_time"])
+                self.forecast_data = forecast_data
+                self.data_valid = True
 
+            except:  # pylint: disable=bare-except
+                self.data_valid = False
+                self.last_update = None
+                self.forecast_data = None
+
+
+class PollenFlightSnapshot:
+    """
+    Class holding the pollen flight forecast of all regions.
+
+    The whole layer is downloaded with a single query and indexed by region
+    id, so that the forecast of a region can be looked up without further
+    queries.
+
+    Attributes:
+    -----------
+    data_valid : bool
+        a flag wether or not the other attributes contain valid values
+    last_update : datetime
+        the timestamp of the last update
+    forecast_data : dict
+        dictionary containing the forecasts of all regions
+        key : int
+            region id (GF)
+        value : dict
+            forecast data of the region, content is identical to
+            DwdPollenFlightAPI.forecast_data
+    """
+
+    # Version of the state returned by to_snapshot()
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, records=False):
+        """
+        Init DWD pollen flight forecast snapshot.
+
+        Parameters
+        ----------
+        records : bool
+            store the forecasts as compact ForecastEntry records instead of
+            dictionaries
+        """
+        self.__init_state(records)
+        self.update()
+
+    def __init_state(self, records):
+        """Init all attributes without data."""
+        self.data_valid = False
+        self.records = records
+        self.last_update = None
+        self.forecast_data = None
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        """Return the data_valid attribute."""
+        return self.data_valid
+
+    def __len__(self):
+        """Return the number of regions with forecasts."""
+        if self.data_valid:
+            return len(self.forecast_data)
+        return 0
+
+    def __contains__(self, cell_id):
+        """Return whether forecasts exist for the given region id."""
+        return bool(self.for_region(cell_id))
+
+    def __str__(self):
+        """Return a short overview about the actual status."""
+        if self.data_valid:
+            retval = f"Pollen flight forecast for {len(self)} regions"
+        else:
+            retval = "No valid data available"
+        return retval
+
+    def to_snapshot(self):
+        """Return the state needed to restore the instance, see from_snapshot()."""
+        with self._lock:
+            return {
+                "version": self.SNAPSHOT_VERSION,
+                "records": self.records,
+                "validators": dict(self._validators),
+                "data_valid": self.data_valid,
+                "last_update": self.last_update,
+                "forecast_data": self.forecast_data,
+            }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        """
+        Restore an instance from the state returned by to_snapshot().
+
+        No query is sent. Raises ValueError if the state was created by
+        another version.
+        """
+        if state.get("version") != cls.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {state.get('version')}")
+        instance = cls.__new__(cls)
+        instance.__init_state(state["records"])
+        instance._validators = dict(state["validators"])
+        if state["data_valid"]:
+            instance.forecast_data = {
+                int(region): forecast_data
+                for region, forecast_data in state["forecast_data"].items()
+            }
+            instance.last_update = state["last_update"]
+            instance.data_valid = True
+        return instance
+
+    def for_region(self, cell_id):
+        """
+        Return the forecast data of a region.
+
+        Parameters
+        ----------
+        cell_id : int or str
+            a valid region id (GF)
+        """
+        if not self.data_valid:
+            return {}
+        try:
+            return self.forecast_data.get(int(cell_id), {})
+        except (TypeError, ValueError):
+            return {}
+
+    def update(self):
+        """Update data by querying DWD server and parsing result."""
+        json_data = query_dwd(
+            typeName="dwd:Pollenflug",
+            propertyName=FORECAST_PROPERTIES,
+            validators=self._validators,
+        )
+
+        # Concurrent updates must not mix their data
+        with self._lock:
+            # Keep the current data if nothing changed since the last update
+            if json_data is NOT_MODIFIED:
+                return
+            try:
+                forecast_data = index_forecast_layer(
+                    json_data["features"], self.records
+                )
+                last_update = parse_timestamp(json_data.get("timeStamp"))
+            except:  # pylint: disable=bare-except
+                self.data_valid = False
+                self.last_update = None
+                self.forecast_data = None
+                self._validators.clear()
+                return
+
+            self.last_update = last_update or datetime.now(UTC)
             self.forecast_data = forecast_data
             self.data_valid = True
-
-        except:  # pylint: disable=bare-except
-            self.data_valid = False
-            self.last_update = None
-            self.forecast_data = None
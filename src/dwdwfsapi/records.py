@@ -0,0 +1,114 @@
+"""
+
+Compact records for warnings and forecasts.
+
+The records use __slots__ and need considerably less memory than the
+dictionaries returned by default. For backwards compatibility they can be
+accessed like dictionaries as well, e.g. warning["level"].
+
+"""
+
+from dataclasses import dataclass
+
+
+class Record:
+    """Dictionary compatible access to the fields of a record."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        """Return the value of a field."""
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        """Return whether the record has the given field."""
+        return key in self.__slots__
+
+    def __iter__(self):
+        """Iterate over the field names like a dictionary."""
+        return iter(self.__slots__)
+
+    def __len__(self):
+        """Return the number of fields."""
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        """Compare with records of the same type and dictionaries."""
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        if type(other) is type(self):
+            return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+        return NotImplemented
+
+    def __hash__(self):
+        """Return the hash of all fields."""
+        return hash(tuple(getattr(self, k) for k in self.__slots__))
+
+    def get(self, key, default=None):
+        """Return the value of a field or default."""
+        if key in self.__slots__:
+            return getattr(self, key)
+        return default
+
+    def keys(self):
+        """Return the field names."""
+        return list(self.__slots__)
+
+    def values(self):
+        """Return the field values."""
+        return [getattr(self, k) for k in self.__slots__]
+
+    def items(self):
+        """Return tuples of field name and value."""
+        return [(k, getattr(self, k)) for k in self.__slots__]
+
+    def to_dict(self):
+        """Return the record as dictionary."""
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class WeatherWarning(Record):
+    """
+    A single weather warning.
+
+    The fields are identical to the keys of the warning dictionaries returned
+    by dwdwfsapi.weatherwarnings.convert_warning_data.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    start_time: object = None
+    end_time: object = None
+    event: object = None
+    event_code: int = 0
+    headline: object = None
+    description: object = None
+    instruction: object = None
+    urgency: str = "immediate"
+    level: int = 0
+    parameters: object = None
+    color: str = "#000000"
+
+    def __hash__(self):
+        """Return the hash of all fields except the parameters dictionary."""
+        return hash(
+            tuple(getattr(self, k) for k in self.__slots__ if k != "parameters")
+        )
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class ForecastEntry(Record):
+    """
+    A single pollen flight or bio weather forecast.
+
+    The fields are identical to the keys of the forecast dictionaries returned
+    by the convert_forecast_data functions.
+    """
+
+    start_time: object = None
+    level: int = 0
+    impact: object = None
+    color: str = "#000000"
@@ -0,0 +1,393 @@
+"""
+
+Background refresh of many API instances.
+
+Weather warnings can change at any time and are refreshed every few minutes.
+Pollen flight and bio weather forecasts are published once a day, so they are
+only refreshed shortly after their publication. Failed refreshes are retried
+with exponential backoff and all refreshes are slightly jittered to avoid
+sending many queries to the DWD server at the same moment.
+
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import time as daytime
+from datetime import timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from .bioweather import BioWeatherSnapshot, DwdBioWeatherAPI
+from .core import DEFAULT_POOL_SIZE
+from .helpers import check_sync
+from .pollenflight import DwdPollenFlightAPI, PollenFlightSnapshot
+from .weatherwarnings import DwdWeatherWarningsAPI, WarningsSnapshot
+
+try:
+    DWD_TIMEZONE = ZoneInfo("Europe/Berlin")
+except ZoneInfoNotFoundError:
+    DWD_TIMEZONE = timezone(timedelta(hours=1))
+
+DEFAULT_WORKERS = 4
+WARNINGS_INTERVAL = 300.0  # seconds
+WARNINGS_JITTER = 30.0  # seconds
+
+# Publication times of the daily forecasts (local time in Germany) and the
+# delay until the new forecasts are reliably available
+POLLENFLIGHT_TIMES = ("11:00",)
+BIOWEATHER_TIMES = ("11:00",)
+PUBLICATION_DELAY = 600.0  # seconds
+DAILY_JITTER = 300.0  # seconds
+
+RETRY_DELAY = 60.0  # seconds, doubled with every failed refresh
+MAX_RETRY_DELAY = 3600.0  # seconds
+
+# Attributes compared to detect changed data
+CHANGE_ATTRIBUTES = {
+    DwdWeatherWarningsAPI: ("current_warnings", "expected_warnings"),
+    WarningsSnapshot: ("warnings",),
+    DwdPollenFlightAPI: ("forecast_data",),
+    DwdBioWeatherAPI: ("forecast_data",),
+    PollenFlightSnapshot: ("forecast_data",),
+    BioWeatherSnapshot: ("forecast_data",),
+}
+
+
+class IntervalSchedule:
+    """Refresh in a fixed interval."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, interval, jitter=0.0):
+        """
+        Init interval schedule.
+
+        Parameters
+        ----------
+        interval : float
+            seconds between two refreshes
+        jitter : float
+            maximum number of seconds randomly added to every interval
+        """
+        self.interval = interval
+        self.jitter = jitter
+
+    def next_run(self, now):
+        """Return the timestamp of the next refresh after now."""
+        return now + self.interval + random.uniform(0, self.jitter)
+
+
+class DailySchedule:
+    """Refresh once or several times a day at fixed local times."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, times, tz=DWD_TIMEZONE, delay=PUBLICATION_DELAY, jitter=0.0):
+        """
+        Init daily schedule.
+
+        Parameters
+        ----------
+        times : iterable of str
+            the local times of the refreshes formatted HH:MM
+        tz : tzinfo
+            the timezone of the times
+        delay : float
+            seconds added to every time
+        jitter : float
+            maximum number of seconds randomly added to every refresh
+        """
+        self.times = sorted(daytime.fromisoformat(t) for t in times)
+        self.tz = tz
+        self.delay = delay
+        self.jitter = jitter
+
+    def next_run(self, now):
+        """Return the timestamp of the next refresh after now."""
+        today = datetime.fromtimestamp(now, self.tz).date()
+        for days in range(3):
+            day = today + timedelta(days=days)
+            for daily_time in self.times:
+                run = datetime.combine(day, daily_time, self.tz).timestamp()
+                run += self.delay
+                if run > now:
+                    return run + random.uniform(0, self.jitter)
+        return now + 86400.0
+
+
+def default_schedule(instance):
+    """Return the schedule matching the product of an API instance."""
+    if isinstance(instance, (DwdWeatherWarningsAPI, WarningsSnapshot)):
+        return IntervalSchedule(WARNINGS_INTERVAL, WARNINGS_JITTER)
+    if isinstance(instance, (DwdPollenFlightAPI, PollenFlightSnapshot)):
+        return DailySchedule(POLLENFLIGHT_TIMES, jitter=DAILY_JITTER)
+    if isinstance(instance, (DwdBioWeatherAPI, BioWeatherSnapshot)):
+        return DailySchedule(BIOWEATHER_TIMES, jitter=DAILY_JITTER)
+    raise TypeError(f"No default schedule for {type(instance).__name__}")
+
+
+def data_state(instance):
+    """Return the data of an instance which is compared to detect changes."""
+    for cls, attributes in CHANGE_ATTRIBUTES.items():
+        if isinstance(instance, cls):
+            break
+    else:
+        attributes = ("last_update",)
+    return tuple(getattr(instance, a, None) for a in ("data_valid", *attributes))
+
+
+class UpdateResult:
+    """
+    Outcome of updating a single instance.
+
+    Attributes:
+    -----------
+    instance : object
+        the updated API instance
+    success : bool
+        a flag wether or not the instance holds valid data after the update
+    duration : float
+        the duration of the update in seconds
+    error : Exception
+        the exception raised by update() or None
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, instance, success, duration, error=None):
+        """Init update result."""
+        self.instance = instance
+        self.success = success
+        self.duration = duration
+        self.error = error
+
+    def __bool__(self):
+        """Return the success attribute."""
+        return self.success
+
+
+def timed_update(instance):
+    """Update an instance and return its UpdateResult."""
+    start = time.perf_counter()
+    try:
+        instance.update()
+        success = bool(instance.data_valid)
+        error = None
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        success = False
+        error = err
+    return UpdateResult(instance, success, time.perf_counter() - start, error)
+
+
+def update_all(instances, max_workers=DEFAULT_POOL_SIZE):
+    """
+    Update many instances concurrently.
+
+    All queries share the pooled session of the core functions, so
+    max_workers shouldn't exceed its pool size.
+
+    Parameters
+    ----------
+    instances : iterable of API instances
+        the instances to be updated
+    max_workers : int
+        maximum number of concurrent updates
+
+    Returns a list of UpdateResult in the order of the instances. Raises
+    TypeError for asynchronous instances, they have to be awaited instead.
+    """
+    instances = list(instances)
+    for instance in instances:
+        check_sync(instance)
+    if not instances:
+        return []
+    with ThreadPoolExecutor(min(max_workers, len(instances))) as executor:
+        return list(executor.map(timed_update, instances))
+
+
+class RefreshJob:
+    """
+    A registered instance and its refresh state.
+
+    Attributes:
+    -----------
+    instance : object
+        the refreshed API instance
+    schedule : IntervalSchedule or DailySchedule
+        the schedule of the refreshes
+    callback : callable
+        called with the instance after its data changed
+    next_run : float
+        timestamp of the next refresh
+    failures : int
+        number of consecutive failed refreshes
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, instance, schedule, callback, next_run):
+        """Init refresh job."""
+        self.instance = instance
+        self.schedule = schedule
+        self.callback = callback
+        self.next_run = next_run
+        self.failures = 0
+        self.running = False
+
+
+class Refresher:
+    """
+    Refresh many API instances in the background on a pool of workers.
+
+    Usage:
+        with Refresher() as refresher:
+            refresher.register(DwdWeatherWarningsAPI(813073088), callback=print)
+            ...
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        """
+        Init refresher.
+
+        Parameters
+        ----------
+        max_workers : int
+            maximum number of concurrent refreshes
+        """
+        self.max_workers = max_workers
+        self.__jobs = {}
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__stopped = threading.Event()
+        self.__executor = None
+        self.__thread = None
+
+    def __enter__(self):
+        """Start the background refreshes."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop the background refreshes."""
+        self.stop()
+
+    def __len__(self):
+        """Return the number of registered instances."""
+        return len(self.__jobs)
+
+    def register(self, instance, schedule=None, callback=None, immediately=False):
+        """
+        Register an instance for background refreshes.
+
+        Parameters
+        ----------
+        instance : object
+            an API instance providing update() and data_valid
+        schedule : IntervalSchedule or DailySchedule
+            the schedule to be used, by default it depends on the product
+        callback : callable
+            called with the instance after its data changed
+        immediately : bool
+            refresh the instance as soon as possible instead of waiting for
+            the first scheduled refresh
+
+        Returns the RefreshJob of the instance. Raises TypeError for
+        asynchronous instances.
+        """
+        check_sync(instance)
+        if schedule is None:
+            schedule = default_schedule(instance)
+        now = time.time()
+        next_run = now if immediately else schedule.next_run(now)
+        job = RefreshJob(instance, schedule, callback, next_run)
+        with self.__lock:
+            self.__jobs[id(instance)] = job
+        self.__wakeup.set()
+        return job
+
+    def unregister(self, instance):
+        """Stop refreshing an instance."""
+        with self.__lock:
+            self.__jobs.pop(id(instance), None)
+
+    def start(self):
+        """Start refreshing in a background thread."""
+        if self.__thread is not None:
+            return
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__loop, daemon=True)
+        self.__thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop refreshing.
+
+        Parameters
+        ----------
+        wait : bool
+            wait for running refreshes to finish
+        """
+        self.__stopped.set()
+        self.__wakeup.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=wait)
+            self.__executor = None
+
+    def refresh_due(self, now=None):
+        """
+        Submit all due refreshes to the workers.
+
+        Parameters
+        ----------
+        now : float
+            the current timestamp, time.time() if None
+
+        Returns a list of futures of the submitted refreshes.
+        """
+        if now is None:
+            now = time.time()
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(self.max_workers)
+        futures = []
+        with self.__lock:
+            for job in self.__jobs.values():
+                if not job.running and job.next_run <= now:
+                    job.running = True
+                    futures.append(self.__executor.submit(self.__refresh, job))
+        return futures
+
+    def __loop(self):
+        """Submit due refreshes until stopped."""
+        while not self.__stopped.is_set():
+            self.__wakeup.clear()
+            self.refresh_due()
+            with self.__lock:
+                pending = [j.next_run for j in self.__jobs.values() if not j.running]
+            delay = max(min(pending) - time.time(), 0) if pending else None
+            self.__wakeup.wait(delay)
+
+    def __refresh(self, job):
+        """Refresh a single instance and schedule its next refresh."""
+        before = data_state(job.instance)
+        success = timed_update(job.instance).success
+
+        now = time.time()
+        with self.__lock:
+            job.running = False
+            if success:
+                job.failures = 0
+                job.next_run = job.schedule.next_run(now)
+            else:
+                job.failures += 1
+                delay = min(RETRY_DELAY * 2 ** (job.failures - 1), MAX_RETRY_DELAY)
+                job.next_run = now + delay * random.uniform(1.0, 1.1)
+        self.__wakeup.set()
+
+        if success and job.callback is not None and data_state(job.instance) != before:
+            job.callback(job.instance)
+        return success
@@ -0,0 +1,311 @@
+"""
+
+Persistent snapshots of API instances for a fast warm start.
+
+The resolved cells and the latest parsed warnings and forecasts of many
+instances are stored in a single binary file. After a restart the instances
+are restored from the file without querying the DWD server, so they can serve
+their last valid data until the next refresh replaced it.
+
+The file starts with a fixed header pointing to an index of all entries. The
+file is memory-mapped when reading, so single instances can be restored
+without reading the complete file. Every entry holds the class and the
+explicit, versioned state returned by its to_snapshot() method, encoded as
+JSON. Instances are rebuilt by the from_snapshot() class method, entries of
+other versions are skipped.
+
+"""
+
+import importlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from .bioweather import BioWeatherSnapshot, DwdBioWeatherAPI
+from .pollenflight import DwdPollenFlightAPI, PollenFlightSnapshot
+from .records import ForecastEntry, WeatherWarning
+from .weatherwarnings import DwdWeatherWarningsAPI, WarningsSnapshot
+
+MAGIC = b"DWDSNAP2"
+# Magic, offset and length of the index
+HEADER = struct.Struct("<8sQQ")
+
+# Classes whose instances (including their subclasses) can be stored
+SNAPSHOT_CLASSES = (
+    DwdWeatherWarningsAPI,
+    DwdPollenFlightAPI,
+    DwdBioWeatherAPI,
+    WarningsSnapshot,
+    PollenFlightSnapshot,
+    BioWeatherSnapshot,
+)
+
+# Records which can be part of the stored state
+RECORD_TYPES = {cls.__name__: cls for cls in (WeatherWarning, ForecastEntry)}
+
+
+def snapshot_key(cls, cell_id=None, layers=None):
+    """
+    Return the key an instance is stored with.
+
+    Parameters
+    ----------
+    cls : type
+        the class of the instance
+    cell_id : int
+        the resolved cell of the instance, None for snapshots of all cells
+    layers : iterable of str
+        the layers of a WarningsSnapshot, None for all other classes
+    """
+    key = f"{cls.__module__}.{cls.__qualname__}:{cell_id}"
+    if layers:
+        key += ":" + ",".join(layers)
+    return key
+
+
+def encode_value(value):
+    """Convert a state value to JSON compatible data."""
+    # pylint: disable=too-many-return-statements
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, tuple(RECORD_TYPES.values())):
+        return {
+            "$record": type(value).__name__,
+            "fields": encode_value(value.to_dict()),
+        }
+    if isinstance(value, list):
+        return [encode_value(v) for v in value]
+    if isinstance(value, tuple):
+        return {"$tuple": [encode_value(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        return {"$set": [encode_value(v) for v in value]}
+    if isinstance(value, dict):
+        if all(isinstance(k, str) and not k.startswith("$") for k in value):
+            return {k: encode_value(v) for k, v in value.items()}
+        return {"$dict": [[encode_value(k), encode_value(v)] for k, v in value.items()]}
+    raise TypeError(f"Can't store values of type {type(value).__name__}")
+
+
+def decode_object(obj):
+    """Convert a JSON object created by encode_value back to its value."""
+    # pylint: disable=too-many-return-statements
+    if not any(k.startswith("$") for k in obj):
+        return obj
+    if "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    if "$record" in obj:
+        return RECORD_TYPES[obj["$record"]](**obj["fields"])
+    if "$tuple" in obj:
+        return tuple(obj["$tuple"])
+    if "$set" in obj:
+        return set(obj["$set"])
+    if "$dict" in obj:
+        return dict(obj["$dict"])
+    raise ValueError(f"Unknown tag in {sorted(obj)}")
+
+
+def snapshot_class(name):
+    """Return the class stored by its qualified name, only known ones."""
+    module, _, qualname = name.rpartition(".")
+    if module != "dwdwfsapi" and not module.startswith("dwdwfsapi."):
+        raise ValueError(f"Unknown class {name}")
+    cls = getattr(importlib.import_module(module), qualname)
+    if not isinstance(cls, type) or not issubclass(cls, SNAPSHOT_CLASSES):
+        raise ValueError(f"Unknown class {name}")
+    return cls
+
+
+class SnapshotStore:
+    """
+    Store the state of many API instances in a memory-mappable file.
+
+    Usage:
+        store = SnapshotStore("/var/cache/dwdwfsapi/snapshot.bin")
+        instances = store.load() or [DwdWeatherWarningsAPI(813073088)]
+        ...
+        store.save(instances)
+    """
+
+    def __init__(self, path):
+        """
+        Init snapshot store.
+
+        Parameters
+        ----------
+        path : str
+            the file the instances are stored to
+        """
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of stored instances."""
+        return len(self.keys())
+
+    def keys(self):
+        """Return the keys of all stored instances."""
+        with self.__lock:
+            index = self.__read(lambda mm, index: index)
+        return list(index or {})
+
+    def save(self, instances):
+        """
+        Store the state of the given instances, replacing all stored ones.
+
+        Instances which haven't resolved their cell are skipped. Instances of
+        other classes than the API classes and snapshots, e.g. WarningsTable,
+        raise TypeError.
+
+        Parameters
+        ----------
+        instances : iterable of API instances
+            the instances to be stored
+
+        Returns the number of stored instances.
+        """
+        entries = {}
+        for instance in instances:
+            if not isinstance(instance, SNAPSHOT_CLASSES):
+                raise TypeError(f"Can't store {type(instance).__name__} instances")
+            state = instance.to_snapshot()
+            if state is None:
+                continue
+            cls = type(instance)
+            payload = json.dumps(
+                {
+                    "class": f"{cls.__module__}.{cls.__qualname__}",
+                    "state": encode_value(state),
+                },
+                ensure_ascii=False,
+            ).encode("utf-8")
+            last_update = state["last_update"]
+            timestamp = last_update.timestamp() if last_update else None
+            key = snapshot_key(cls, state.get("cell_id"), state.get("layers"))
+            entries[key] = (payload, timestamp)
+
+        with self.__lock:
+            self.__write(entries)
+        return len(entries)
+
+    def load(self, max_age=None):
+        """
+        Restore all stored instances.
+
+        Parameters
+        ----------
+        max_age : float
+            skip instances whose data is older than this number of seconds
+
+        Returns a list of the restored instances, which is empty if the file
+        doesn't exist or is invalid.
+        """
+        with self.__lock:
+            instances = self.__read(
+                lambda mm, index: [
+                    instance
+                    for entry in index.values()
+                    if (instance := self.__restore(mm, entry, max_age)) is not None
+                ]
+            )
+        return instances or []
+
+    def get(self, cls, cell_id=None, max_age=None, layers=None):
+        """
+        Restore a single instance.
+
+        Parameters
+        ----------
+        cls : type
+            the class of the instance, e.g. DwdWeatherWarningsAPI
+        cell_id : int
+            the resolved cell of the instance, None for snapshots
+        max_age : float
+            ignore the instance if its data is older than this number of
+            seconds
+        layers : iterable of str
+            the layers of a WarningsSnapshot, None for the first stored one
+
+        Returns the restored instance or None if it isn't stored.
+        """
+        key = snapshot_key(cls, cell_id, layers)
+        with self.__lock:
+            return self.__read(
+                lambda mm, index: (
+                    self.__restore(mm, index[found], max_age)
+                    if (found := self.__find(index, key, layers)) is not None
+                    else None
+                )
+            )
+
+    @staticmethod
+    def __find(index, key, layers):
+        """Return the stored key matching key, any layers if layers is None."""
+        if key in index:
+            return key
+        if layers is None:
+            return next((k for k in index if k.startswith(key + ":")), None)
+        return None
+
+    @staticmethod
+    def __restore(mm, entry, max_age):
+        """Rebuild the instance of an entry, None if invalid or too old."""
+        offset, length, timestamp = entry
+        if max_age is not None and (
+            timestamp is None or time.time() - timestamp > max_age
+        ):
+            return None
+        try:
+            data = json.loads(
+                mm[offset : offset + length].decode("utf-8"),
+                object_hook=decode_object,
+            )
+            return snapshot_class(data["class"]).from_snapshot(data["state"])
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
+
+    def __read(self, func):
+        """Map the file and call func with the map and the index."""
+        try:
+            with (
+                open(self.path, "rb") as f,
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+            ):
+                magic, offset, length = HEADER.unpack_from(mm)
+                if magic != MAGIC:
+                    return None
+                index = json.loads(mm[offset : offset + length].decode("utf-8"))
+                return func(mm, index)
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
+
+    def __write(self, entries):
+        """Write all entries to the file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                index = {}
+                offset = HEADER.size
+                f.write(HEADER.pack(MAGIC, 0, 0))
+                for key, (payload, timestamp) in entries.items():
+                    f.write(payload)
+                    index[key] = (offset, len(payload), timestamp)
+                    offset += len(payload)
+                index_data = json.dumps(index).encode("utf-8")
+                f.write(index_data)
+                f.seek(0)
+                f.write(HEADER.pack(MAGIC, offset, len(index_data)))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,160 @@
+"""
+
+Incremental parsing of GeoJSON feature collections.
+
+The features are decoded one by one while the response is still being
+downloaded, so the complete feature collection never has to be kept in
+memory.
+
+"""
+
+import codecs
+import json
+import re
+
+# Characters considered as whitespace by the JSON specification
+WHITESPACE = " \t\n\r"
+
+# Characters which may continue a number decoded at the end of the buffer
+NUMBER_CONTINUATION = re.compile(r"[0-9.eE+-]*")
+
+# Drop consumed data from the buffer once it exceeds this number of chars
+COMPACT_SIZE = 65536
+
+
+class FeatureStream:
+    """
+    Iterate over the properties of all features of a feature collection.
+
+    Attributes:
+    -----------
+    valid : bool
+        a flag wether or not the data could be parsed completely, only
+        meaningful after the iteration has finished
+    members : dict
+        all other members of the feature collection, e.g. timeStamp and
+        numberReturned. Members following the features are only available
+        after the iteration has finished.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, chunks, close=None):
+        """
+        Init feature stream.
+
+        Parameters
+        ----------
+        chunks : iterable of bytes
+            the raw response, e.g. requests.Response.iter_content()
+        close : callable
+            called once the iteration has finished
+        """
+        self.valid = False
+        self.members = {}
+        self.__chunks = iter(chunks)
+        self.__close = close
+        self.__decoder = codecs.getincrementaldecoder("utf-8")()
+        self.__json = json.JSONDecoder()
+        self.__buffer = ""
+        self.__pos = 0
+        self.__eof = False
+
+    def __iter__(self):
+        """Yield the properties of all features."""
+        try:
+            for feature in self.features():
+                yield feature.get("properties") or {}
+        finally:
+            if self.__close is not None:
+                self.__close()
+
+    def features(self):
+        """Yield all features including their geometry."""
+        try:
+            self.__expect("{")
+            while not self.__next_is("}"):
+                key = self.__value()
+                self.__expect(":")
+                if key == "features":
+                    yield from self.__array()
+                else:
+                    self.members[key] = self.__value()
+                if not self.__next_is(","):
+                    self.__expect("}")
+                    break
+            self.valid = True
+        except Exception:  # pylint: disable=broad-exception-caught
+            # Invalid data or connection lost while downloading
+            self.valid = False
+
+    def __array(self):
+        """Yield all elements of an array."""
+        self.__expect("[")
+        if self.__next_is("]"):
+            return
+        while True:
+            yield self.__value()
+            if not self.__next_is(","):
+                self.__expect("]")
+                return
+
+    def __fill(self):
+        """Read the next chunk, return False at the end of the data."""
+        if self.__eof:
+            return False
+        if self.__pos > COMPACT_SIZE:
+            self.__buffer = self.__buffer[self.__pos :]
+            self.__pos = 0
+        try:
+            chunk = next(self.__chunks)
+            self.__buffer += self.__decoder.decode(chunk)
+        except StopIteration:
+            self.__buffer += self.__decoder.decode(b"", final=True)
+            self.__eof = True
+        return True
+
+    def __skip_whitespace(self):
+        """Skip whitespace, reading more data if necessary."""
+        while True:
+            while (
+                self.__pos < len(self.__buffer)
+                and self.__buffer[self.__pos] in WHITESPACE
+            ):
+                self.__pos += 1
+            if self.__pos < len(self.__buffer) or not self.__fill():
+                return
+
+    def __next_is(self, char):
+        """Consume char if it is the next non whitespace character."""
+        self.__skip_whitespace()
+        if self.__buffer[self.__pos : self.__pos + 1] == char:
+            self.__pos += 1
+            return True
+        return False
+
+    def __expect(self, char):
+        """Consume char, fail if it is not the next character."""
+        if not self.__next_is(char):
+            raise ValueError(f"Expected '{char}' at position {self.__pos}")
+
+    def __value(self):
+        """Decode the next JSON value, reading more data if necessary."""
+        self.__skip_whitespace()
+        while True:
+            try:
+                value, end = self.__json.raw_decode(self.__buffer, self.__pos)
+                # Numbers might continue in the next chunk, e.g. "12." + "5"
+                if self.__eof or not self.__partial_number(value, end):
+                    self.__pos = end
+                    return value
+            except ValueError:
+                if self.__eof:
+                    raise
+            self.__fill()
+
+    def __partial_number(self, value, end):
+        """Return whether a decoded number might continue in the next chunk."""
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        return NUMBER_CONTINUATION.match(self.__buffer, end).end() == len(self.__buffer)
@@ -0,0 +1,84 @@
+"""
+
+Offline lookup of the warncells known to the DWD geoserver.
+
+The list of warncells is shipped as package data and updated regularly by
+docs/update_warncell_list.py.
+
+"""
+
+import functools
+import gzip
+import json
+from importlib import resources
+
+WARNCELLS_FILE = "warncells.json.gz"
+
+# Region layers in the order they are searched and their warning layers
+WEATHER_WARNINGS_QUERY_MAPPING = {
+    "dwd:Warngebiete_Gemeinden": "dwd:Warnungen_Gemeinden",
+    "dwd:Warngebiete_Kreise": "dwd:Warnungen_Landkreise",
+    "dwd:Warngebiete_Binnenseen": "dwd:Warnungen_Binnenseen",
+    "dwd:Warngebiete_Kueste": "dwd:Warnungen_Kueste",
+}
+
+
+@functools.cache
+def load_warncells():
+    """
+    Load the bundled warncell list.
+
+    Returns a tuple of two indexes. The first one maps warncell ids to
+    (region, name), the second one maps region and name to a sorted list of
+    warncell ids.
+    """
+    try:
+        data_file = resources.files(__package__).joinpath("data", WARNCELLS_FILE)
+        data = json.loads(gzip.decompress(data_file.read_bytes()).decode("utf-8"))
+    except:  # pylint: disable=bare-except
+        return {}, {}
+
+    ids = {}
+    names = {}
+    for region, warncells in data.items():
+        for warncell_id, name in warncells.items():
+            ids[int(warncell_id)] = (region, name)
+            names.setdefault((region, name), []).append(int(warncell_id))
+    for warncell_ids in names.values():
+        warncell_ids.sort()
+    return ids, names
+
+
+def lookup_warncell(identifier, regions):
+    """
+    Resolve a warncell id or name without querying the DWD server.
+
+    Parameters
+    ----------
+    identifier : str or int
+        a warncell id or the exact name of a warncell
+    regions : iterable of str
+        the region layers to be searched in the given order, names are
+        resolved within the first region containing a match
+
+    Returns a tuple of (region, warncell id, warncell name, unique) or None if
+    the identifier is unknown.
+    """
+    ids, names = load_warncells()
+
+    # Numbers represent warncell ids
+    if isinstance(identifier, int) or (
+        isinstance(identifier, str) and identifier.isnumeric()
+    ):
+        entry = ids.get(int(identifier))
+        if entry is not None and entry[0] in regions:
+            return entry[0], int(identifier), entry[1], True
+        return None
+
+    # Strings represent warncell names
+    if isinstance(identifier, str):
+        for region in regions:
+            warncell_ids = names.get((region, identifier))
+            if warncell_ids:
+                return region, warncell_ids[0], identifier, len(warncell_ids) == 1
+    return None
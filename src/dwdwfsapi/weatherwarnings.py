@@ -1,101 +1,170 @@
 """Python client to retrieve weather warnings from DWD."""
 
+import threading
 from datetime import UTC, datetime
 
-from .core import query_dwd
-
+from .cache import get_resolution_cache
+from .core import NOT_MODIFIED, iter_features, query_dwd
+from .helpers import (
+    check_sync,
+    lowercase_keys,
+    parse_color,
+    parse_timestamp,
+    severity_level,
+)
+from .locator import get_default_locator
+from .metrics import measure_parse
+from .records import WeatherWarning
+from .warncells import WEATHER_WARNINGS_QUERY_MAPPING, lookup_warncell
+
+# Property holding the warncell id in the warning layers
+# Counties are special and use the GC_WARNCELLID property
+WARNCELL_ID_PROPERTIES = {
+    "dwd:Warnungen_Gemeinden": "WARNCELLID",
+    "dwd:Warnungen_Landkreise": "GC_WARNCELLID",
+    "dwd:Warnungen_Binnenseen": "WARNCELLID",
+    "dwd:Warnungen_Kueste": "WARNCELLID",
+}
+
+# Only the properties which are actually evaluated are retrieved, this also
+# drops the geometry from the responses
+REGION_PROPERTIES = ("WARNCELLID", "NAME")
+WARNING_PROPERTIES = (
+    "ONSET",
+    "EXPIRES",
+    "EVENT",
+    "EC_II",
+    "HEADLINE",
+    "DESCRIPTION",
+    "INSTRUCTION",
+    "URGENCY",
+    "SEVERITY",
+    "PARAMETERNAME",
+    "PARAMETERVALUE",
+    "EC_AREA_COLOR",
+)
+
+# Upper limit for the length of a single CQL filter to stay well below the
+# URL length limits of the geoserver
+MAX_CQL_FILTER_LENGTH = 3000
+
+# Default values of all keys of a converted warning
+WARNING_DEFAULTS = {
+    "start_time": None,
+    "end_time": None,
+    "event": None,
+    "event_code": 0,
+    "headline": None,
+    "description": None,
+    "instruction": None,
+    "urgency": "immediate",
+    "level": 0,
+    "parameters": None,
+    "color": "#000000",
+}
+
+
+def convert_warning_data(data_in, records=False):
+    """
+    Convert the data received from DWD.
 
-def convert_warning_data(data_in):
-    """Convert the data received from DWD."""
+    Returns a dictionary or a WeatherWarning record if records is set.
+    """
     # pylint: disable=too-many-branches
-    # pylint: disable=too-many-statements
-
-    weather_severity_mapping = {
-        "minor": 1,
-        "moderate": 2,
-        "severe": 3,
-        "extreme": 4,
-    }
 
-    # Make all keys lowercase
-    data_in = {k.lower(): v for k, v in data_in.items()}
+    # Keys are case insensitive. All features of a layer share the same keys,
+    # so the mapping is only computed once per layer.
+    keys = lowercase_keys(tuple(data_in))
 
     # Default init
-    data_out = {
-        "start_time": None,
-        "end_time": None,
-        "event": None,
-        "event_code": 0,
-        "headline": None,
-        "description": None,
-        "instruction": None,
-        "urgency": "immediate",
-        "level": 0,
-        "parameters": None,
-        "color": "#000000",
-    }
+    data_out = WARNING_DEFAULTS.copy()
 
     # Convert data
-    if "onset" in data_in:
-        try:
-            data_out["start_time"] = datetime.fromisoformat(data_in["onset"])
-        except:  # pylint: disable=bare-except
-            data_out["start_time"] = None
-    if "expires" in data_in:
+    if (key := keys.get("onset")) is not None:
+        data_out["start_time"] = parse_timestamp(data_in[key])
+    if (key := keys.get("expires")) is not None:
+        data_out["end_time"] = parse_timestamp(data_in[key])
+    if (key := keys.get("event")) is not None:
+        data_out["event"] = data_in[key]
+    if (key := keys.get("ec_ii")) is not None:
         try:
-            data_out["end_time"] = datetime.fromisoformat(data_in["expires"])
-        except:  # pylint: disable=bare-except
-            data_out["end_time"] = None
-    if "event" in data_in:
-        data_out["event"] = data_in["event"]
-    if "ec_ii" in data_in:
-        try:
-            data_out["event_code"] = int(data_in["ec_ii"])
+            data_out["event_code"] = int(data_in[key])
         except:  # pylint: disable=bare-except
             data_out["event_code"] = 0
-    if "headline" in data_in:
-        data_out["headline"] = data_in["headline"]
-    if "description" in data_in:
-        data_out["description"] = data_in["description"]
-    if "instruction" in data_in:
-        data_out["instruction"] = data_in["instruction"]
-    if "urgency" in data_in:
-        if data_in["urgency"].lower() == "future":
+    if (key := keys.get("headline")) is not None:
+        data_out["headline"] = data_in[key]
+    if (key := keys.get("description")) is not None:
+        data_out["description"] = data_in[key]
+    if (key := keys.get("instruction")) is not None:
+        data_out["instruction"] = data_in[key]
+    if (key := keys.get("urgency")) is not None:
+        if data_in[key].lower() == "future":
             data_out["urgency"] = "future"
-        else:
-            data_out["urgency"] = "immediate"
-    if "severity" in data_in:
-        try:
-            if data_in["severity"].lower() in weather_severity_mapping:
-                data_out["level"] = weather_severity_mapping[
-                    data_in["severity"].lower()
-                ]
-        except:  # pylint: disable=bare-except
-            data_out["level"] = 0
-    if "parametername" in data_in and "parametervalue" in data_in:
+    if (key := keys.get("severity")) is not None:
+        data_out["level"] = severity_level(data_in[key])
+    if "parametername" in keys and "parametervalue" in keys:
         # Depending on the query the keys and values are either seperated
         # by , or ;
         try:
-            if "," in data_in["parametername"]:
-                keys = data_in["parametername"].split(",")
-                values = data_in["parametervalue"].split(",")
-            else:
-                keys = data_in["parametername"].split(";")
-                values = data_in["parametervalue"].split(";")
-            data_out["parameters"] = dict(zip(keys, values))
+            names = data_in[keys["parametername"]]
+            values = data_in[keys["parametervalue"]]
+            separator = "," if "," in names else ";"
+            data_out["parameters"] = dict(
+                zip(names.split(separator), values.split(separator))
+            )
         except:  # pylint: disable=bare-except
             data_out["parameters"] = None
-    if "ec_area_color" in data_in:
-        try:
-            colors = data_in["ec_area_color"].split(" ")
-            data_out["color"] = f"#{int(colors[0]):02x}{int(colors[1]):02x}"
-            data_out["color"] += f"{int(colors[2]):02x}"
-        except:  # pylint: disable=bare-except
-            data_out["color"] = "#000000"
+    if (key := keys.get("ec_area_color")) is not None:
+        data_out["color"] = parse_color(data_in[key])
 
+    if records:
+        return WeatherWarning(**data_out)
     return data_out
 
 
+def build_cql_in_filters(prop, ids, max_length=MAX_CQL_FILTER_LENGTH):
+    """
+    Build CQL filters matching all given ids.
+
+    The ids are split into several "IN" filters if a single filter would
+    exceed max_length. Yields tuples of (filter, list of ids).
+    """
+    chunk = []
+    length = 0
+    for ident in ids:
+        entry = f"'{ident}'"
+        if chunk and length + len(entry) + 1 > max_length:
+            yield f"{prop} IN ({','.join(chunk)})", [c[1:-1] for c in chunk]
+            chunk = []
+            length = 0
+        chunk.append(entry)
+        length += len(entry) + 1
+    if chunk:
+        yield f"{prop} IN ({','.join(chunk)})", [c[1:-1] for c in chunk]
+
+
+def warning_key(warning, warncell_id):
+    """Return the stable identity (event_code, start_time, warncell_id)."""
+    return (warning["event_code"], warning["start_time"], warncell_id)
+
+
+def diff_warnings(old_index, new_index):
+    """
+    Compare two warning indexes keyed by warning_key().
+
+    Returns a tuple of three sets containing the keys of the added, removed
+    and changed warnings.
+    """
+    added = new_index.keys() - old_index.keys()
+    removed = old_index.keys() - new_index.keys()
+    changed = {
+        key
+        for key in new_index.keys() & old_index.keys()
+        if new_index[key] != old_index[key]
+    }
+    return added, removed, changed
+
+
 class DwdWeatherWarningsAPI:
     """
     Class for retrieving weather warnings from DWD.
@@ -113,7 +182,8 @@ class DwdWeatherWarningsAPI:
     current_warning_level : int
         highest currently active warning level (0 - 4)
     current_warnings : list of dicts
-        list of dictionaries containing all currently active warnings
+        list of dictionaries containing all currently active warnings,
+        WeatherWarning records with identical keys if records is set
         NOTE: not every warning has all keys
         start_time : datetime
             UTC timestamp when the warning starts
@@ -143,11 +213,23 @@ class DwdWeatherWarningsAPI:
     expected_warnings : list of dicts
         list of dictionaries containung all expected warnings
         dictionary content is identical to current_warnings
+    warning_index : dict
+        all current and expected warnings keyed by their identity
+        (event_code, start_time, warncell_id)
+    added : set
+        keys of the warnings which are new since the previous update
+    removed : set
+        keys of the warnings which were dropped since the previous update
+    changed : set
+        keys of the warnings whose content changed since the previous update
     """
 
     # pylint: disable=too-many-instance-attributes
 
-    def __init__(self, identifier):
+    # Version of the state returned by to_snapshot()
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, identifier, records=False):
         """
         Init DWD weather warnings.
 
@@ -157,16 +239,28 @@ class DwdWeatherWarningsAPI:
             a valid warncell id, name or location (latitude, longitude)
             https://github.com/stephan192/dwdwfsapi/blob/master/docs/
             warncells.md
+        records : bool
+            store the warnings as compact WeatherWarning records instead of
+            dictionaries
         """
         self.data_valid = False
+        self.records = records
         self.warncell_id = None
         self.warncell_name = None
-        self.__query = None
+        self._query = None
+        self._validators = {}
+        self._lock = threading.Lock()
         self.last_update = None
         self.current_warning_level = None
         self.current_warnings = None
         self.expected_warning_level = None
         self.expected_warnings = None
+        self.warning_index = None
+        self.added = set()
+        self.removed = set()
+        self.changed = set()
+        # Last valid index, kept to compare with after a failed update
+        self.__known_index = {}
 
         # Identifier must be either integer or string
         if not isinstance(identifier, (int, str, tuple)):
@@ -175,8 +269,7 @@ class DwdWeatherWarningsAPI:
         if isinstance(identifier, tuple) and len(identifier) != 2:
             return
 
-        self.__generate_query(identifier)
-        self.update()
+        self._setup(identifier)
 
     def __bool__(self):
         """Return the data_valid attribute."""
@@ -200,31 +293,203 @@ class DwdWeatherWarningsAPI:
             retval = "No valid data available"
         return retval
 
+    def to_snapshot(self):
+        """
+        Return the state needed to restore the instance, see from_snapshot().
+
+        Returns None if the identifier couldn't be resolved.
+        """
+        with self._lock:
+            if self._query is None:
+                return None
+            return {
+                "version": self.SNAPSHOT_VERSION,
+                "records": self.records,
+                "cell_id": self.warncell_id,
+                "cell_name": self.warncell_name,
+                "layer": self._query["typeName"],
+                "validators": dict(self._validators),
+                "data_valid": self.data_valid,
+                "last_update": self.last_update,
+                "current_warnings": self.current_warnings,
+                "expected_warnings": self.expected_warnings,
+            }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        """
+        Restore an instance from the state returned by to_snapshot().
+
+        No query is sent. Raises ValueError if the state was created by
+        another version.
+        """
+        # pylint: disable=unused-private-member
+        if state.get("version") != cls.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {state.get('version')}")
+        instance = cls(None, state["records"])
+        instance.warncell_id = state["cell_id"]
+        instance.warncell_name = state["cell_name"]
+        instance.__set_query(state["layer"])
+        instance._validators = dict(state["validators"])
+        if state["data_valid"]:
+            current_warnings = list(state["current_warnings"])
+            expected_warnings = list(state["expected_warnings"])
+            instance.current_warnings = current_warnings
+            instance.current_warning_level = max(
+                (warning["level"] for warning in current_warnings), default=0
+            )
+            instance.expected_warnings = expected_warnings
+            instance.expected_warning_level = max(
+                (warning["level"] for warning in expected_warnings), default=0
+            )
+            instance.warning_index = instance.__known_index = {
+                warning_key(warning, instance.warncell_id): warning
+                for warning in current_warnings + expected_warnings
+            }
+            instance.last_update = state["last_update"]
+            instance.data_valid = True
+        return instance
+
+    def _setup(self, identifier):
+        """Resolve the identifier and retrieve the initial data."""
+        for region_query in self._region_queries(identifier):
+            result = query_dwd(**region_query)
+            if self._process_region(region_query["typeName"], result):
+                break
+        self._resolved(identifier)
+        self.update()
+
     def update(self):
         """Update data by querying DWD server and parsing result."""
-        if self.__query is None:
+        if self._query is None:
             return
 
-        json_data = query_dwd(**self.__query)
+        self._process_result(query_dwd(**self._query, validators=self._validators))
+
+    def _process_result(self, json_data):
+        """Parse the retrieved data or invalidate all data on failure."""
+        # Concurrent updates of the same instance must not mix their data
+        with self._lock:
+            self.added, self.removed, self.changed = set(), set(), set()
+            # Keep the current data if nothing changed since the last update
+            if json_data is NOT_MODIFIED:
+                if self.data_valid:
+                    return
+                # There is no data left to keep after a failed update
+                json_data = None
+            if (
+                self.data_valid
+                and json_data is not None
+                and json_data.get("timeStamp")
+                and json_data.get("timeStamp") == self._validators.get("timestamp")
+            ):
+                return
+
+            if json_data is not None:
+                self.__parse_result(json_data)
+            else:
+                self.__invalidate()
 
-        if json_data is not None:
-            self.__parse_result(json_data)
-        else:
-            self.data_valid = False
-            self.last_update = None
-            self.current_warning_level = None
-            self.current_warnings = None
-            self.expected_warning_level = None
-            self.expected_warnings = None
-
-    def __generate_query(self, identifier):
-        """Determine the warning region to which the identifier belongs."""
-        weather_warnings_query_mapping = {
-            "dwd:Warngebiete_Gemeinden": "dwd:Warnungen_Gemeinden",
-            "dwd:Warngebiete_Kreise": "dwd:Warnungen_Landkreise",
-            "dwd:Warngebiete_Binnenseen": "dwd:Warnungen_Binnenseen",
-            "dwd:Warngebiete_Kueste": "dwd:Warnungen_Kueste",
-        }
+            if self.data_valid:
+                self._validators["timestamp"] = json_data.get("timeStamp")
+            else:
+                self._validators.clear()
+
+    @classmethod
+    def update_many(cls, instances):
+        """
+        Update several instances with as few queries as possible.
+
+        Instead of one query per instance, a single query per warning layer
+        is sent for all requested warncells. Very long lists of warncells are
+        split into several queries to respect URL length limits.
+
+        Parameters
+        ----------
+        instances : iterable of DwdWeatherWarningsAPI
+            the instances to be updated, asynchronous instances raise
+            TypeError
+        """
+        # pylint: disable=protected-access
+        # Group the instances by warning layer and warncell id
+        layers = {}
+        for instance in instances:
+            check_sync(instance)
+            if instance._query is None:
+                continue
+            cells = layers.setdefault(instance._query["typeName"], {})
+            cells.setdefault(str(instance.warncell_id), []).append(instance)
+
+        for layer, cells in layers.items():
+            prop = WARNCELL_ID_PROPERTIES[layer]
+            for cql_filter, ids in build_cql_in_filters(prop, cells):
+                json_data = query_dwd(
+                    typeName=layer,
+                    CQL_FILTER=cql_filter,
+                    propertyName=(prop, *WARNING_PROPERTIES),
+                )
+
+                if json_data is None:
+                    for ident in ids:
+                        for instance in cells[ident]:
+                            with instance._lock:
+                                instance.__invalidate()
+                    continue
+
+                # Fan out the returned features to the matching warncells
+                features = {ident: [] for ident in ids}
+                for feature in json_data.get("features") or []:
+                    ident = str(feature["properties"].get(prop))
+                    if ident in features:
+                        features[ident].append(feature)
+                for ident in ids:
+                    cell_data = {
+                        "timeStamp": json_data.get("timeStamp"),
+                        "numberReturned": len(features[ident]),
+                        "features": features[ident],
+                    }
+                    for instance in cells[ident]:
+                        with instance._lock:
+                            instance.__parse_result(cell_data)
+                            if instance.data_valid:
+                                instance._validators["timestamp"] = cell_data[
+                                    "timeStamp"
+                                ]
+
+    def _region_queries(self, identifier):
+        """
+        Determine the warning region to which the identifier belongs.
+
+        The identifier is resolved locally if possible. Otherwise the region
+        queries are returned in the order they have to be sent to the server.
+        """
+        # Identifiers resolved before don't need to be resolved again
+        resolution = get_resolution_cache().get("weatherwarnings", identifier)
+        if resolution is not None:
+            self.warncell_id = resolution["cell_id"]
+            self.warncell_name = resolution["cell_name"]
+            self.__set_query(resolution["layer"])
+            return []
+
+        # Try the bundled warncell list first and query the server only if
+        # the identifier is unknown there
+        if not isinstance(identifier, tuple):
+            warncell = lookup_warncell(identifier, WEATHER_WARNINGS_QUERY_MAPPING)
+            if warncell is not None:
+                region, self.warncell_id, self.warncell_name, unique = warncell
+                if not unique:
+                    self.warncell_name += " (not unique use ID!)"
+                self.__set_query(WEATHER_WARNINGS_QUERY_MAPPING[region])
+                return []
+
+        # Resolve gps locations locally if geometries are available
+        locator = get_default_locator()
+        if isinstance(identifier, tuple) and locator is not None:
+            warncell = locator.locate(float(identifier[0]), float(identifier[1]))
+            if warncell is not None:
+                region, self.warncell_id, self.warncell_name = warncell
+                self.__set_query(WEATHER_WARNINGS_QUERY_MAPPING[region])
+                return []
 
         region_query = {}
         # Numbers represent warncell ids
@@ -241,66 +506,312 @@ class DwdWeatherWarningsAPI:
                 f"CONTAINS(SHAPE, Point({identifier[0]} {identifier[1]}))"
             )
 
-        for region, mapping in weather_warnings_query_mapping.items():
-            region_query["typeName"] = region
-            result = query_dwd(**region_query)
-            if result is not None:
-                if result["numberReturned"] > 0:
-                    self.warncell_id = result["features"][0]["properties"]["WARNCELLID"]
-                    self.warncell_name = result["features"][0]["properties"]["NAME"]
-                    # More than one match found. Can only happen if search is
-                    # done by name.
-                    if result["numberReturned"] > 1:
-                        self.warncell_name += " (not unique use ID!)"
-
-                    self.__query = {"typeName": mapping}
-                    # Special handling for counties
-                    if region == "dwd:Warngebiete_Kreise":
-                        self.__query["CQL_FILTER"] = (
-                            f"GC_WARNCELLID='{self.warncell_id}'"
-                        )
-                    else:
-                        self.__query["CQL_FILTER"] = f"WARNCELLID='{self.warncell_id}'"
-                    break
+        return [
+            {"typeName": region, "propertyName": REGION_PROPERTIES, **region_query}
+            for region in WEATHER_WARNINGS_QUERY_MAPPING
+        ]
+
+    def _resolved(self, identifier):
+        """Remember the resolution of the identifier for further instances."""
+        if self._query is not None:
+            get_resolution_cache().set(
+                "weatherwarnings",
+                identifier,
+                self.warncell_id,
+                self.warncell_name,
+                self._query["typeName"],
+            )
+
+    def _process_region(self, region, result):
+        """Evaluate the result of a region query, return True on a match."""
+        if result is None or result["numberReturned"] == 0:
+            return False
+
+        self.warncell_id = result["features"][0]["properties"]["WARNCELLID"]
+        self.warncell_name = result["features"][0]["properties"]["NAME"]
+        # More than one match found. Can only happen if search is done by name.
+        if result["numberReturned"] > 1:
+            self.warncell_name += " (not unique use ID!)"
+
+        self.__set_query(WEATHER_WARNINGS_QUERY_MAPPING[region])
+        return True
+
+    def __set_query(self, layer):
+        """Set the query for the warning layer of the selected warncell."""
+        self._query = {"typeName": layer}
+        # Special handling for counties
+        prop = WARNCELL_ID_PROPERTIES[layer]
+        self._query["CQL_FILTER"] = f"{prop}='{self.warncell_id}'"
+        self._query["propertyName"] = (prop, *WARNING_PROPERTIES)
 
     def __parse_result(self, json_obj):
         """Parse the retrieved data."""
-        try:
-            current_maxlevel = 0
-            expected_maxlevel = 0
-            current_warnings = []
-            expected_warnings = []
-
-            if json_obj["timeStamp"]:
-                try:
-                    self.last_update = datetime.fromisoformat(json_obj["timeStamp"])
-                except:  # pylint: disable=bare-except
+        with measure_parse(self._query["typeName"]):
+            try:
+                current_maxlevel = 0
+                expected_maxlevel = 0
+                current_warnings = []
+                expected_warnings = []
+
+                if json_obj["timeStamp"]:
+                    try:
+                        self.last_update = datetime.fromisoformat(json_obj["timeStamp"])
+                    except:  # pylint: disable=bare-except
+                        self.last_update = datetime.now(UTC)
+                else:
                     self.last_update = datetime.now(UTC)
-            else:
-                self.last_update = datetime.now(UTC)
 
-            if json_obj["numberReturned"]:
-                for feature in json_obj["features"]:
-                    warning = convert_warning_data(feature["properties"])
+                if json_obj["numberReturned"]:
+                    for feature in json_obj["features"]:
+                        warning = convert_warning_data(
+                            feature["properties"], self.records
+                        )
 
-                    if warning["urgency"] == "immediate":
-                        current_warnings.append(warning)
-                        current_maxlevel = max(warning["level"], current_maxlevel)
-                    else:
-                        expected_warnings.append(warning)
-                        expected_maxlevel = max(warning["level"], expected_maxlevel)
+                        if warning["urgency"] == "immediate":
+                            current_warnings.append(warning)
+                            current_maxlevel = max(warning["level"], current_maxlevel)
+                        else:
+                            expected_warnings.append(warning)
+                            expected_maxlevel = max(warning["level"], expected_maxlevel)
+
+                self.current_warning_level = current_maxlevel
+                self.current_warnings = current_warnings
+
+                self.expected_warning_level = expected_maxlevel
+                self.expected_warnings = expected_warnings
+
+                index = {
+                    warning_key(warning, self.warncell_id): warning
+                    for warning in current_warnings + expected_warnings
+                }
+                self.added, self.removed, self.changed = diff_warnings(
+                    self.__known_index, index
+                )
+                self.warning_index = self.__known_index = index
+                self.data_valid = True
+
+            except:  # pylint: disable=bare-except
+                self.__invalidate()
+
+    def __invalidate(self):
+        """Reset all data attributes after a failed update."""
+        self.data_valid = False
+        self.last_update = None
+        self.current_warning_level = None
+        self.current_warnings = None
+        self.expected_warning_level = None
+        self.expected_warnings = None
+        self.warning_index = None
+        self.added, self.removed, self.changed = set(), set(), set()
+        # The validators belong to the discarded data
+        self._validators.clear()
 
-            self.current_warning_level = current_maxlevel
-            self.current_warnings = current_warnings
 
-            self.expected_warning_level = expected_maxlevel
-            self.expected_warnings = expected_warnings
+class WarningsSnapshot:
+    """
+    Class holding all weather warnings issued by DWD for Germany.
+
+    The complete warning layers are downloaded at once and indexed by
+    warncell id, so that the warnings of a single warncell can be looked up
+    without further queries.
+
+    Attributes:
+    -----------
+    data_valid : bool
+        a flag wether or not the other attributes contain valid values
+    layers : tuple of str
+        the downloaded warning layers
+    last_update : datetime
+        the UTC timestamp of the last update
+    warnings : dict
+        dictionary containing all warnings
+        key : int
+            warncell id
+        value : list of dicts
+            list of dictionaries containing all warnings for the warncell
+            dictionary content is identical to
+            DwdWeatherWarningsAPI.current_warnings
+    warning_index : dict
+        all warnings keyed by their identity (event_code, start_time,
+        warncell_id)
+    added : set
+        keys of the warnings which are new since the previous update
+    removed : set
+        keys of the warnings which were dropped since the previous update
+    changed : set
+        keys of the warnings whose content changed since the previous update
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    # Version of the state returned by to_snapshot()
+    SNAPSHOT_VERSION = 1
+
+    def __init__(
+        self,
+        layers=("dwd:Warnungen_Gemeinden", "dwd:Warnungen_Landkreise"),
+        records=False,
+    ):
+        """
+        Init DWD weather warnings snapshot.
+
+        Parameters
+        ----------
+        layers : tuple of str
+            the warning layers to be downloaded
+        records : bool
+            store the warnings as compact WeatherWarning records instead of
+            dictionaries, recommended for the large snapshots
+        """
+        self.__init_state(layers, records)
+        self.update()
+
+    def __init_state(self, layers, records):
+        """Init all attributes without data."""
+        self.data_valid = False
+        self.records = records
+        self.layers = tuple(layers)
+        self.last_update = None
+        self.warnings = None
+        self.warning_index = None
+        self.added = set()
+        self.removed = set()
+        self.changed = set()
+        self._lock = threading.Lock()
+        # Last valid index, kept to compare with after a failed update
+        self.__known_index = {}
+
+    def __bool__(self):
+        """Return the data_valid attribute."""
+        return self.data_valid
+
+    def __len__(self):
+        """Return the number of warncells with warnings."""
+        if self.data_valid:
+            return len(self.warnings)
+        return 0
+
+    def __contains__(self, warncell_id):
+        """Return whether warnings exist for the given warncell id."""
+        return bool(self.for_cell(warncell_id))
+
+    def __str__(self):
+        """Return a short overview about the actual status."""
+        if self.data_valid:
+            count = sum(len(warnings) for warnings in self.warnings.values())
+            retval = f"{count} warnings issued by DWD for {len(self)} warncells"
+        else:
+            retval = "No valid data available"
+        return retval
+
+    def to_snapshot(self):
+        """Return the state needed to restore the instance, see from_snapshot()."""
+        with self._lock:
+            return {
+                "version": self.SNAPSHOT_VERSION,
+                "records": self.records,
+                "layers": list(self.layers),
+                "data_valid": self.data_valid,
+                "last_update": self.last_update,
+                "warnings": self.warnings,
+            }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        """
+        Restore an instance from the state returned by to_snapshot().
+
+        No query is sent. Raises ValueError if the state was created by
+        another version.
+        """
+        # pylint: disable=unused-private-member
+        if state.get("version") != cls.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {state.get('version')}")
+        instance = cls.__new__(cls)
+        instance.__init_state(state["layers"], state["records"])
+        if state["data_valid"]:
+            warnings = {
+                int(warncell_id): list(cell_warnings)
+                for warncell_id, cell_warnings in state["warnings"].items()
+            }
+            instance.warnings = warnings
+            instance.warning_index = instance.__known_index = {
+                warning_key(warning, warncell_id): warning
+                for warncell_id, cell_warnings in warnings.items()
+                for warning in cell_warnings
+            }
+            instance.last_update = state["last_update"]
+            instance.data_valid = True
+        return instance
+
+    def for_cell(self, warncell_id):
+        """
+        Return all warnings for a warncell.
+
+        Parameters
+        ----------
+        warncell_id : int or str
+            a valid warncell id
+        """
+        if not self.data_valid:
+            return []
+        try:
+            return self.warnings.get(int(warncell_id), [])
+        except (TypeError, ValueError):
+            return []
+
+    def update(self):
+        """Update data by querying DWD server and parsing result."""
+        warnings = {}
+        last_update = None
+        for layer in self.layers:
+            prop = WARNCELL_ID_PROPERTIES.get(layer, "WARNCELLID")
+            # The layers are large, so the features are parsed while
+            # downloading instead of loading the complete response at once
+            stream = iter_features(
+                typeName=layer,
+                propertyName=(prop, *WARNING_PROPERTIES),
+            )
+            if stream is not None:
+                last_update = self.__parse_result(layer, stream, warnings, self.records)
+            if stream is None or not stream.valid:
+                with self._lock:
+                    self.data_valid = False
+                    self.last_update = None
+                    self.warnings = None
+                    self.warning_index = None
+                    self.added, self.removed, self.changed = set(), set(), set()
+                return
+
+        index = {
+            warning_key(warning, warncell_id): warning
+            for warncell_id, cell_warnings in warnings.items()
+            for warning in cell_warnings
+        }
+        # Concurrent updates must not mix their data
+        with self._lock:
+            self.added, self.removed, self.changed = diff_warnings(
+                self.__known_index, index
+            )
+            self.last_update = last_update
+            self.warnings = warnings
+            self.warning_index = self.__known_index = index
             self.data_valid = True
 
+    @staticmethod
+    def __parse_result(layer, stream, warnings, records):
+        """Parse the streamed features into the given index."""
+        prop = WARNCELL_ID_PROPERTIES.get(layer, "WARNCELLID")
+        for properties in stream:
+            try:
+                warncell_id = int(properties[prop])
+            except (KeyError, TypeError, ValueError):
+                continue
+            warnings.setdefault(warncell_id, []).append(
+                convert_warning_data(properties, records)
+            )
+
+        try:
+            return datetime.fromisoformat(stream.members["timeStamp"])
         except:  # pylint: disable=bare-except
-            self.data_valid = False
-            self.last_update = None
-            self.current_warning_level = None
-            self.current_warnings = None
-            self.expected_warning_level = None
-            self.expected_warnings = None
+            return datetime.now(UTC)
@@ -0,0 +1,21 @@
+"""Shared fixtures for the dwdwfsapi tests."""
+
+import pytest
+from stub_geoserver import StubGeoserver
+
+from dwdwfsapi import cache, core
+
+
+@pytest.fixture(name="stub_server")
+def fixture_stub_server():
+    """Route all queries to a local stub geoserver."""
+    stub = StubGeoserver()
+    stub.start()
+    core.set_base_url(stub.url)
+    core.set_session(core.create_session(retries=0))
+    cache.set_resolution_cache(None)
+    yield stub
+    cache.set_resolution_cache(None)
+    core.set_session(None)
+    core.set_base_url(None)
+    stub.stop()
@@ -0,0 +1,161 @@
+"""
+
+Local stub of the DWD geoserver used by the offline tests and the benchmarks.
+
+"""
+
+import json
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def match_cql_filter(properties, cql_filter):
+    """Evaluate the simple CQL filters used by dwdwfsapi."""
+    if cql_filter is None:
+        return True
+    match = re.fullmatch(r"(\w+)='(.*)'", cql_filter)
+    if match:
+        return str(properties.get(match[1])) == match[2]
+    match = re.fullmatch(r"(\w+) IN \((.*)\)", cql_filter)
+    if match:
+        values = [v.strip("'") for v in match[2].split(",")]
+        return str(properties.get(match[1])) in values
+    match = re.fullmatch(r"(\w+) LIKE '%(.*)%'", cql_filter)
+    if match:
+        return match[2] in str(properties.get(match[1]))
+    return False
+
+
+def project(properties, property_names):
+    """Return only the requested properties."""
+    if property_names is None:
+        return properties
+    names = property_names.split(",")
+    return {k: v for k, v in properties.items() if k in names}
+
+
+class StubGeoserver:
+    """Minimal local stand-in for the DWD geoserver WFS endpoint."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, cache_bodies=False):
+        """
+        Init stub geoserver.
+
+        Parameters
+        ----------
+        cache_bodies : bool
+            encode the response of each query only once, so benchmarks
+            measure the client and not the stub. Only for layers which don't
+            change while serving.
+        """
+        self.cache_bodies = cache_bodies
+        self.__bodies = {}
+        self.layers = {}
+        self.requests = []
+        self.request_headers = []
+        self.connections = set()
+        self.status_codes = []
+        self.headers = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.__handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/ows"
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        )
+
+    def __handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Serve the registered layers as GeoJSON."""
+
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, avoid delayed ACKs
+            disable_nagle_algorithm = True
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Answer a GetFeature request."""
+                params = dict(
+                    urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query)
+                )
+                stub.requests.append(params)
+                stub.request_headers.append(dict(self.headers))
+                stub.connections.add(self.client_address)
+                status = stub.status_codes.pop(0) if stub.status_codes else 200
+                body = stub.body(params)
+                if body is None:
+                    status = 400
+                    body = b"null"
+                if stub.headers.get("ETag") and stub.headers.get(
+                    "ETag"
+                ) == self.headers.get("If-None-Match"):
+                    status = 304
+                    body = b""
+                self.send_response(status)
+                for key, value in stub.headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                """Keep the test output clean."""
+
+        return Handler
+
+    def body(self, params):
+        """Return the encoded response to a query, None if the layer is unknown."""
+        key = tuple(sorted(params.items()))
+        if self.cache_bodies and key in self.__bodies:
+            return self.__bodies[key]
+        layer = self.layers.get(params.get("typeName"))
+        if callable(layer):
+            layer = layer(params)
+        elif isinstance(layer, list):
+            layer = feature_collection(
+                [
+                    project(properties, params.get("propertyName"))
+                    for properties in layer
+                    if match_cql_filter(properties, params.get("CQL_FILTER"))
+                ]
+            )
+        body = None if layer is None else json.dumps(layer).encode("utf-8")
+        if self.cache_bodies:
+            self.__bodies[key] = body
+        return body
+
+    def start(self):
+        """Start serving in a background thread."""
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        """Start serving for the duration of a with block."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving."""
+        self.stop()
+
+
+def feature_collection(features, timestamp="2024-03-15T10:00:00.000Z"):
+    """Wrap a list of property dicts into a WFS FeatureCollection."""
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": None, "properties": properties}
+            for properties in features
+        ],
+        "numberMatched": len(features),
+        "numberReturned": len(features),
+        "timeStamp": timestamp,
+    }
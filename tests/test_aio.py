@@ -0,0 +1,230 @@
+"""Tests for dwdwfsapi aio package."""
+
+import asyncio
+
+import pytest
+
+from dwdwfsapi import (
+    DwdPollenFlightAPI,
+    DwdWeatherWarningsAPI,
+    Refresher,
+    core,
+    metrics,
+    update_all,
+)
+from dwdwfsapi.limiter import Limiter
+
+aio = pytest.importorskip("dwdwfsapi.aio")
+
+POLLEN_FEATURES = [
+    {
+        "GF": gf,
+        "GEN": name,
+        "EC_II": ec_ii,
+        "PARAMETER_NAME": parameter,
+        "FORECAST_DATE": f"2024-03-{day}T00:00:00Z",
+        "POLLENINT": level,
+        "PARAMETER_VALUE": "gering",
+        "EC_AREA_COLOR": "254 227 145",
+    }
+    for gf, name in ((11, "Inseln und Marschen"), (62, "Harz"))
+    for ec_ii, parameter in ((1, "Hasel"), (2, "Erle"))
+    for day, level in (("15", 1), ("16", 2), ("17", 2))
+]
+
+WARNING_FEATURES = [
+    {
+        "WARNCELLID": 808436003,
+        "EC_II": "22",
+        "EVENT": "FROST",
+        "URGENCY": "Immediate",
+        "SEVERITY": "Minor",
+        "ONSET": "2024-03-15T23:00:00Z",
+        "EXPIRES": "2024-03-16T05:00:00Z",
+        "EC_AREA_COLOR": "255 255 0",
+    },
+]
+
+
+@pytest.fixture(name="aio_server")
+def fixture_aio_server(stub_server):
+    """Serve pollen regions and warnings from the stub server."""
+    stub_server.layers = {
+        "dwd:Pollenfluggebiete": [
+            {"GF": 11, "GEN": "Inseln und Marschen"},
+            {"GF": 62, "GEN": "Harz"},
+        ],
+        "dwd:Pollenflug": POLLEN_FEATURES,
+        "dwd:Warnungen_Gemeinden": WARNING_FEATURES,
+    }
+    return stub_server
+
+
+def run(coro):
+    """Run a coroutine and close the shared session afterwards."""
+
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await aio.close_session()
+
+    return asyncio.run(wrapper())
+
+
+def test_weatherwarnings(aio_server):
+    """Test the async weather warnings api against the sync one."""
+    dwd = run(aio.AsyncDwdWeatherWarningsAPI.create(808436003))
+    reference = DwdWeatherWarningsAPI(808436003)
+
+    assert dwd.data_valid
+    assert dwd.warncell_name == reference.warncell_name
+    assert dwd.current_warnings == reference.current_warnings
+    assert len(aio_server.requests) == 2
+
+
+def test_pollenflight(aio_server):
+    """Test the async pollen flight api against the sync one."""
+    dwd = run(aio.AsyncDwdPollenFlightAPI.create(62))
+    reference = DwdPollenFlightAPI(62)
+
+    assert dwd.data_valid
+    assert dwd.cell_name == "Harz"
+    assert dwd.forecast_data == reference.forecast_data
+    # The resolution is reused by the second instance
+    assert len(aio_server.requests) == 3
+
+
+def test_concurrent(aio_server):
+    """Test refreshing many instances concurrently."""
+    aio.configure(concurrency=2)
+
+    async def refresh():
+        dwds = await asyncio.gather(
+            *(aio.AsyncDwdPollenFlightAPI.create(gf) for gf in (11, 62) * 5)
+        )
+        await asyncio.gather(*(dwd.update() for dwd in dwds))
+        return dwds
+
+    try:
+        dwds = run(refresh())
+    finally:
+        aio.configure(concurrency=aio.core.DEFAULT_CONCURRENCY)
+
+    assert all(dwd.data_valid for dwd in dwds)
+    # Concurrent identical queries share a single request
+    assert len(aio_server.requests) == 6
+
+
+def test_metrics(aio_server):
+    """Test the instrumentation of async queries."""
+    collected = metrics.Metrics()
+    metrics.set_metrics(collected)
+    try:
+        run(aio.AsyncDwdPollenFlightAPI.create(62))
+    finally:
+        metrics.set_metrics(metrics.Metrics())
+
+    assert collected.counter("dwdwfsapi_queries_total", status="200") == 2
+    for phase in ("queue", "response", "download", "decode"):
+        histogram = collected.histogram(
+            "dwdwfsapi_query_duration_seconds", typename="dwd:Pollenflug", phase=phase
+        )
+        assert histogram.count == 1
+    # The first query opens the connection, the second one reuses it
+    assert collected.histogram(
+        "dwdwfsapi_query_duration_seconds",
+        typename="dwd:Pollenfluggebiete",
+        phase="connect",
+    )
+    assert collected.counter("dwdwfsapi_connections_total", reused="false") == 1
+    assert collected.counter("dwdwfsapi_connections_total", reused="true") == 1
+    assert collected.histogram(
+        "dwdwfsapi_parse_duration_seconds", typename="dwd:Pollenflug"
+    )
+    assert len(aio_server.requests) == 2
+
+
+def test_limiter(aio_server):
+    """Test sharing the limiter with async queries."""
+    limiter = Limiter(rate=None, initial_concurrency=1)
+    core.set_limiter(limiter)
+
+    async def refresh():
+        return await asyncio.gather(
+            *(aio.AsyncDwdPollenFlightAPI.create(gf) for gf in (11, 62))
+        )
+
+    try:
+        dwds = run(refresh())
+    finally:
+        core.set_limiter(None)
+
+    assert all(dwd.data_valid for dwd in dwds)
+    assert len(aio_server.requests) == 4
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.concurrency.limit > 1
+
+
+def test_coalescing(aio_server):
+    """Test sharing a request between concurrent identical queries."""
+
+    async def query():
+        tasks = [
+            asyncio.ensure_future(aio.query_dwd(typeName="dwd:Pollenflug"))
+            for _ in range(5)
+        ]
+        # Cancelling one caller must not cancel the shared request
+        await asyncio.sleep(0)
+        tasks[0].cancel()
+        return await asyncio.gather(*tasks[1:])
+
+    results = run(query())
+
+    assert len(aio_server.requests) == 1
+    assert all(result is results[0] for result in results)
+    assert results[0]["numberReturned"] == len(POLLEN_FEATURES)
+
+
+def test_sync_update_rejected(aio_server):
+    """Test rejecting async instances where they would be updated sync."""
+    dwd = run(aio.AsyncDwdWeatherWarningsAPI.create(808436003))
+
+    with pytest.raises(TypeError):
+        update_all([dwd])
+    with pytest.raises(TypeError):
+        Refresher().register(dwd)
+    with pytest.raises(TypeError):
+        DwdWeatherWarningsAPI.update_many([dwd])
+    assert len(aio_server.requests) == 1
+
+
+@pytest.mark.parametrize("ident", [12.5, "Hintertupfing"])
+def test_wrong_input(ident, aio_server):
+    """Test an invalid input."""
+    dwd = run(aio.AsyncDwdPollenFlightAPI.create(ident))
+
+    assert not dwd.data_valid
+    assert dwd.cell_id is None
+    assert dwd.forecast_data is None
+    assert len(aio_server.requests) == (0 if isinstance(ident, float) else 1)
+
+
+def test_limiter_retries(aio_server):
+    """Test passing the limiter again when retrying overload responses."""
+    limiter = Limiter(rate=None, initial_concurrency=4)
+    core.set_limiter(limiter)
+    aio.configure(backoff_factor=0)
+    aio_server.status_codes = [429, 429]
+
+    try:
+        result = run(aio.query_dwd(typeName="dwd:Pollenflug"))
+    finally:
+        aio.configure(backoff_factor=aio.core.DEFAULT_BACKOFF_FACTOR)
+        core.set_limiter(None)
+
+    assert result is not None
+    assert len(aio_server.requests) == 3
+    assert limiter.concurrency.in_flight == 0
+    # Every retry is reported to the limiter as overload
+    assert limiter.concurrency.limit == 2
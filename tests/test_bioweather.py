@@ -5,6 +5,7 @@ from datetime import UTC, datetime, timedelta
 import pytest
 
 from dwdwfsapi import DwdBioWeatherAPI
+from dwdwfsapi.bioweather import BioWeatherSnapshot, index_forecast_layer
 
 MIN_LEVEL = 0  # 0 = positive impact
 MAX_LEVEL = 3  # 3 = high risk
@@ -73,3 +74,56 @@ def test_wrong_input(ident_name):
     assert dwd.cell_name is None
     assert dwd.last_update is None
     assert dwd.forecast_data is None
+
+
+LAYER_FEATURES = [
+    {
+        "properties": {
+            "GF": gf,
+            "EC_II": 1,
+            "PARAMETER_NAME": "Asthma",
+            "FORECAST_DATE": f"2024-03-{day}T00:00:00Z",
+            "BIOWETTERINT": 1,
+            "PARAMETER_VALUE": "gering",
+            "EC_AREA_COLOR": "254 227 145",
+        }
+    }
+    # DWD is returning some datasets twice
+    for _ in range(2)
+    for gf in (11, 62)
+    for day in ("17", "16", "15")
+]
+
+
+def test_index_forecast_layer():
+    """Test parsing a whole layer into a per region index."""
+    regions = index_forecast_layer([*LAYER_FEATURES, {"properties": {}}])
+
+    assert sorted(regions) == [11, 62]
+    forecast = regions[11][1]["forecast"]
+    assert regions[11][1]["name"] == "Asthma"
+    assert [entry["start_time"].day for entry in forecast] == [15, 16, 17]
+    assert forecast[0]["color"] == "#fee391"
+
+
+def test_snapshot(stub_server):
+    """Test downloading the forecasts of all regions at once."""
+    stub_server.layers = {
+        "dwd:Biowettervorhersage": [feature["properties"] for feature in LAYER_FEATURES]
+    }
+    snapshot = BioWeatherSnapshot(records=True)
+
+    assert snapshot.data_valid
+    assert len(stub_server.requests) == 1
+    assert "CQL_FILTER" not in stub_server.requests[0]
+    assert len(snapshot) == 2
+    assert 62 in snapshot
+    assert "11" in snapshot
+    assert 20 not in snapshot
+    assert len(snapshot.for_region(11)[1]["forecast"]) == 3
+    assert snapshot.for_region(20) == {}
+
+    stub_server.status_codes.append(500)
+    snapshot.update()
+    assert not snapshot
+    assert snapshot.for_region(11) == {}
@@ -0,0 +1,160 @@
+"""Tests for dwdwfsapi cache module."""
+
+import json
+import time
+
+import pytest
+from stub_geoserver import feature_collection
+
+from dwdwfsapi import DwdPollenFlightAPI, core
+from dwdwfsapi.cache import (
+    DiskCache,
+    MemoryCache,
+    ResolutionCache,
+    ResponseCache,
+    get_resolution_cache,
+    set_resolution_cache,
+)
+
+
+@pytest.fixture(name="cache_factory", params=["memory", "disk"])
+def fixture_cache_factory(request, tmp_path):
+    """Return a factory for all cache backends."""
+
+    def factory(maxsize):
+        if request.param == "memory":
+            return MemoryCache(maxsize=maxsize)
+        return DiskCache(tmp_path / "cache", maxsize=maxsize)
+
+    return factory
+
+
+def test_expiry(cache_factory):
+    """Test expiring entries."""
+    cache = cache_factory(10)
+    cache.set("a", {"value": 1}, 60)
+    cache.set("b", {"value": 2}, 0.01)
+    time.sleep(0.05)
+
+    assert cache.get("a") == {"value": 1}
+    assert cache.get("b") is None
+    assert cache.get("c") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_eviction(cache_factory):
+    """Test evicting the least recently used entries."""
+    cache = cache_factory(2)
+    cache.set("a", {"value": 1}, 60)
+    time.sleep(0.01)
+    cache.set("b", {"value": 2}, 60)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", {"value": 3}, 60)
+
+    assert len(cache) == 2
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_disk_shared(tmp_path):
+    """Test sharing a disk cache between several instances."""
+    DiskCache(tmp_path).set("a", {"value": 1}, 60)
+
+    assert DiskCache(tmp_path).get("a") == {"value": 1}
+
+
+def test_incomplete_backend():
+    """Test rejecting backends which don't implement all methods."""
+
+    class IncompleteCache(ResponseCache):  # pylint: disable=abstract-method
+        """Cache without _store()."""
+
+        def clear(self):
+            """Remove all entries."""
+
+        def _load(self, key):
+            """Return nothing."""
+
+    with pytest.raises(TypeError):
+        IncompleteCache()  # pylint: disable=abstract-class-instantiated
+
+
+def test_query(stub_server):
+    """Test caching identical queries."""
+    stub_server.layers["dwd:Pollenfluggebiete"] = [{"GF": 62, "GEN": "Harz"}]
+    stub_server.layers["dwd:Pollenflug"] = feature_collection([])
+    cache = MemoryCache()
+    core.set_cache(cache, layer_ttl={"dwd:Pollenfluggebiete": 0})
+    try:
+        for _ in range(3):
+            assert DwdPollenFlightAPI(62).data_valid
+    finally:
+        core.set_cache(None)
+
+    # Forecasts are cached, regions not
+    assert len(stub_server.requests) == 2
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_resolution(stub_server, tmp_path):
+    """Test reusing resolved identifiers."""
+    stub_server.layers["dwd:Pollenfluggebiete"] = [{"GF": 62, "GEN": "Harz"}]
+    stub_server.layers["dwd:Pollenflug"] = feature_collection([])
+    path = tmp_path / "resolution.json"
+    set_resolution_cache(ResolutionCache(path))
+    dwd = DwdPollenFlightAPI("Harz")
+    dwd = DwdPollenFlightAPI("Harz")
+
+    assert dwd.cell_id == 62
+    assert dwd.cell_name == "Harz"
+    assert [r["typeName"] for r in stub_server.requests] == [
+        "dwd:Pollenfluggebiete",
+        "dwd:Pollenflug",
+        "dwd:Pollenflug",
+    ]
+
+    # Simulate a restart, pending entries are written on exit
+    get_resolution_cache().flush()
+    set_resolution_cache(ResolutionCache(path))
+    dwd = DwdPollenFlightAPI("Harz")
+
+    assert dwd.data_valid
+    assert dwd.cell_name == "Harz"
+    assert len(stub_server.requests) == 4
+
+
+def test_resolution_batched(tmp_path):
+    """Test writing resolutions in batches and bounding the entries."""
+    path = tmp_path / "resolution.json"
+    cache = ResolutionCache(path, maxsize=3, flush_size=2, flush_interval=3600)
+    cache.set("pollenflight", "Harz", 62, "Harz", "dwd:Pollenflug")
+    assert not path.exists()
+    cache.set("pollenflight", "Inseln", 11, "Inseln", "dwd:Pollenflug")
+    assert len(ResolutionCache(path)) == 2
+
+    cache.set("pollenflight", 62, 62, "Harz", "dwd:Pollenflug")
+    cache.set("pollenflight", 11, 11, "Inseln", "dwd:Pollenflug")
+    assert len(cache) == 3
+    assert cache.get("pollenflight", "Harz") is None
+    assert cache.get("pollenflight", 11)["cell_name"] == "Inseln"
+    cache.flush()
+    assert len(ResolutionCache(path)) == 3
+
+    # Disabled caches don't store anything
+    cache = ResolutionCache(maxsize=0)
+    cache.set("pollenflight", "Harz", 62, "Harz", "dwd:Pollenflug")
+    assert cache.get("pollenflight", "Harz") is None
+
+
+def test_resolution_version(tmp_path):
+    """Test ignoring files of other format versions."""
+    path = tmp_path / "resolution.json"
+    resolution = {"cell_id": 62, "cell_name": "Harz", "query": {}}
+    path.write_text(json.dumps({'["pollenflight", "Harz"]': resolution}))
+    assert len(ResolutionCache(path)) == 0
+
+    path.write_text(json.dumps({"version": 0, "entries": {"a": resolution}}))
+    assert len(ResolutionCache(path)) == 0
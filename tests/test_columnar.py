@@ -0,0 +1,128 @@
+"""Tests for dwdwfsapi columnar module."""
+
+import itertools
+import threading
+
+import pytest
+from stub_geoserver import feature_collection
+
+np = pytest.importorskip("numpy")
+
+# pylint: disable=wrong-import-position,unsubscriptable-object
+from dwdwfsapi.columnar import WarningsTable
+
+WARNINGS = [
+    {
+        "WARNCELLID": 808436003,
+        "EC_II": "22",
+        "URGENCY": "Immediate",
+        "SEVERITY": "Minor",
+        "ONSET": "2024-03-15T23:00:00Z",
+        "EXPIRES": "2024-03-16T05:00:00Z",
+        "EC_AREA_COLOR": "255 255 0",
+    },
+    {
+        "WARNCELLID": 808436003,
+        "EC_II": "51",
+        "URGENCY": "Future",
+        "SEVERITY": "Severe",
+        "ONSET": "2024-03-16T10:00:00+01:00",
+        "EC_AREA_COLOR": "255 153 0",
+    },
+    {
+        "WARNCELLID": 809179142,
+        "EC_II": "51",
+        "URGENCY": "Immediate",
+        "SEVERITY": "Moderate",
+        "EC_AREA_COLOR": "invalid",
+    },
+    {"EC_II": "51"},
+]
+
+
+@pytest.fixture(name="table_server")
+def fixture_table_server(stub_server):
+    """Serve one layer of warnings from the stub server."""
+    stub_server.layers = {"dwd:Warnungen_Gemeinden": WARNINGS}
+    return stub_server
+
+
+def test_columns(table_server):
+    """Test parsing the warnings into columns."""
+    table = WarningsTable(layers=("dwd:Warnungen_Gemeinden",))
+
+    assert table.data_valid
+    assert len(table_server.requests) == 1
+    assert len(table) == 3
+    assert table.warncell_id.tolist() == [808436003, 808436003, 809179142]
+    assert table.start_time.dtype == np.dtype("datetime64[s]")
+    assert table.start_time[0] == np.datetime64("2024-03-15T23:00:00")
+    assert table.start_time[1] == np.datetime64("2024-03-16T09:00:00")
+    assert np.isnat(table.end_time[1])
+    assert table.event_code.tolist() == [22, 51, 51]
+    assert table.level.tolist() == [1, 3, 2]
+    assert table.urgency_labels().tolist() == ["immediate", "future", "immediate"]
+    assert table.color.tolist() == [0xFFFF00, 0xFF9900, 0]
+    assert table.rows_for_cell("808436003").tolist() == [0, 1]
+
+
+def test_max_level_per_cell(table_server):
+    """Test the vectorized aggregation of warning levels."""
+    table = WarningsTable(layers=("dwd:Warnungen_Gemeinden",))
+    assert len(table_server.requests) == 1
+
+    cells, levels = table.max_level_per_cell()
+    assert cells.tolist() == [808436003, 809179142]
+    assert levels.tolist() == [3, 2]
+
+    cells, levels = table.max_level_per_cell(urgency="immediate")
+    assert levels.tolist() == [1, 2]
+
+
+def test_growing_columns(stub_server):
+    """Test that the preallocated columns grow as needed."""
+    stub_server.layers = {
+        "dwd:Warnungen_Gemeinden": [
+            {"WARNCELLID": i, "SEVERITY": "Minor"} for i in range(3000)
+        ]
+    }
+    table = WarningsTable(layers=("dwd:Warnungen_Gemeinden",))
+
+    assert len(table) == 3000
+    assert table.warncell_id[-1] == 2999
+    assert int(table.level.sum()) == 3000
+
+
+def test_concurrent_update(stub_server):
+    """Test that readers never see columns of different updates."""
+    sizes = itertools.cycle([1, 2000])
+    stub_server.layers = {
+        "dwd:Warnungen_Gemeinden": lambda params: feature_collection(
+            [
+                {"WARNCELLID": i, "URGENCY": "Future", "SEVERITY": "Minor"}
+                for i in range(next(sizes))
+            ]
+        )
+    }
+    table = WarningsTable(layers=("dwd:Warnungen_Gemeinden",))
+    threads = [threading.Thread(target=table.update) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        cells, levels = table.max_level_per_cell(urgency="future")
+        assert len(cells) == len(levels)
+    for thread in threads:
+        thread.join()
+
+    assert table.data_valid
+
+
+def test_invalid(stub_server):
+    """Test that failed downloads invalidate all columns."""
+    stub_server.status_codes.append(500)
+    stub_server.layers = {"dwd:Warnungen_Gemeinden": WARNINGS}
+    table = WarningsTable(layers=("dwd:Warnungen_Gemeinden",))
+
+    assert not table
+    assert table.level is None
+    assert len(table) == 0
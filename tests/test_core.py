@@ -0,0 +1,171 @@
+"""Tests for dwdwfsapi core module."""
+
+import threading
+import time
+
+from stub_geoserver import feature_collection
+
+from dwdwfsapi import core, metrics
+
+
+def test_query(stub_server):
+    """Test a query against the stub server."""
+    stub_server.layers["dwd:Test"] = feature_collection([{"ID": 1}])
+    result = core.query_dwd(typeName="dwd:Test", CQL_FILTER="ID='1'")
+
+    assert result["numberReturned"] == 1
+    assert stub_server.requests[0]["CQL_FILTER"] == "ID='1'"
+    assert stub_server.requests[0]["OutputFormat"] == "application/json"
+
+
+def test_connection_reuse(stub_server):
+    """Test that consecutive queries share one keep-alive connection."""
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    for _ in range(5):
+        assert core.query_dwd(typeName="dwd:Test") is not None
+
+    assert len(stub_server.requests) == 5
+    assert len(stub_server.connections) == 1
+
+
+def test_retry(stub_server):
+    """Test that retryable status codes are retried."""
+    core.set_session(core.create_session(retries=2, backoff_factor=0))
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    stub_server.status_codes = [503, 503]
+
+    assert core.query_dwd(typeName="dwd:Test") is not None
+    assert len(stub_server.requests) == 3
+
+
+def test_invalid_query(stub_server):
+    """Test invalid queries."""
+    assert core.query_dwd(CQL_FILTER="ID='1'") is None
+    assert core.query_dwd(typeName="dwd:Unknown") is None
+    assert len(stub_server.requests) == 1
+
+
+def test_conditional_request(stub_server):
+    """Test conditional requests with cache validators."""
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    stub_server.headers["ETag"] = '"abc"'
+    validators = {}
+
+    assert core.query_dwd(typeName="dwd:Test", validators=validators) is not None
+    assert validators["etag"] == '"abc"'
+    result = core.query_dwd(typeName="dwd:Test", validators=validators)
+
+    assert result is core.NOT_MODIFIED
+    assert stub_server.request_headers[1]["If-None-Match"] == '"abc"'
+
+
+def test_property_projection(stub_server):
+    """Test retrieving only selected properties."""
+    stub_server.layers["dwd:Test"] = [{"ID": 1, "NAME": "Test", "OTHER": 2}]
+    result = core.query_dwd(typeName="dwd:Test", propertyName=("ID", "NAME"))
+
+    assert stub_server.requests[0]["propertyName"] == "ID,NAME"
+    assert result["features"][0]["properties"] == {"ID": 1, "NAME": "Test"}
+
+
+def concurrent_queries(count, **kwargs):
+    """Send identical queries from several threads at the same time."""
+    results = [{} for _ in range(count)]
+
+    def query(index):
+        results[index] = core.query_dwd(typeName="dwd:Test", **kwargs)
+
+    threads = [threading.Thread(target=query, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def slow_layer(_):
+    """Answer slowly, so concurrent queries overlap."""
+    time.sleep(0.2)
+    return feature_collection([{"ID": 1}])
+
+
+def test_coalescing(stub_server):
+    """Test sharing a request between concurrent identical queries."""
+    stub_server.layers["dwd:Test"] = slow_layer
+    collected = metrics.Metrics()
+    metrics.set_metrics(collected)
+    try:
+        results = concurrent_queries(5)
+    finally:
+        metrics.set_metrics(metrics.Metrics())
+
+    assert len(stub_server.requests) == 1
+    assert all(result is results[0] for result in results)
+    assert results[0]["numberReturned"] == 1
+    assert collected.counter("dwdwfsapi_coalesced_queries_total") == 4
+
+
+def test_coalescing_error():
+    """Test raising the exception of the leader in all waiting callers."""
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait()
+        raise RuntimeError("failed")
+
+    def call():
+        try:
+            core.coalesce("key", failing)
+        except RuntimeError as err:
+            errors.append(err)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    # Give the followers time to wait for the leader
+    time.sleep(0.05)
+    release.set()
+    for thread in (leader, *followers):
+        thread.join()
+
+    assert len(errors) == 4
+    # The key is released, so the next call runs again
+    assert core.coalesce("key", lambda: 1) == (1, False)
+
+
+def test_coalescing_validators(stub_server):
+    """Test that queries with different validators aren't coalesced."""
+    stub_server.layers["dwd:Test"] = slow_layer
+    stub_server.headers["ETag"] = '"abc"'
+    validators = [{}, {"etag": '"abc"'}]
+
+    def query(index):
+        core.query_dwd(typeName="dwd:Test", validators=validators[index])
+
+    threads = [threading.Thread(target=query, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(stub_server.requests) == 2
+    assert validators[0]["etag"] == '"abc"'
+
+
+def test_coalescing_disabled(stub_server):
+    """Test sending concurrent identical queries separately."""
+    stub_server.layers["dwd:Test"] = slow_layer
+    core.set_coalescing(False)
+    try:
+        results = concurrent_queries(3)
+    finally:
+        core.set_coalescing(True)
+
+    assert len(stub_server.requests) == 3
+    assert results[0] == results[1] == results[2]
@@ -0,0 +1,45 @@
+"""Tests for dwdwfsapi helpers module."""
+
+from datetime import UTC, datetime
+
+import pytest
+
+from dwdwfsapi.helpers import parse_color, parse_rgb, parse_timestamp, severity_level
+
+testdata_color = [
+    ("255 153 0", "#ff9900", (255, 153, 0)),
+    ("0 0 0", "#000000", (0, 0, 0)),
+    ("1 2 3 4", "#010203", (1, 2, 3)),
+    ("1 2", "#000000", None),
+    ("a b c", "#000000", None),
+    (None, "#000000", None),
+    (["255", "0", "0"], "#000000", None),
+]
+
+
+@pytest.mark.parametrize("value, color, rgb", testdata_color)
+def test_color(value, color, rgb):
+    """Test converting colors."""
+    assert parse_color(value) == color
+    assert parse_rgb(value) == rgb
+
+
+def test_timestamp():
+    """Test parsing timestamps."""
+    expected = datetime(2024, 3, 16, 10, tzinfo=UTC)
+    assert parse_timestamp("2024-03-16T10:00:00Z") == expected
+    assert parse_timestamp("2024-03-16T10:00:00Z") is parse_timestamp(
+        "2024-03-16T10:00:00Z"
+    )
+    assert parse_timestamp("invalid") is None
+    assert parse_timestamp(None) is None
+    assert parse_timestamp({}) is None
+
+
+def test_severity_level():
+    """Test mapping severities to warning levels."""
+    assert severity_level("Minor") == 1
+    assert severity_level("EXTREME") == 4
+    assert severity_level("unknown") == 0
+    assert severity_level(None) == 0
+    assert severity_level([]) == 0
@@ -0,0 +1,218 @@
+"""Tests for dwdwfsapi limiter module."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from stub_geoserver import feature_collection
+
+from dwdwfsapi import core, metrics
+from dwdwfsapi.limiter import AdaptiveConcurrency, Limiter, TokenBucket
+
+
+@pytest.fixture(name="collected")
+def fixture_collected():
+    """Collect the metrics of a single test."""
+    collected = metrics.Metrics()
+    metrics.set_metrics(collected)
+    yield collected
+    metrics.set_metrics(metrics.Metrics())
+
+
+@pytest.fixture(name="limiter")
+def fixture_limiter():
+    """Activate a limiter for a single test."""
+    limiter = Limiter(rate=None, initial_concurrency=2, max_concurrency=4)
+    core.set_limiter(limiter)
+    yield limiter
+    core.set_limiter(None)
+
+
+def test_token_bucket():
+    """Test bursts and the sustained rate."""
+    bucket = TokenBucket(rate=10.0, burst=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_additive_increase():
+    """Test growing the limit with successful requests."""
+    concurrency = AdaptiveConcurrency(initial=2, maximum=3)
+    started = [concurrency.acquire(), concurrency.acquire()]
+
+    assert not concurrency.try_acquire()
+    for start in started:
+        assert not concurrency.release(start, False)
+    assert concurrency.limit == pytest.approx(2.9, abs=0.01)
+    for _ in range(10):
+        concurrency.release(concurrency.acquire(), False)
+    assert concurrency.limit == 3
+    assert concurrency.in_flight == 0
+
+
+def test_multiplicative_decrease():
+    """Test halving the limit once per round trip."""
+    concurrency = AdaptiveConcurrency(initial=8, minimum=2)
+    started = [concurrency.acquire() for _ in range(4)]
+
+    assert concurrency.release(started[0], True)
+    assert not concurrency.release(started[1], True)
+    assert concurrency.limit == 4
+    # Neutral outcomes neither increase nor decrease the limit
+    assert not concurrency.release(started[2], None)
+    assert concurrency.limit == 4
+    assert concurrency.release(concurrency.acquire(), True)
+    assert concurrency.release(concurrency.acquire(), True)
+    assert concurrency.limit == 2
+    # Slow requests decrease the limit as well
+    concurrency = AdaptiveConcurrency(initial=4, latency_target=0.0)
+    assert concurrency.release(concurrency.acquire() - 1.0, False)
+
+
+def test_blocking_acquire():
+    """Test waiting for a free slot in threads and coroutines."""
+    concurrency = AdaptiveConcurrency(initial=1)
+    started = concurrency.acquire()
+    timer = threading.Timer(0.1, concurrency.release, (started, None))
+    timer.start()
+
+    begin = time.monotonic()
+    second = concurrency.acquire()
+    assert time.monotonic() - begin >= 0.05
+    timer = threading.Timer(0.1, concurrency.release, (second, None))
+    timer.start()
+
+    async def acquire():
+        return await concurrency.acquire_async()
+
+    begin = time.monotonic()
+    asyncio.run(acquire())
+    assert time.monotonic() - begin >= 0.05
+    assert concurrency.in_flight == 1
+
+
+def test_query_limited(stub_server, limiter, collected):
+    """Test adapting the limit to the responses of the server."""
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    stub_server.status_codes = [429]
+
+    assert core.query_dwd(typeName="dwd:Test") is None
+    assert limiter.concurrency.limit == 1
+    assert core.query_dwd(typeName="dwd:Test") is not None
+    assert limiter.concurrency.limit == 2
+    assert limiter.concurrency.in_flight == 0
+    assert collected.counter("dwdwfsapi_limiter_decreases_total") == 1
+    assert collected.gauge("dwdwfsapi_limiter_concurrency_limit") == 2
+    assert collected.gauge("dwdwfsapi_limiter_in_flight") == 0
+    assert collected.histogram("dwdwfsapi_query_duration_seconds", phase="throttle")
+
+
+def test_rate_limit(stub_server, collected):
+    """Test delaying queries exceeding the rate."""
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    core.set_limiter(Limiter(rate=20.0, burst=1))
+    try:
+        begin = time.monotonic()
+        for _ in range(3):
+            assert core.query_dwd(typeName="dwd:Test") is not None
+        duration = time.monotonic() - begin
+    finally:
+        core.set_limiter(None)
+
+    assert duration >= 0.09
+    assert collected.counter("dwdwfsapi_limiter_throttled_total") == 2
+    assert collected.gauge("dwdwfsapi_limiter_tokens") is not None
+
+
+def test_concurrency_limited(stub_server, limiter):
+    """Test bounding the number of concurrent queries."""
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_layer(_):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return feature_collection([])
+
+    stub_server.layers["dwd:Test"] = slow_layer
+    threads = [
+        threading.Thread(
+            target=core.query_dwd,
+            kwargs={"typeName": "dwd:Test", "CQL_FILTER": f"ID='{i}'"},
+        )
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(stub_server.requests) == 6
+    assert max(peak) < 6
+    assert max(peak) <= limiter.concurrency.maximum
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_overload_retried(stub_server, limiter, collected):
+    """Test passing the limiter again when retrying overload responses."""
+    core.set_session(core.create_session(retries=2, backoff_factor=0))
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    stub_server.status_codes = [429, 503]
+
+    assert core.query_dwd(typeName="dwd:Test") is not None
+    assert len(stub_server.requests) == 3
+    assert limiter.concurrency.in_flight == 0
+    # Every retry is reported to the limiter as overload
+    assert collected.counter("dwdwfsapi_limiter_decreases_total") == 2
+    assert collected.counter("dwdwfsapi_queries_total", status="200") == 1
+    assert collected.histogram("dwdwfsapi_query_duration_seconds", phase="backoff")
+
+
+def test_retried_without_limiter(stub_server):
+    """Test retrying overload responses within the session."""
+    core.set_session(core.create_session(retries=2, backoff_factor=0))
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    stub_server.status_codes = [429]
+
+    assert core.query_dwd(typeName="dwd:Test") is not None
+    assert len(stub_server.requests) == 2
+
+
+def test_stream_limited(stub_server, limiter, collected):
+    """Test holding the limiter until a stream is finished."""
+    stub_server.layers["dwd:Test"] = feature_collection([{"ID": 1}, {"ID": 2}])
+
+    stream = core.iter_features(typeName="dwd:Test")
+    assert limiter.concurrency.in_flight == 1
+    assert [feature["ID"] for feature in stream] == [1, 2]
+    assert limiter.concurrency.in_flight == 0
+
+    stub_server.status_codes = [429]
+    assert core.iter_features(typeName="dwd:Test") is None
+    assert limiter.concurrency.in_flight == 0
+    assert collected.counter("dwdwfsapi_limiter_decreases_total") == 1
+
+
+def test_slow_stream_consumer(stub_server, collected):
+    """Test not counting the consumer of a stream as server latency."""
+    stub_server.layers["dwd:Test"] = feature_collection([{"ID": 1}, {"ID": 2}])
+    limiter = Limiter(rate=None, initial_concurrency=2, latency_target=0.05)
+    core.set_limiter(limiter)
+    try:
+        for _ in core.iter_features(typeName="dwd:Test"):
+            time.sleep(0.05)
+    finally:
+        core.set_limiter(None)
+
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.concurrency.limit > 2
+    assert collected.counter("dwdwfsapi_limiter_decreases_total") == 0
@@ -0,0 +1,114 @@
+"""Tests for dwdwfsapi locator module."""
+
+import pytest
+
+from dwdwfsapi import DwdWeatherWarningsAPI, WarncellLocator
+from dwdwfsapi.locator import set_default_locator
+
+
+def square(min_x, min_y, max_x, max_y):
+    """Return a closed ring of a rectangle."""
+    return [
+        [min_x, min_y],
+        [max_x, min_y],
+        [max_x, max_y],
+        [min_x, max_y],
+        [min_x, min_y],
+    ]
+
+
+BUNDLE = {
+    "version": 1,
+    "created": "2024-03-15T10:00:00+00:00",
+    "regions": {
+        "dwd:Warngebiete_Gemeinden": [
+            # Municipality with a hole
+            [808436003, "Gemeinde Aichstetten", [square(10, 47, 11, 48)]],
+            [809179142, "Gemeinde Olching", [square(11, 48, 12, 49)]],
+        ],
+        "dwd:Warngebiete_Kreise": [
+            [103359000, "Kreis Stade", [square(9, 46, 13, 50)]],
+        ],
+        "dwd:Warngebiete_Binnenseen": [
+            [209906000, "Wörthsee", [square(10.2, 47.2, 10.4, 47.4)]],
+        ],
+        "dwd:Warngebiete_Kueste": [],
+    },
+}
+BUNDLE["regions"]["dwd:Warngebiete_Gemeinden"][0][2].append(
+    square(10.2, 47.2, 10.4, 47.4)
+)
+
+testdata_locate = [
+    ((47.5, 10.5), 808436003),
+    ((48.5, 11.5), 809179142),
+    ((47.3, 10.3), 103359000),
+    ((46.5, 12.5), 103359000),
+    ((40.0, 10.0), None),
+]
+
+
+@pytest.mark.parametrize("location, ident", testdata_locate)
+def test_locate(location, ident):
+    """Test resolving a gps location."""
+    locator = WarncellLocator(BUNDLE)
+    result = locator.locate(*location)
+
+    assert (result[1] if result else None) == ident
+
+
+def test_locate_many():
+    """Test resolving many gps locations at once."""
+    locator = WarncellLocator(BUNDLE)
+    points = [location for location, _ in testdata_locate]
+
+    assert locator.locate_many(points) == [ident for _, ident in testdata_locate]
+
+
+def test_save_load(tmp_path, stub_server):
+    """Test storing and loading the geometry bundle."""
+    path = tmp_path / "warncells.json.gz"
+    WarncellLocator(BUNDLE).save(path)
+    # Outdated bundle is used if the download fails
+    locator = WarncellLocator.from_cache(path)
+
+    assert len(stub_server.requests) == 1
+
+    assert len(locator) == 4
+    assert locator.locate(47.5, 10.5)[1] == 808436003
+
+
+def test_download(stub_server):
+    """Test downloading the geometries."""
+    for region, cells in BUNDLE["regions"].items():
+        stub_server.layers[region] = {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Polygon", "coordinates": rings},
+                    "properties": {"WARNCELLID": ident, "NAME": name},
+                }
+                for ident, name, rings in cells
+            ],
+        }
+    locator = WarncellLocator.download()
+
+    assert len(locator) == 4
+    assert stub_server.requests[0]["srsName"] == "EPSG:4326"
+    assert locator.locate(48.5, 11.5)[1] == 809179142
+
+
+def test_api(stub_server):
+    """Test resolving a gps location for the weather warnings api."""
+    stub_server.layers["dwd:Warnungen_Gemeinden"] = []
+    set_default_locator(WarncellLocator(BUNDLE))
+    try:
+        dwd = DwdWeatherWarningsAPI((48.5, 11.5))
+    finally:
+        set_default_locator(None)
+
+    assert dwd.data_valid
+    assert dwd.warncell_id == 809179142
+    assert dwd.warncell_name == "Gemeinde Olching"
+    assert len(stub_server.requests) == 1
@@ -0,0 +1,217 @@
+"""Tests for dwdwfsapi metrics module."""
+
+import socket
+
+import pytest
+from stub_geoserver import feature_collection
+
+from dwdwfsapi import DwdPollenFlightAPI, core, metrics
+from dwdwfsapi.cache import MemoryCache
+
+
+@pytest.fixture(name="collected")
+def fixture_collected():
+    """Collect the metrics of a single test."""
+    collected = metrics.Metrics()
+    metrics.set_metrics(collected)
+    yield collected
+    metrics.set_metrics(metrics.Metrics())
+
+
+class StubSpan:
+    """Span recording its attributes."""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.exceptions = []
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        """Set an attribute."""
+        self.attributes[key] = value
+
+    def record_exception(self, err):
+        """Record an exception."""
+        self.exceptions.append(err)
+
+    def end(self):
+        """End the span."""
+        self.ended = True
+
+
+class StubTracer:  # pylint: disable=too-few-public-methods
+    """Tracer collecting all started spans."""
+
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        """Start a span."""
+        self.spans.append(StubSpan(name, attributes or {}))
+        return self.spans[-1]
+
+
+def test_histogram():
+    """Test the bucket counts of a histogram."""
+    histogram = metrics.Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.cumulative_counts() == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(5.65)
+
+
+def test_prometheus_export():
+    """Test the Prometheus text format."""
+    collected = metrics.Metrics(buckets=(0.1,))
+    labels = (("typename", 'dwd:"Test"'),)
+    collected.increment("dwdwfsapi_received_bytes_total", labels, 100)
+    collected.observe("dwdwfsapi_parse_duration_seconds", labels, 0.5)
+
+    assert collected.to_prometheus().splitlines() == [
+        "# HELP dwdwfsapi_parse_duration_seconds Duration of parsing the retrieved "
+        "data in seconds.",
+        "# TYPE dwdwfsapi_parse_duration_seconds histogram",
+        'dwdwfsapi_parse_duration_seconds_bucket{typename="dwd:\\"Test\\"",le="0.1"} 0',
+        'dwdwfsapi_parse_duration_seconds_bucket{typename="dwd:\\"Test\\"",le="+Inf"} 1',
+        'dwdwfsapi_parse_duration_seconds_sum{typename="dwd:\\"Test\\""} 0.5',
+        'dwdwfsapi_parse_duration_seconds_count{typename="dwd:\\"Test\\""} 1',
+        "# HELP dwdwfsapi_received_bytes_total Bytes received from the geoserver.",
+        "# TYPE dwdwfsapi_received_bytes_total counter",
+        'dwdwfsapi_received_bytes_total{typename="dwd:\\"Test\\""} 100',
+    ]
+    assert metrics.Metrics().to_prometheus() == ""
+
+
+def test_query_metrics(stub_server, collected):
+    """Test the metrics of successful and failed queries."""
+    stub_server.layers["dwd:Test"] = feature_collection([{"ID": 1}])
+    assert core.query_dwd(typeName="dwd:Test") is not None
+    assert core.query_dwd(typeName="dwd:Unknown") is None
+
+    assert collected.counter("dwdwfsapi_queries_total", status="200") == 1
+    assert collected.counter("dwdwfsapi_queries_total", status="400") == 1
+    assert collected.counter("dwdwfsapi_query_errors_total", error="http") == 1
+    assert collected.counter("dwdwfsapi_received_bytes_total", typename="dwd:Test")
+    for phase in ("response", "download", "decode", "total"):
+        histogram = collected.histogram(
+            "dwdwfsapi_query_duration_seconds", typename="dwd:Test", phase=phase
+        )
+        assert histogram.count == 1
+    # Reading the body separately must not prevent reusing the connection
+    assert len(stub_server.connections) == 1
+    assert collected.counter("dwdwfsapi_connections_total", reused="false") == 1
+    assert collected.counter("dwdwfsapi_connections_total", reused="true") == 1
+
+
+def test_cache_lookups(stub_server, collected):
+    """Test counting response cache lookups."""
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    core.set_cache(MemoryCache())
+    try:
+        core.query_dwd(typeName="dwd:Test")
+        core.query_dwd(typeName="dwd:Test")
+    finally:
+        core.set_cache(None)
+
+    assert collected.counter("dwdwfsapi_cache_lookups_total", result="hit") == 1
+    assert collected.counter("dwdwfsapi_cache_lookups_total", result="miss") == 1
+    assert collected.counter("dwdwfsapi_queries_total") == 1
+
+
+def test_stream_metrics(stub_server, collected):
+    """Test the metrics of streamed queries."""
+    stub_server.layers["dwd:Test"] = feature_collection([{"ID": 1}, {"ID": 2}])
+    assert len(list(core.iter_features(typeName="dwd:Test"))) == 2
+
+    assert collected.counter("dwdwfsapi_queries_total", status="200") == 1
+    assert collected.counter("dwdwfsapi_received_bytes_total") > 0
+    assert collected.counter("dwdwfsapi_connections_total") == 1
+    assert collected.histogram("dwdwfsapi_query_duration_seconds", phase="stream")
+
+
+def test_parse_metrics(stub_server, collected):
+    """Test measuring the parse duration of the API classes."""
+    stub_server.layers["dwd:Pollenfluggebiete"] = [{"GF": 62, "GEN": "Harz"}]
+    stub_server.layers["dwd:Pollenflug"] = feature_collection([])
+    dwd = DwdPollenFlightAPI(62)
+
+    assert dwd.data_valid
+    histogram = collected.histogram(
+        "dwdwfsapi_parse_duration_seconds", typename="dwd:Pollenflug"
+    )
+    assert histogram.count == 1
+
+
+def test_listener_and_tracer(stub_server, collected):
+    """Test the instrumentation hooks."""
+    stub_server.layers["dwd:Test"] = feature_collection([])
+    events = []
+    tracer = StubTracer()
+    metrics.add_listener(lambda event, attributes: events.append((event, attributes)))
+    metrics.add_listener(lambda event, attributes: 1 / 0)
+    metrics.set_tracer(tracer)
+    try:
+        assert core.query_dwd(typeName="dwd:Test") is not None
+    finally:
+        metrics.set_tracer(None)
+        metrics._LISTENERS.clear()  # pylint: disable=protected-access
+
+    assert collected.counter("dwdwfsapi_queries_total") == 1
+    assert [e for e, _ in events] == ["query"]
+    assert events[0][1]["status"] == 200
+    assert events[0][1]["bytes"] > 0
+    assert events[0][1]["durations"]["total"] >= events[0][1]["durations"]["decode"]
+    assert [s.name for s in tracer.spans] == ["dwdwfsapi.query"]
+    span = tracer.spans[0]
+    assert span.ended
+    assert span.attributes["dwd.typename"] == "dwd:Test"
+    assert span.attributes["http.response.status_code"] == 200
+
+
+def test_connection_error(collected):
+    """Test classifying a failed connection."""
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    core.set_base_url(f"http://127.0.0.1:{port}/ows")
+    core.set_session(core.create_session(retries=0))
+    try:
+        assert core.query_dwd(typeName="dwd:Test") is None
+    finally:
+        core.set_session(None)
+        core.set_base_url(None)
+
+    assert collected.counter("dwdwfsapi_queries_total", status="none") == 1
+    assert collected.counter("dwdwfsapi_query_errors_total", error="connect") == 1
+
+
+def test_subphase():
+    """Test splitting a measured part off the running phase."""
+    probe = metrics.QueryProbe("dwd:Test")
+    probe.subphase("dns", 10.0)
+    probe.phase("response")
+
+    assert probe.durations["dns"] == 10.0
+    assert probe.durations["response"] == 0.0
+
+
+def test_error_kind():
+    """Test classifying exceptions by their chain of causes."""
+
+    class WrapperError(Exception):
+        """Exception wrapping the original cause."""
+
+    def chained(cause):
+        wrapper = WrapperError()
+        wrapper.__cause__ = cause
+        return wrapper
+
+    assert metrics.error_kind(chained(socket.gaierror())) == "dns"
+    assert metrics.error_kind(chained(TimeoutError())) == "timeout"
+    assert metrics.error_kind(chained(ValueError())) == "decode"
+    assert metrics.error_kind(chained(ConnectionRefusedError())) == "connect"
+    assert metrics.error_kind(chained(KeyError())) == "other"
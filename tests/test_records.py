@@ -0,0 +1,58 @@
+"""Tests for dwdwfsapi records module."""
+
+import pickle
+
+import pytest
+
+from dwdwfsapi import ForecastEntry, WeatherWarning
+from dwdwfsapi.pollenflight import convert_forecast_data
+from dwdwfsapi.weatherwarnings import convert_warning_data
+
+WARNING = {
+    "EC_II": "51",
+    "EVENT": "WINDBÖEN",
+    "URGENCY": "Future",
+    "SEVERITY": "Moderate",
+    "ONSET": "2024-03-16T10:00:00Z",
+    "PARAMETERNAME": "Böen;Windrichtung",
+    "PARAMETERVALUE": "~55 [km/h];West",
+    "EC_AREA_COLOR": "255 153 0",
+}
+
+FORECAST = {
+    "FORECAST_DATE": "2024-03-16T00:00:00Z",
+    "POLLENINT": 2,
+    "PARAMETER_VALUE": "geringe Belastung",
+    "EC_AREA_COLOR": "255 255 0",
+}
+
+
+def test_warning_record():
+    """Test that a warning record matches the warning dictionary."""
+    data = convert_warning_data(WARNING)
+    record = convert_warning_data(WARNING, records=True)
+
+    assert isinstance(record, WeatherWarning)
+    assert record == data
+    assert record.to_dict() == data
+    assert list(record) == list(data)
+    assert dict(record.items()) == data
+    assert record.parameters == {"Böen": "~55 [km/h]", "Windrichtung": "West"}
+    assert record.get("unknown", 1) == 1
+    assert "level" in record
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(KeyError):
+        record["unknown"]  # pylint: disable=pointless-statement
+
+
+def test_forecast_record():
+    """Test that a forecast record matches the forecast dictionary."""
+    data = convert_forecast_data(FORECAST)
+    record = convert_forecast_data(FORECAST, records=True)
+
+    assert isinstance(record, ForecastEntry)
+    assert record == data
+    assert record == ForecastEntry(**data)
+    assert len({record, ForecastEntry(**data)}) == 1
+    assert pickle.loads(pickle.dumps(record)) == record
+    assert convert_forecast_data({}, records=True) is None
@@ -0,0 +1,144 @@
+"""Tests for dwdwfsapi refresher module."""
+
+import threading
+import time
+from datetime import UTC, datetime
+
+import pytest
+from stub_geoserver import feature_collection
+
+from dwdwfsapi import DwdPollenFlightAPI, DwdWeatherWarningsAPI
+from dwdwfsapi.refresher import (
+    RETRY_DELAY,
+    DailySchedule,
+    IntervalSchedule,
+    Refresher,
+    default_schedule,
+    update_all,
+)
+
+WARNING = {
+    "WARNCELLID": 808436003,
+    "EC_II": "22",
+    "EVENT": "FROST",
+    "URGENCY": "Immediate",
+    "SEVERITY": "Minor",
+}
+
+
+class FailingAPI:
+    """API instance whose updates always fail."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        """Init failing API."""
+        self.data_valid = False
+        self.updates = 0
+
+    def update(self):
+        """Count the failed update."""
+        self.updates += 1
+
+
+def timestamp(*args):
+    """Return the UTC timestamp of a date and time."""
+    return datetime(*args, tzinfo=UTC).timestamp()
+
+
+def test_daily_schedule():
+    """Test the next refresh of a daily schedule."""
+    schedule = DailySchedule(("17:30", "11:00"), tz=UTC, delay=600)
+
+    assert schedule.next_run(timestamp(2024, 3, 16, 9)) == timestamp(
+        2024, 3, 16, 11, 10
+    )
+    assert schedule.next_run(timestamp(2024, 3, 16, 12)) == timestamp(
+        2024, 3, 16, 17, 40
+    )
+    assert schedule.next_run(timestamp(2024, 3, 16, 18)) == timestamp(
+        2024, 3, 17, 11, 10
+    )
+
+
+def test_interval_schedule():
+    """Test the jitter of an interval schedule."""
+    schedule = IntervalSchedule(300, jitter=30)
+    runs = [schedule.next_run(1000) for _ in range(100)]
+
+    assert all(1300 <= run <= 1330 for run in runs)
+    assert len(set(runs)) > 1
+
+
+def test_default_schedule():
+    """Test that the schedule depends on the product."""
+    assert isinstance(default_schedule(DwdWeatherWarningsAPI(None)), IntervalSchedule)
+    assert isinstance(default_schedule(DwdPollenFlightAPI(None)), DailySchedule)
+    with pytest.raises(TypeError):
+        default_schedule(FailingAPI())
+
+
+def test_backoff():
+    """Test that failed refreshes are retried with increasing delays."""
+    refresher = Refresher()
+    instance = FailingAPI()
+    job = refresher.register(instance, IntervalSchedule(0), immediately=True)
+
+    delays = []
+    for _ in range(3):
+        for future in refresher.refresh_due(job.next_run):
+            assert not future.result()
+        delays.append(job.next_run - time.time())
+    refresher.stop()
+
+    assert instance.updates == 3
+    assert job.failures == 3
+    assert RETRY_DELAY - 1 < delays[0] < 2 * RETRY_DELAY - 1
+    assert 2 * RETRY_DELAY - 1 < delays[1] < 4 * RETRY_DELAY - 1
+    assert 4 * RETRY_DELAY - 1 < delays[2] < 8 * RETRY_DELAY - 1
+
+
+def test_refresh_callback(stub_server):
+    """Test background refreshes and change callbacks."""
+    warnings = []
+    stub_server.layers = {
+        "dwd:Warnungen_Gemeinden": lambda params: feature_collection(
+            warnings, timestamp=datetime.now(UTC).isoformat()
+        )
+    }
+    dwd = DwdWeatherWarningsAPI(808436003)
+    assert dwd.data_valid
+    assert len(dwd) == 0
+
+    changed = threading.Event()
+    with Refresher() as refresher:
+        refresher.register(
+            dwd, IntervalSchedule(0.01), callback=lambda _: changed.set()
+        )
+        warnings.append(WARNING)
+        assert changed.wait(5)
+
+    assert len(dwd) == 1
+    assert dwd.current_warnings[0]["event"] == "FROST"
+    assert len(stub_server.requests) >= 2
+
+
+def test_update_all(stub_server):
+    """Test updating many instances concurrently."""
+    stub_server.layers = {"dwd:Warnungen_Gemeinden": [WARNING]}
+    dwds = [DwdWeatherWarningsAPI(808436003) for _ in range(8)]
+    for dwd in dwds:
+        dwd.data_valid = False
+    failing = FailingAPI()
+    stub_server.requests.clear()
+
+    results = update_all([*dwds, failing], max_workers=4)
+
+    # Concurrent updates of the same warncell share their requests
+    assert 1 <= len(stub_server.requests) <= 8
+    assert [result.instance for result in results] == [*dwds, failing]
+    assert all(results[:-1])
+    assert not results[-1]
+    assert all(result.duration >= 0 for result in results)
+    assert all(len(dwd) == 1 for dwd in dwds)
+    assert not update_all([])
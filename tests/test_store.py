@@ -0,0 +1,187 @@
+"""Tests for dwdwfsapi store module."""
+
+from datetime import UTC, datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from stub_geoserver import feature_collection
+
+from dwdwfsapi import (
+    DwdPollenFlightAPI,
+    DwdWeatherWarningsAPI,
+    PollenFlightSnapshot,
+    SnapshotStore,
+    WarningsSnapshot,
+)
+from dwdwfsapi.store import HEADER, MAGIC
+
+WARNING = {
+    "WARNCELLID": 808436003,
+    "EC_II": "22",
+    "EVENT": "FROST",
+    "URGENCY": "Immediate",
+    "SEVERITY": "Minor",
+    "ONSET": "2024-03-15T23:00:00Z",
+}
+
+FORECAST = {
+    "GF": 62,
+    "EC_II": 1,
+    "PARAMETER_NAME": "Hasel",
+    "PARAMETER_VALUE": "gering",
+    "FORECAST_DATE": "2024-03-15T00:00:00Z",
+    "POLLENINT": 1,
+    "EC_AREA_COLOR": "254 227 145",
+}
+
+
+def serve_layers(stub_server, timestamp=None):
+    """Serve a warncell, a pollen region and their data."""
+    timestamp = timestamp or datetime.now(UTC).isoformat()
+    stub_server.layers = {
+        "dwd:Pollenfluggebiete": [{"GF": 62, "GEN": "Harz"}],
+        "dwd:Pollenflug": lambda params: feature_collection([FORECAST], timestamp),
+        "dwd:Warnungen_Gemeinden": lambda params: feature_collection(
+            [WARNING], timestamp
+        ),
+    }
+
+
+def test_warm_start(stub_server, tmp_path):
+    """Test restoring instances without querying the server."""
+    serve_layers(stub_server)
+    dwds = [
+        DwdWeatherWarningsAPI(808436003, records=True),
+        DwdPollenFlightAPI(62),
+        PollenFlightSnapshot(),
+    ]
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+
+    assert store.save(dwds) == 3
+    assert len(store) == 3
+    stub_server.requests.clear()
+    restored = store.load()
+
+    assert not stub_server.requests
+    assert [type(dwd) for dwd in restored] == [type(dwd) for dwd in dwds]
+    assert restored[0].data_valid
+    assert restored[0].warncell_name == dwds[0].warncell_name
+    assert restored[0].current_warnings == dwds[0].current_warnings
+    assert restored[0].last_update == dwds[0].last_update
+    assert restored[1].forecast_data == dwds[1].forecast_data
+    assert restored[2].for_region(62) == dwds[2].for_region(62)
+
+    # The restored instances can be refreshed as usual
+    restored[0].update()
+    assert restored[0].data_valid
+    assert len(stub_server.requests) == 1
+
+
+def test_get(stub_server, tmp_path):
+    """Test restoring a single instance."""
+    serve_layers(stub_server)
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+    store.save([DwdPollenFlightAPI(62), PollenFlightSnapshot()])
+
+    assert store.get(DwdPollenFlightAPI, 62).cell_name == "Harz"
+    assert store.get(DwdPollenFlightAPI, 11) is None
+    assert store.get(PollenFlightSnapshot).data_valid
+    assert store.get(DwdWeatherWarningsAPI, 808436003) is None
+
+
+def test_max_age(stub_server, tmp_path):
+    """Test skipping outdated instances."""
+    serve_layers(stub_server, (datetime.now(UTC) - timedelta(hours=2)).isoformat())
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+    store.save([DwdPollenFlightAPI(62)])
+
+    assert len(store.load(max_age=10800)) == 1
+    assert not store.load(max_age=3600)
+    assert store.get(DwdPollenFlightAPI, 62, max_age=3600) is None
+
+
+def test_unresolved(stub_server, tmp_path):
+    """Test skipping instances without resolved cell."""
+    serve_layers(stub_server)
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+
+    assert store.save([DwdPollenFlightAPI("Hintertupfing")]) == 0
+    assert not store.load()
+
+
+def test_invalid_file(tmp_path):
+    """Test reading missing, empty and corrupt files."""
+    path = tmp_path / "snapshot.bin"
+    store = SnapshotStore(path)
+    assert not store.load()
+
+    path.write_bytes(b"")
+    assert not store.load()
+
+    path.write_bytes(HEADER.pack(MAGIC, HEADER.size, 100))
+    assert not store.load()
+    assert len(store) == 0
+
+
+def test_unsupported(stub_server, tmp_path):
+    """Test rejecting instances which can't be stored."""
+    serve_layers(stub_server)
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+
+    with pytest.raises(TypeError):
+        store.save([DwdPollenFlightAPI(62), object()])
+    columnar = pytest.importorskip("dwdwfsapi.columnar")
+    with pytest.raises(TypeError):
+        store.save([columnar.WarningsTable.__new__(columnar.WarningsTable)])
+    assert not store.load()
+
+
+def test_records(stub_server, tmp_path):
+    """Test restoring warnings stored as records."""
+    serve_layers(stub_server)
+    dwd = WarningsSnapshot(records=True)
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+    store.save([dwd])
+    restored = store.get(WarningsSnapshot)
+
+    assert restored.warnings == dwd.warnings
+    assert restored.warning_index == dwd.warning_index
+    assert restored.layers == dwd.layers
+
+
+def test_version(stub_server, tmp_path):
+    """Test skipping entries of another version."""
+    serve_layers(stub_server)
+    dwd = DwdPollenFlightAPI(62)
+    state = dwd.to_snapshot()
+    state["version"] += 1
+
+    with pytest.raises(ValueError):
+        DwdPollenFlightAPI.from_snapshot(state)
+
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+    store.save([dwd])
+    with patch.object(DwdPollenFlightAPI, "SNAPSHOT_VERSION", state["version"]):
+        assert store.get(DwdPollenFlightAPI, 62) is None
+    assert store.get(DwdPollenFlightAPI, 62).forecast_data == dwd.forecast_data
+
+
+def test_snapshot_layers(stub_server, tmp_path):
+    """Test storing snapshots of different layers side by side."""
+    serve_layers(stub_server)
+    stub_server.layers["dwd:Warnungen_Landkreise"] = []
+    dwds = [
+        WarningsSnapshot(layers=("dwd:Warnungen_Gemeinden",)),
+        WarningsSnapshot(layers=("dwd:Warnungen_Landkreise",)),
+    ]
+    store = SnapshotStore(tmp_path / "snapshot.bin")
+
+    assert store.save(dwds) == 2
+    assert len(store) == 2
+    restored = store.get(WarningsSnapshot, layers=("dwd:Warnungen_Landkreise",))
+    assert restored.layers == ("dwd:Warnungen_Landkreise",)
+    assert not restored.warnings
+    restored = store.get(WarningsSnapshot, layers=("dwd:Warnungen_Gemeinden",))
+    assert restored.for_cell(808436003) == dwds[0].for_cell(808436003)
+    assert store.get(WarningsSnapshot) is not None
+    assert store.get(WarningsSnapshot, layers=("dwd:Warnungen_Kueste",)) is None
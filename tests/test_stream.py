@@ -0,0 +1,72 @@
+"""Tests for dwdwfsapi stream module."""
+
+import json
+
+import pytest
+from stub_geoserver import feature_collection
+
+from dwdwfsapi import core
+from dwdwfsapi.stream import FeatureStream
+
+FEATURES = [
+    {"WARNCELLID": 100000000 + i, "NAME": f"Gemeinde {i} äöü", "VALUE": i * 1.5}
+    for i in range(50)
+]
+
+
+def chunked(data, size):
+    """Split data into chunks of the given size."""
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 100000])
+def test_chunks(size):
+    """Test parsing with arbitrary chunk boundaries."""
+    data = json.dumps(feature_collection(FEATURES), indent=2).encode("utf-8")
+    stream = FeatureStream(chunked(data, size))
+
+    assert list(stream) == FEATURES
+    assert stream.valid
+    assert stream.members["numberReturned"] == 50
+    assert stream.members["timeStamp"] == "2024-03-15T10:00:00.000Z"
+
+
+def test_split_at_every_offset():
+    """Test splitting the data into two chunks at every byte offset."""
+    features = [{"A": 12.5, "B": -3e-07, "C": 1e21, "D": 7, "E": True, "F": None}]
+    # Members are decoded one by one, so numbers may end at a chunk boundary
+    collection = {**feature_collection(features), "numberMatched": 1, "scale": -1.5e-3}
+    data = json.dumps(collection).encode("utf-8")
+
+    for offset in range(1, len(data)):
+        stream = FeatureStream([data[:offset], data[offset:]])
+        assert list(stream) == features, offset
+        assert stream.valid, offset
+        assert stream.members["scale"] == -1.5e-3, offset
+
+
+def test_empty():
+    """Test parsing an empty feature collection."""
+    stream = FeatureStream([b'{"type":"FeatureCollection","features":[]}'])
+
+    assert not list(stream)
+    assert stream.valid
+
+
+def test_truncated():
+    """Test parsing truncated data."""
+    data = json.dumps(feature_collection(FEATURES)).encode("utf-8")
+    stream = FeatureStream(chunked(data[: len(data) // 2], 100))
+
+    assert len(list(stream)) < len(FEATURES)
+    assert not stream.valid
+
+
+def test_iter_features(stub_server):
+    """Test streaming the features of a query."""
+    stub_server.layers["dwd:Test"] = FEATURES
+    stream = core.iter_features(typeName="dwd:Test")
+
+    assert list(stream) == FEATURES
+    assert stream.valid
+    assert core.iter_features(typeName="dwd:Unknown") is None
@@ -3,8 +3,15 @@
 from datetime import UTC, datetime, timedelta
 
 import pytest
+from stub_geoserver import feature_collection
 
-from dwdwfsapi import DwdWeatherWarningsAPI
+from dwdwfsapi import DwdWeatherWarningsAPI, WarningsSnapshot, WeatherWarning
+from dwdwfsapi.helpers import WEATHER_SEVERITY_MAPPING
+from dwdwfsapi.weatherwarnings import (
+    WARNING_DEFAULTS,
+    build_cql_in_filters,
+    convert_warning_data,
+)
 
 MIN_WARNING_LEVEL = 0  # 0 = no warning
 MAX_WARNING_LEVEL = 4  # 4 = extreme weather
@@ -96,3 +103,320 @@ def test_wrong_input(ident_name_gps):
     assert dwd.expected_warning_level is None
     assert dwd.current_warnings is None
     assert dwd.expected_warnings is None
+
+
+WARNING_FEATURES = [
+    {
+        "WARNCELLID": 808436003,
+        "EC_II": "22",
+        "EVENT": "FROST",
+        "URGENCY": "Immediate",
+        "SEVERITY": "Minor",
+        "ONSET": "2024-03-15T23:00:00Z",
+        "EXPIRES": "2024-03-16T05:00:00Z",
+        "EC_AREA_COLOR": "255 255 0",
+    },
+    {
+        "WARNCELLID": 809179142,
+        "EC_II": "51",
+        "EVENT": "WINDBÖEN",
+        "URGENCY": "Future",
+        "SEVERITY": "Moderate",
+        "ONSET": "2024-03-16T10:00:00Z",
+        "EXPIRES": "2024-03-16T18:00:00Z",
+        "EC_AREA_COLOR": "255 153 0",
+    },
+    {
+        "GC_WARNCELLID": 103359000,
+        "EC_II": "22",
+        "EVENT": "FROST",
+        "URGENCY": "Immediate",
+        "SEVERITY": "Minor",
+        "EC_AREA_COLOR": "255 255 0",
+    },
+]
+
+
+@pytest.fixture(name="warnings_server")
+def fixture_warnings_server(stub_server):
+    """Serve a few warncells and warnings from the stub server."""
+    stub_server.layers = {
+        "dwd:Warngebiete_Gemeinden": [
+            {"WARNCELLID": 808436003, "NAME": "Gemeinde Aichstetten"},
+            {"WARNCELLID": 809179142, "NAME": "Gemeinde Olching"},
+            {"WARNCELLID": 809184149, "NAME": "Gemeinde Unterhaching"},
+        ],
+        "dwd:Warngebiete_Kreise": [
+            {"WARNCELLID": 103359000, "NAME": "Kreis Stade"},
+        ],
+        "dwd:Warngebiete_Binnenseen": [],
+        "dwd:Warngebiete_Kueste": [],
+        "dwd:Warnungen_Gemeinden": [w for w in WARNING_FEATURES if "WARNCELLID" in w],
+        "dwd:Warnungen_Landkreise": [
+            w for w in WARNING_FEATURES if "GC_WARNCELLID" in w
+        ],
+    }
+    return stub_server
+
+
+def test_update_many(warnings_server):
+    """Test updating several warncells with one query per layer."""
+    idents = [808436003, 809179142, 809184149, 103359000]
+    dwds = [DwdWeatherWarningsAPI(ident) for ident in idents]
+    for dwd in dwds:
+        dwd.data_valid = False
+    warnings_server.requests.clear()
+
+    DwdWeatherWarningsAPI.update_many(dwds)
+
+    assert len(warnings_server.requests) == 2
+    assert all(dwd.data_valid for dwd in dwds)
+    assert [len(dwd) for dwd in dwds] == [1, 1, 0, 1]
+    assert dwds[0].current_warning_level == 1
+    assert dwds[1].expected_warning_level == 2
+    assert dwds[1].expected_warnings[0]["color"] == "#ff9900"
+    assert dwds[3].current_warnings[0]["event"] == "FROST"
+
+
+def test_build_cql_in_filters():
+    """Test splitting long lists of warncells into several filters."""
+    idents = [str(100000000 + i) for i in range(1000)]
+    filters = list(build_cql_in_filters("WARNCELLID", idents, max_length=1200))
+
+    assert len(filters) > 1
+    assert all(len(cql_filter) < 1250 for cql_filter, _ in filters)
+    assert [i for _, ids in filters for i in ids] == idents
+
+
+def test_snapshot(warnings_server):
+    """Test downloading and indexing all warnings at once."""
+    snapshot = WarningsSnapshot()
+
+    assert snapshot.data_valid
+    assert len(warnings_server.requests) == 2
+    assert len(snapshot) == 3
+    assert snapshot.for_cell(808436003)[0]["event"] == "FROST"
+    assert snapshot.for_cell("809179142")[0]["urgency"] == "future"
+    assert snapshot.for_cell(103359000)[0]["level"] == 1
+    assert snapshot.for_cell(809184149) == []
+    assert 808436003 in snapshot
+    assert 809184149 not in snapshot
+    assert len(warnings_server.requests) == 2
+
+
+@pytest.mark.parametrize("ident, name", testdata_ident)
+def test_offline_id(ident, name, stub_server):
+    """Test resolving a warncell id from the bundled warncell list."""
+    dwd = DwdWeatherWarningsAPI(ident)
+
+    assert dwd.warncell_id == ident
+    assert dwd.warncell_name == name
+    assert all(
+        not r["typeName"].startswith("dwd:Warngebiete") for r in stub_server.requests
+    )
+
+
+@pytest.mark.parametrize("name, ident", testdata_name)
+def test_offline_name(name, ident, stub_server):
+    """Test resolving a warncell name from the bundled warncell list."""
+    dwd = DwdWeatherWarningsAPI(name)
+
+    assert dwd.warncell_id == ident
+    assert dwd.warncell_name == name
+    assert all(
+        not r["typeName"].startswith("dwd:Warngebiete") for r in stub_server.requests
+    )
+
+
+def test_not_modified(warnings_server):
+    """Test that unchanged data is neither downloaded nor parsed again."""
+    warnings_server.headers["ETag"] = '"v1"'
+    dwd = DwdWeatherWarningsAPI(808436003)
+    warnings = dwd.current_warnings
+    dwd.update()
+
+    assert dwd.data_valid
+    assert dwd.current_warnings is warnings
+    assert warnings_server.request_headers[-1]["If-None-Match"] == '"v1"'
+
+    # Unchanged timestamp without validators
+    warnings_server.headers.clear()
+    dwd.update()
+    dwd.update()
+
+    assert dwd.current_warnings is warnings
+
+
+def test_not_modified_after_failure(warnings_server):
+    """Test recovering from a failed batch update despite unchanged data."""
+    warnings_server.headers["ETag"] = '"v1"'
+    dwd = DwdWeatherWarningsAPI(808436003)
+    warnings_server.status_codes = [500]
+    DwdWeatherWarningsAPI.update_many([dwd])
+
+    assert not dwd.data_valid
+    dwd.update()
+
+    assert dwd.data_valid
+    assert dwd.current_warning_level == 1
+    assert "If-None-Match" not in warnings_server.request_headers[-1]
+
+
+def test_update_many_timestamp(warnings_server):
+    """Test skipping unchanged data after a batch update."""
+    features = [w for w in WARNING_FEATURES if w.get("WARNCELLID") == 808436003]
+    timestamps = ["2024-03-15T10:00:00Z"]
+    warnings_server.layers["dwd:Warnungen_Gemeinden"] = (
+        lambda params: feature_collection(features, timestamps[0])
+    )
+    dwd = DwdWeatherWarningsAPI(808436003)
+    timestamps[0] = "2024-03-15T11:00:00Z"
+    DwdWeatherWarningsAPI.update_many([dwd])
+    warnings = dwd.current_warnings
+    dwd.update()
+
+    assert dwd.data_valid
+    assert dwd.current_warnings is warnings
+
+
+def test_snapshot_records(warnings_server):
+    """Test storing the warnings as compact records."""
+    snapshot = WarningsSnapshot(records=True)
+    assert len(warnings_server.requests) == 2
+    warning = snapshot.for_cell(808436003)[0]
+
+    assert isinstance(warning, WeatherWarning)
+    assert warning.event == "FROST"
+    assert warning["color"] == "#ffff00"
+    assert warning == convert_warning_data(WARNING_FEATURES[0])
+
+
+def reference_convert_warning_data(data_in):
+    """Straightforward conversion the optimized converter must match."""
+    # pylint: disable=too-many-branches
+    data_in = {k.lower(): v for k, v in data_in.items()}
+    data_out = dict(WARNING_DEFAULTS)
+    if "onset" in data_in:
+        try:
+            data_out["start_time"] = datetime.fromisoformat(data_in["onset"])
+        except:  # pylint: disable=bare-except
+            data_out["start_time"] = None
+    if "expires" in data_in:
+        try:
+            data_out["end_time"] = datetime.fromisoformat(data_in["expires"])
+        except:  # pylint: disable=bare-except
+            data_out["end_time"] = None
+    for key in ("event", "headline", "description", "instruction"):
+        if key in data_in:
+            data_out[key] = data_in[key]
+    if "ec_ii" in data_in:
+        try:
+            data_out["event_code"] = int(data_in["ec_ii"])
+        except:  # pylint: disable=bare-except
+            data_out["event_code"] = 0
+    if "urgency" in data_in:
+        future = data_in["urgency"].lower() == "future"
+        data_out["urgency"] = "future" if future else "immediate"
+    if "severity" in data_in:
+        try:
+            if data_in["severity"].lower() in WEATHER_SEVERITY_MAPPING:
+                data_out["level"] = WEATHER_SEVERITY_MAPPING[
+                    data_in["severity"].lower()
+                ]
+        except:  # pylint: disable=bare-except
+            data_out["level"] = 0
+    if "parametername" in data_in and "parametervalue" in data_in:
+        try:
+            sep = "," if "," in data_in["parametername"] else ";"
+            data_out["parameters"] = dict(
+                zip(
+                    data_in["parametername"].split(sep),
+                    data_in["parametervalue"].split(sep),
+                )
+            )
+        except:  # pylint: disable=bare-except
+            data_out["parameters"] = None
+    if "ec_area_color" in data_in:
+        try:
+            colors = data_in["ec_area_color"].split(" ")
+            data_out["color"] = f"#{int(colors[0]):02x}{int(colors[1]):02x}"
+            data_out["color"] += f"{int(colors[2]):02x}"
+        except:  # pylint: disable=bare-except
+            data_out["color"] = "#000000"
+    return data_out
+
+
+testdata_convert = [
+    WARNING_FEATURES[0],
+    WARNING_FEATURES[1],
+    {k.lower(): v for k, v in WARNING_FEATURES[1].items()},
+    {
+        "SEVERITY": "Extreme",
+        "PARAMETERNAME": "Böen,Windrichtung",
+        "PARAMETERVALUE": "~120 [km/h],West",
+        "HEADLINE": "Amtliche UNWETTERWARNUNG vor ORKANBÖEN",
+    },
+    {"PARAMETERNAME": "Niederschlag", "PARAMETERVALUE": "10 [l/m²]"},
+    {"ONSET": "invalid", "EXPIRES": None, "EC_II": "x", "EC_AREA_COLOR": "1 2"},
+    {"onset": ["unhashable"], "SEVERITY": None, "EC_AREA_COLOR": ["x"]},
+    {"PARAMETERNAME": None, "PARAMETERVALUE": "1", "SEVERITY": "unknown"},
+    {"EVENT": "FROST", "event": "GLÄTTE", "URGENCY": "FUTURE"},
+    {},
+]
+
+
+@pytest.mark.parametrize("properties", testdata_convert)
+def test_convert_warning_data(properties):
+    """Test that the optimized converter produces the reference output."""
+    expected = reference_convert_warning_data(properties)
+
+    # Convert twice to cover the memoized values as well
+    assert convert_warning_data(properties) == expected
+    assert convert_warning_data(properties) == expected
+
+
+def test_deltas(stub_server):
+    """Test the added, removed and changed warnings between updates."""
+    features = [dict(WARNING_FEATURES[0])]
+    stub_server.layers = {
+        "dwd:Warnungen_Gemeinden": lambda params: feature_collection(
+            features, timestamp=datetime.now(UTC).isoformat()
+        )
+    }
+    frost = (22, datetime(2024, 3, 15, 23, tzinfo=UTC), 808436003)
+    wind = (51, datetime(2024, 3, 16, 10, tzinfo=UTC), 808436003)
+
+    dwd = DwdWeatherWarningsAPI(808436003)
+    assert dwd.added == {frost}
+    assert not dwd.removed and not dwd.changed
+
+    features[0]["SEVERITY"] = "Moderate"
+    features.append({**WARNING_FEATURES[1], "WARNCELLID": 808436003})
+    dwd.update()
+    assert dwd.added == {wind}
+    assert dwd.changed == {frost}
+    assert not dwd.removed
+    assert dwd.warning_index[frost]["level"] == 2
+
+    features.pop(0)
+    dwd.update()
+    assert dwd.removed == {frost}
+    assert not dwd.added and not dwd.changed
+    assert list(dwd.warning_index) == [wind]
+
+    dwd.update()
+    assert not dwd.added and not dwd.removed and not dwd.changed
+
+
+def test_snapshot_deltas(warnings_server):
+    """Test the added and removed warnings of a snapshot."""
+    snapshot = WarningsSnapshot()
+    assert len(snapshot.added) == 3
+    assert len(snapshot.warning_index) == 3
+
+    removed = warnings_server.layers["dwd:Warnungen_Gemeinden"].pop(0)
+    snapshot.update()
+    assert snapshot.removed == {
+        (22, datetime(2024, 3, 15, 23, tzinfo=UTC), removed["WARNCELLID"])
+    }
+    assert not snapshot.added and not snapshot.changed